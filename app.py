@@ -1,17 +1,68 @@
-from flask import Flask, render_template, redirect, url_for, request, flash, abort, jsonify, send_from_directory
+from flask import Flask, render_template, redirect, url_for, request, flash, abort, jsonify, send_from_directory, g
 import os
 import re
 import shutil
 import uuid
+import queue
+import atexit
+import bisect
+import heapq
+import cProfile
+import pstats
 import json
+import sqlite3
+import math
+import random
+import gzip
+import hashlib
+import hmac
+import mmap
+import multiprocessing
+import unicodedata
+import filecmp
+import threading
+import time
+import wave
+import subprocess
+import sys
+import warnings
+import zipfile
+import click
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from werkzeug.utils import secure_filename
-from functools import wraps
+from werkzeug.security import safe_join
+from functools import wraps, partial
+from contextlib import contextmanager
+from collections import Counter
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows: metadata writes are only serialized within one process
+
+try:
+    from compression import zstd  # Python 3.14+
+except ImportError:
+    zstd = None
+
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None
+
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        import audioop  # Removed in Python 3.13
+except ImportError:
+    audioop = None
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key_here'  # Change this to a secure random key in production
 
 # Configuration
-ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+ASSETS_DIR = os.environ.get('ASSETS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets'))
 CATEGORIES_FILE = os.path.join(ASSETS_DIR, 'categories.json')
 
 # Admin username/password (you should change these and ideally move to environment variables)
@@ -24,6 +75,126 @@ SITE_PASSWORD = "12345"  # Change this to your desired password
 # Allowed file extensions
 ALLOWED_IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif'}
 ALLOWED_AUDIO_EXTENSIONS = {'mp3', 'wav'}
+MEDIA_DIRS = {
+    'images': ALLOWED_IMAGE_EXTENSIONS,
+    'english_audio': ALLOWED_AUDIO_EXTENSIONS,
+    'welsh_audio': ALLOWED_AUDIO_EXTENSIONS
+}
+
+# Generated variants of media files are kept in this subdirectory of each media directory,
+# named <original filename>.<tag>.<format> (e.g. welsh_audio/.derived/braich.wav.speech.ogg)
+DERIVED_DIR_NAME = '.derived'
+
+# Audio formats a client can ask for with ?audio=, and the ones every browser can play
+AUDIO_FORMATS = {'wav', 'mp3', 'ogg'}
+DEFAULT_AUDIO_FORMATS = frozenset({'wav', 'mp3'})
+
+# Uploaded WAV files are downmixed and resampled to this rate for the speech variants
+SPEECH_SAMPLE_RATE = 16000
+AUDIO_TRANSCODE_WORKERS = 2
+AUDIO_TRANSCODE_TIMEOUT = 60
+AUDIO_TYPES = ('english_audio', 'welsh_audio')
+
+# Silence left between clips in per-category audio sprites, so playback by offset doesn't bleed
+SPRITE_GAP_SECONDS = 0.25
+
+# Compressed speech variants written with ffmpeg when it is installed: format -> encoder arguments
+FFMPEG_AUDIO_VARIANTS = {
+    'ogg': ['-ar', '24000', '-c:a', 'libopus', '-b:a', '24k', '-application', 'voip', '-f', 'ogg'],
+    'mp3': ['-ar', '22050', '-c:a', 'libmp3lame', '-b:a', '40k', '-f', 'mp3']
+}
+
+# Resized copies of each image are written at these widths (and the original width)
+# in every modern format Pillow can encode, preferred in this order
+IMAGE_VARIANT_WIDTHS = (160, 320, 640)
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_VARIANT_WORKERS = 2
+IMAGE_FORMAT_MIMETYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+if Image is None:
+    IMAGE_VARIANT_FORMATS = ()
+else:
+    IMAGE_VARIANT_FORMATS = tuple(fmt for fmt in IMAGE_FORMAT_MIMETYPES
+                                  if f'.{fmt}' in Image.registered_extensions() and
+                                  (fmt != 'webp' or features.check('webp')))
+
+# Every image in a category is also packed, scaled to fit a square tile of this size,
+# into one atlas sheet so option grids can be drawn from a single request
+ATLAS_TILE_SIZE = 128
+
+# Command line tools exit as soon as their work is done, so they don't queue sprite and
+# atlas rebuilds in the background; the server rebuilds any that are out of date when
+# they are next requested (or run `flask build-audio-sprites` / `build-image-atlases`)
+RUNNING_COMMAND = click.get_current_context(silent=True) is not None
+
+# Bulk imports extract and validate this many items at once, skipping media files larger than this
+IMPORT_WORKERS = 4
+IMPORT_MAX_FILE_SIZE = 50 * 1024 * 1024
+
+# Media files with identical contents are hard links to one file in this folder of
+# ASSETS_DIR, named <hash>.<extension>; see store_media_file()
+MEDIA_STORE_DIR_NAME = '.store'
+
+# Fingerprinted asset URLs (/assets/<hash>/...) are cached by browsers for this long
+ASSET_MAX_AGE = 365 * 24 * 60 * 60
+ASSET_HASH_PATTERN = re.compile(r'^[0-9a-f]{16}$')
+
+# How often (in seconds) the in-memory catalog re-checks directory mtimes
+CATALOG_REVALIDATE_SECONDS = 5
+
+# Where categories, items and variations are stored: 'files' (categories.json and the
+# english.txt/welsh.txt of each item) or 'sqlite' (CATALOG_DB_FILE). Media always stays on disk.
+CATALOG_BACKEND = os.environ.get('CATALOG_BACKEND', 'files')
+CATALOG_DB_FILE = os.environ.get('CATALOG_DB_FILE',
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalog.db'))
+
+# A snapshot of the file-backed catalog written by `flask build-manifest`, loaded at
+# startup in place of scanning assets/ (see load_catalog_manifest())
+CATALOG_MANIFEST_FILE = os.environ.get('CATALOG_MANIFEST_FILE',
+                                       os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalog.manifest'))
+
+# Learner progress (spaced repetition reviews) is kept in its own SQLite database,
+# whatever the catalog backend; learners are identified by a random ID in a cookie
+PROGRESS_DB_FILE = os.environ.get('PROGRESS_DB_FILE',
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), 'progress.db'))
+LEARNER_COOKIE = 'learner_id'
+LEARNER_COOKIE_MAX_AGE = 5 * 365 * 24 * 60 * 60
+LEARNER_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# Metadata writes are serialized across worker processes with this lock file and
+# journaled here, next to the files they protect; the journal is emptied in the
+# background this often (in seconds)
+METADATA_LOCK_FILE = os.environ.get('METADATA_LOCK_FILE', os.path.join(ASSETS_DIR, '.metadata.lock'))
+METADATA_JOURNAL_FILE = os.environ.get('METADATA_JOURNAL_FILE', os.path.join(ASSETS_DIR, '.metadata.journal'))
+METADATA_COMPACT_SECONDS = 5
+
+# Request, cache and filesystem counters served at /metrics; set METRICS_ENABLED=0 to leave them out entirely
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1').lower() not in ('0', 'false')
+# Scrapers send this as "Authorization: Bearer <token>"; without it only a logged in admin can read /metrics
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+# Every worker process saves its counters in this folder, so whichever worker answers /metrics
+# reports the total (gunicorn.conf.py sets one); without it each process only reports its own
+METRICS_DIR = os.environ.get('METRICS_DIR')
+
+# Requests an admin asks to profile (see _start_profile()) are saved in this folder
+PROFILES_DIR = os.environ.get('PROFILES_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+
+# Sprite and atlas manifests keyed by path relative to ASSETS_DIR: (mtime, manifest)
+_derived_manifests = {}
+
+# Content hashes of asset files, keyed by path relative to ASSETS_DIR: (size, mtime, hash)
+_asset_hashes = {}
+
+# In-memory catalog state, see get_catalog_snapshot()
+_catalog_lock = threading.RLock()
+_catalog_refresh_lock = threading.Lock()  # See refresh_catalog_items()
+_catalog = {
+    'version': 0,
+    'categories': [],
+    'categories_version': 0,
+    'categories_mtime': None,
+    'categories_checked': float('-inf'),
+    'items': {}
+}
 
 # Ensure assets directory exists
 os.makedirs(ASSETS_DIR, exist_ok=True)
@@ -35,20 +206,239 @@ if not os.path.exists(CATEGORIES_FILE):
             "categories": []
         }, f, indent=2)
 
-# Helper functions for categories
-def get_categories():
-    """Get all categories from the categories.json file."""
+# Metadata writes
+# categories.json and the english.txt/welsh.txt files are replaced with an atomic
+# rename while holding a lock file shared by every worker process, so readers never
+# see a half-written file and concurrent edits can't interleave. The new contents are
+# written to temporary files first, then the batch is appended to a journal as one
+# line and flushed, and only then are the files renamed into place. The journal is
+# the only thing flushed before a write returns: a background thread later flushes
+# the renamed files and their directory entries and empties the journal, and
+# anything left in it after a crash is replayed when the server or a command line
+# tool starts, rewriting any file the crash left behind. Each journaled file also
+# records a hash of the contents it replaced, and is only replayed over those (or
+# over an empty file), never over a file something else has replaced since, such as
+# an item directory moved into place by a bulk import.
+_metadata_lock = {'lock': threading.RLock(), 'depth': 0, 'file': None}
+_journal_compactor = {'thread': None}
+
+@contextmanager
+def metadata_lock():
+    """Hold the lock that serializes metadata changes across threads and worker processes."""
+    with _metadata_lock['lock']:
+        if _metadata_lock['depth'] == 0 and fcntl:
+            _metadata_lock['file'] = open(METADATA_LOCK_FILE, 'a')
+            fcntl.flock(_metadata_lock['file'], fcntl.LOCK_EX)
+        _metadata_lock['depth'] += 1
+        try:
+            yield
+        finally:
+            _metadata_lock['depth'] -= 1
+            if _metadata_lock['depth'] == 0 and _metadata_lock['file']:
+                _metadata_lock['file'].close()  # Also releases the flock
+                _metadata_lock['file'] = None
+
+def _fsync_path(path):
+    """Flush a file's contents, or a directory's entries (e.g. a rename), to disk where the platform allows it."""
     try:
-        with open(CATEGORIES_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return data.get('categories', [])
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _write_temp_file(path, text, durable=False):
+    """Write text to a new temporary file next to path, returning the temporary file's path."""
+    directory, name = os.path.split(path)
+    tmp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+    except BaseException:
+        _remove_temp_file(tmp_path)
+        raise
+    return tmp_path
+
+def _remove_temp_file(tmp_path):
+    """Remove a temporary file that wasn't renamed into place."""
+    try:
+        os.remove(tmp_path)
+    except FileNotFoundError:
+        pass
+
+def _atomic_write(path, text, durable=False):
+    """Replace a file with an atomic rename, so readers see either the old or the new contents."""
+    tmp_path = _write_temp_file(path, text, durable)
+    try:
+        os.replace(tmp_path, path)
+    except BaseException:
+        _remove_temp_file(tmp_path)
+        raise
+
+def _metadata_file_hash(path):
+    """Hash the contents of a metadata file, or None if it doesn't exist."""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+def write_metadata_files(files):
+    """Write a batch of metadata files ({path: text}) atomically, returning once the change is durable."""
+    relpaths = {path: os.path.relpath(path, ASSETS_DIR) for path in files}
+    # Writing the new contents doesn't need the lock, so concurrent writers do it in parallel. They
+    # aren't flushed here, as the journal has them until the compactor flushes the renamed files.
+    tmp_paths = {}
+    try:
+        for path, text in files.items():
+            tmp_paths[path] = _write_temp_file(path, text)
+        with metadata_lock():
+            # The journal has to be on disk before any rename, so a crash halfway through can be replayed
+            entry = json.dumps({'files': {relpaths[path]: text for path, text in files.items()},
+                                'replaces': {relpaths[path]: _metadata_file_hash(path) for path in files}})
+            with open(METADATA_JOURNAL_FILE, 'a', encoding='utf-8') as journal:
+                journal.write(entry + '\n')
+                journal.flush()
+                os.fsync(journal.fileno())
+            for path in files:
+                os.replace(tmp_paths.pop(path), path)
+    finally:
+        for tmp_path in tmp_paths.values():
+            _remove_temp_file(tmp_path)
+    
+    _start_journal_compactor()
+
+def _read_journal():
+    """Read the batches in the journal ({'files': {relpath: text}, 'replaces': {relpath: hash}}), stopping at a line torn by a crash."""
+    batches = []
+    try:
+        with open(METADATA_JOURNAL_FILE, 'r', encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    batch = json.loads(line)
+                    batches.append({'files': batch['files'], 'replaces': batch.get('replaces', {})})
+                except (ValueError, KeyError, TypeError):
+                    break
+    except FileNotFoundError:
+        pass
+    return batches
+
+def compact_metadata_journal(replay=False):
+    """Make every journaled rename durable (rewriting the files from the journal if replay is set), then empty it."""
+    with metadata_lock():
+        batches = _read_journal()
+        if not batches:
+            return 0
+        
+        # The last write of each file, and every version of it the journal knows of: a crash
+        # can lose any of the renames (or leave a renamed file empty, if its contents hadn't
+        # reached the disk), but contents that are none of these were written by something
+        # else since. Batches journaled without 'replaces' are replayed whatever the file holds.
+        latest = {}
+        known = {}
+        for batch in batches:
+            for relpath, text in batch['files'].items():
+                latest[relpath] = text
+                versions = known.setdefault(relpath, {hashlib.sha256(b'').hexdigest()})
+                if versions is not None and relpath in batch['replaces']:
+                    versions.update((batch['replaces'][relpath], hashlib.sha256(text.encode('utf-8')).hexdigest()))
+                else:
+                    known[relpath] = None
+        replayed = {}
+        if replay:
+            for relpath, text in latest.items():
+                path = os.path.join(ASSETS_DIR, relpath)
+                if not os.path.isdir(os.path.dirname(path)):
+                    continue  # Deleted since
+                if known[relpath] is not None and _metadata_file_hash(path) not in known[relpath]:
+                    app.logger.warning(f"Not replaying {relpath}, it has been replaced since it was journaled")
+                    continue
+                _atomic_write(path, text, durable=True)
+                parts = relpath.split(os.sep)
+                if len(parts) == 3:
+                    replayed.setdefault(parts[0], set()).add(parts[1])
+        else:
+            # Writers only flushed the journal, so the renamed files need flushing before it is emptied
+            for relpath in latest:
+                _fsync_path(os.path.join(ASSETS_DIR, relpath))
+        for directory in {os.path.dirname(os.path.join(ASSETS_DIR, relpath)) for relpath in latest}:
+            _fsync_path(directory)
+        
+        open(METADATA_JOURNAL_FILE, 'w').close()
+    
+    if replay:
+        # Catch up a catalog loaded before the replay
+        get_categories(revalidate=True)
+        for category_id, item_ids in replayed.items():
+            refresh_catalog_items(category_id, sorted(item_ids))
+    return len(batches)
+
+def _compact_journal_forever():
+    """Empty the journal every METADATA_COMPACT_SECONDS."""
+    while True:
+        time.sleep(METADATA_COMPACT_SECONDS)
+        try:
+            compact_metadata_journal()
+        except OSError as e:
+            app.logger.error(f"Error compacting the metadata journal: {str(e)}")
+
+def _start_journal_compactor():
+    """Start the background thread that empties the journal, once per process."""
+    thread = _journal_compactor['thread']
+    if thread is None or not thread.is_alive():
+        thread = threading.Thread(target=_compact_journal_forever, name='metadata-journal', daemon=True)
+        _journal_compactor['thread'] = thread
+        thread.start()
+
+# Helper functions for categories
+def get_categories(revalidate=False):
+    """Get all categories, re-reading categories.json only when it has changed."""
+    now = time.monotonic()
+    if revalidate or now - _catalog['categories_checked'] >= CATALOG_REVALIDATE_SECONDS:
+        if CATALOG_BACKEND == 'sqlite':
+            mtime = db_get_revision(DB_CATEGORIES_REVISION)
+        else:
+            mtime = _get_mtime(CATEGORIES_FILE)
+        if mtime != _catalog['categories_mtime']:
+            try:
+                if CATALOG_BACKEND == 'sqlite':
+                    data = {'categories': db_load_categories()}
+                else:
+                    with open(CATEGORIES_FILE, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                _catalog['categories'] = data.get('categories', [])
+                _catalog['categories_mtime'] = mtime
+                _catalog['categories_version'] = _next_catalog_version()
+            except (OSError, json.JSONDecodeError) as e:
+                # Keep serving the last good list rather than an empty one
+                app.logger.error(f"Error reading categories: {str(e)}")
+        _catalog['categories_checked'] = now
+    return [dict(c) for c in _catalog['categories']]
 
 def save_categories(categories):
-    """Save categories to the categories.json file."""
-    with open(CATEGORIES_FILE, 'w', encoding='utf-8') as f:
-        json.dump({"categories": categories}, f, indent=2)
+    """Save categories to the categories.json file.
+    
+    Callers that modify the list from get_categories() should hold metadata_lock()
+    and pass revalidate=True, so an edit made by another worker isn't overwritten.
+    """
+    if CATALOG_BACKEND == 'sqlite':
+        mtime = db_save_categories(categories)
+    else:
+        write_metadata_files({CATEGORIES_FILE: json.dumps({"categories": categories}, indent=2)})
+        mtime = _get_mtime(CATEGORIES_FILE)
+    
+    with _catalog_lock:
+        _catalog['categories'] = [dict(c) for c in categories]
+        _catalog['categories_mtime'] = mtime
+        _catalog['categories_checked'] = time.monotonic()
+        _catalog['categories_version'] = _next_catalog_version()
 
 def get_category_by_id(category_id):
     """Get a category by its ID."""
@@ -78,110 +468,921 @@ def allowed_file(filename, allowed_extensions):
     """Check if a file has an allowed extension."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
-def get_items_in_category(category_id):
-    """Get all items in a category with basic info."""
-    if not is_valid_category(category_id):
+# SQLite catalog store
+# With CATALOG_BACKEND = 'sqlite' the metadata lives in one database instead of
+# categories.json and thousands of small text files. Every write bumps a revision
+# counter for the category it touches, which the in-memory catalog compares in
+# place of directory mtimes. The database runs in WAL mode so readers in other
+# processes are never blocked by a write.
+DB_CATEGORIES_REVISION = ''  # Revision key of the categories list itself
+
+CATALOG_DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS categories (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    category_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    PRIMARY KEY (category_id, id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS variations (
+    category_id TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    language TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (category_id, item_id, language, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS media_files (
+    category_id TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (category_id, item_id, path)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS revisions (
+    key TEXT PRIMARY KEY,
+    revision INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+_db_local = threading.local()
+
+def get_db():
+    """Get this thread's connection to the catalog database, creating the schema on first use."""
+    # Connections are per thread and per process, so forked workers open their own
+    if getattr(_db_local, 'pid', None) != os.getpid():
+        db = sqlite3.connect(CATALOG_DB_FILE, timeout=30)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.executescript(CATALOG_DB_SCHEMA)
+        _db_local.db, _db_local.pid = db, os.getpid()
+    return _db_local.db
+
+def _db_bump_revision(db, key):
+    """Increase the revision of a category (or of the categories list) inside a transaction."""
+    db.execute('INSERT INTO revisions (key, revision) VALUES (?, 1) '
+               'ON CONFLICT (key) DO UPDATE SET revision = revision + 1', (key,))
+    return db.execute('SELECT revision FROM revisions WHERE key = ?', (key,)).fetchone()[0]
+
+def db_get_revision(key):
+    """Get the revision of a category (or of the categories list), 0 if it was never written."""
+    row = get_db().execute('SELECT revision FROM revisions WHERE key = ?', (key,)).fetchone()
+    return row[0] if row else 0
+
+def db_load_categories():
+    """Load the categories list from the database."""
+    rows = get_db().execute('SELECT id, name FROM categories ORDER BY position')
+    return [{'id': category_id, 'name': name} for category_id, name in rows]
+
+def db_save_categories(categories):
+    """Replace the categories list in the database, returning its new revision."""
+    db = get_db()
+    with db:
+        db.execute('DELETE FROM categories')
+        db.executemany('INSERT INTO categories (id, name, position) VALUES (?, ?, ?)',
+                       [(c['id'], c['name'], position) for position, c in enumerate(categories)])
+        return _db_bump_revision(db, DB_CATEGORIES_REVISION)
+
+def _db_write_item(db, category_id, item_id, english_variations, welsh_variations):
+    """Insert or update an item and replace its variations, inside a transaction."""
+    db.execute('INSERT OR IGNORE INTO items (category_id, id) VALUES (?, ?)', (category_id, item_id))
+    db.execute('DELETE FROM variations WHERE category_id = ? AND item_id = ?', (category_id, item_id))
+    db.executemany('INSERT INTO variations (category_id, item_id, language, position, text) '
+                   'VALUES (?, ?, ?, ?, ?)',
+                   [(category_id, item_id, language, position, text)
+                    for language, variations in (('english', english_variations), ('welsh', welsh_variations))
+                    for position, text in enumerate(variations)])
+
+def _db_write_media(db, category_id, item_id, files):
+    """Replace the media file records of an item, inside a transaction."""
+    db.execute('DELETE FROM media_files WHERE category_id = ? AND item_id = ?', (category_id, item_id))
+    db.executemany('INSERT INTO media_files (category_id, item_id, path, size, hash) VALUES (?, ?, ?, ?, ?)',
+                   [(category_id, item_id, path, size, digest) for path, (size, digest) in files.items()])
+
+def db_save_item(category_id, item_id, english_variations, welsh_variations):
+    """Create or update an item's variations in the database."""
+    db = get_db()
+    with db:
+        _db_write_item(db, category_id, item_id, english_variations, welsh_variations)
+        _db_bump_revision(db, category_id)
+
+def db_save_items(category_id, items):
+    """Create or update the variations of many items ({item_id: (english, welsh)}) in one transaction."""
+    db = get_db()
+    with db:
+        for item_id, (english_variations, welsh_variations) in items.items():
+            _db_write_item(db, category_id, item_id, english_variations, welsh_variations)
+        _db_bump_revision(db, category_id)
+
+def db_delete_items(category_id, item_id=None):
+    """Delete one item, or every item of a category, from the database."""
+    condition, params = 'category_id = ?', (category_id,)
+    if item_id is not None:
+        condition, params = condition + ' AND item_id = ?', params + (item_id,)
+    db = get_db()
+    with db:
+        db.execute(f'DELETE FROM items WHERE {condition.replace("item_id", "id")}', params)
+        db.execute(f'DELETE FROM variations WHERE {condition}', params)
+        db.execute(f'DELETE FROM media_files WHERE {condition}', params)
+        _db_bump_revision(db, category_id)
+
+def db_save_media(category_id, item_ids):
+    """Record the media files on disk of some items, bumping the category's revision if any of them changed."""
+    db = get_db()
+    with db:
+        changed = False
+        for item_id in item_ids:
+            if not db.execute('SELECT 1 FROM items WHERE category_id = ? AND id = ?', (category_id, item_id)).fetchone():
+                continue
+            files = _list_item_files(category_id, item_id)
+            stored = {path: (size, digest) for path, size, digest in db.execute(
+                'SELECT path, size, hash FROM media_files WHERE category_id = ? AND item_id = ?', (category_id, item_id))}
+            if files != stored:
+                _db_write_media(db, category_id, item_id, files)
+                changed = True
+        if changed:
+            _db_bump_revision(db, category_id)
+
+def _db_load_entries(db, category_id, item_id=None):
+    """Load catalog entries for the items of a category (or a single item) from the database."""
+    condition, params = 'category_id = ?', (category_id,)
+    if item_id is not None:
+        condition, params = condition + ' AND item_id = ?', params + (item_id,)
+    
+    item_ids = [row[0] for row in db.execute(
+        f'SELECT id FROM items WHERE {condition.replace("item_id", "id")} ORDER BY id', params)]
+    variations = {i: {'english': [], 'welsh': []} for i in item_ids}
+    for i, language, text in db.execute(f'SELECT item_id, language, text FROM variations WHERE {condition} '
+                                        'ORDER BY item_id, language, position', params):
+        variations[i][language].append(text)
+    files = {i: {} for i in item_ids}
+    for i, path, size, digest in db.execute(
+            f'SELECT item_id, path, size, hash FROM media_files WHERE {condition}', params):
+        files[i][path] = (size, digest)
+    
+    return {i: _build_entry(category_id, i, variations[i]['english'], variations[i]['welsh'], files[i])
+            for i in item_ids}
+
+def db_scan_item(category_id, item_id):
+    """Read an item from the database."""
+    return _db_load_entries(get_db(), category_id, item_id).get(item_id)
+
+def _db_scan_category(category_id, cached=None):
+    """Load a category from the database, reusing the cached state while its revision is unchanged."""
+    db = get_db()
+    revision = db_get_revision(category_id)
+    if cached and cached['mtime'] == revision:
+        return dict(cached, checked=time.monotonic())
+    
+    items = _db_load_entries(db, category_id)
+    if not items and not db.execute('SELECT 1 FROM categories WHERE id = ?', (category_id,)).fetchone():
+        return None
+    return {
+        'version': _next_catalog_version(),
+        'mtime': revision,
+        'checked': time.monotonic(),
+        'names': list(items),
+        'items': items
+    }
+
+def migrate_catalog_to_db():
+    """Copy categories.json and every item's text and media listing into the database, replacing its contents."""
+    with open(CATEGORIES_FILE, 'r', encoding='utf-8') as f:
+        categories = json.load(f).get('categories', [])
+    
+    db = get_db()
+    counts = {'categories': 0, 'items': 0}
+    with db:
+        for table in ('categories', 'items', 'variations', 'media_files'):
+            db.execute(f'DELETE FROM {table}')
+        db.executemany('INSERT INTO categories (id, name, position) VALUES (?, ?, ?)',
+                       [(c['id'], c['name'], position) for position, c in enumerate(categories)])
+        _db_bump_revision(db, DB_CATEGORIES_REVISION)
+        
+        for category_id in sorted(os.listdir(ASSETS_DIR)):
+            category_dir = os.path.join(ASSETS_DIR, category_id)
+            if not is_valid_identifier(category_id) or not os.path.isdir(category_dir):
+                continue
+            counts['categories'] += 1
+            for item_id in sorted(os.listdir(category_dir)):
+                item_dir = os.path.join(category_dir, item_id)
+                if not os.path.exists(os.path.join(item_dir, 'welsh.txt')):
+                    continue
+                _db_write_item(db, category_id, item_id,
+                               _read_variations(os.path.join(item_dir, 'english.txt')),
+                               _read_variations(os.path.join(item_dir, 'welsh.txt')))
+                _db_write_media(db, category_id, item_id, _list_item_files(category_id, item_id))
+                counts['items'] += 1
+            _db_bump_revision(db, category_id)
+    return counts
+
+def export_catalog_from_db():
+    """Write the database's categories and variations back to categories.json and the item text files."""
+    db = get_db()
+    write_metadata_files({CATEGORIES_FILE: json.dumps({"categories": db_load_categories()}, indent=2)})
+    
+    counts = {'categories': 0, 'items': 0, 'missing_media': 0}
+    category_ids = [row[0] for row in db.execute('SELECT DISTINCT category_id FROM items ORDER BY category_id')]
+    for category_id in category_ids:
+        counts['categories'] += 1
+        files = {}
+        for item_id, entry in _db_load_entries(db, category_id).items():
+            item_dir = os.path.join(ASSETS_DIR, category_id, item_id)
+            for media_dir in MEDIA_DIRS:
+                os.makedirs(os.path.join(item_dir, media_dir), exist_ok=True)
+            for language in ('english', 'welsh'):
+                files[os.path.join(item_dir, f'{language}.txt')] = '\n'.join(entry[f'{language}_variations'])
+            counts['items'] += 1
+            counts['missing_media'] += sum(1 for key in entry['sizes']
+                                           if not os.path.isfile(os.path.join(item_dir, key)))
+        write_metadata_files(files)  # One journaled batch per category
+    return counts
+
+# In-memory catalog index
+def _next_catalog_version():
+    """Get a new catalog version number, used to tag anything derived from the catalog."""
+    with _catalog_lock:
+        _catalog['version'] += 1
+        return _catalog['version']
+
+def _get_mtime(path):
+    """Get the modification time of a path, or None if it doesn't exist."""
+    count_filesystem('stat')
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def _read_variations(path):
+    """Read the non-empty lines of a variations file."""
+    count_filesystem('stat')
+    if not os.path.exists(path):
+        return []
+    count_filesystem('open')
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+def _list_media(directory, allowed_extensions):
+    """List the media files in a directory, sorted by name."""
+    count_filesystem('stat')
+    if not os.path.isdir(directory):
         return []
+    count_filesystem('listdir')
+    names = os.listdir(directory)
+    count_filesystem('stat', len(names))
+    return sorted(f for f in names
+                  if os.path.isfile(os.path.join(directory, f)) and allowed_file(f, allowed_extensions))
+
+def get_asset_hash(relpath):
+    """Get the content hash of an asset file, only re-reading it if its size or mtime changed."""
+    path = safe_join(ASSETS_DIR, relpath)
+    count_filesystem('stat', 2)
+    try:
+        stat = os.stat(path) if path else None
+    except OSError:
+        stat = None
+    if stat is None or not os.path.isfile(path):
+        _asset_hashes.pop(relpath, None)
+        return None
     
-    items = []
-    category_dir = os.path.join(ASSETS_DIR, category_id)
+    cached = _asset_hashes.get(relpath)
+    fresh = bool(cached) and cached[:2] == (stat.st_size, stat.st_mtime_ns)
+    count_cache('asset_hash', fresh)
+    if fresh:
+        return cached[2]
+    
+    digest = hashlib.sha256()
+    count_filesystem('open')
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    digest = digest.hexdigest()[:16]
+    _asset_hashes[relpath] = (stat.st_size, stat.st_mtime_ns, digest)
+    return digest
+
+def forget_asset_hashes(prefix):
+    """Drop the cached hashes of every asset under a path after it has been deleted."""
+    for relpath in [p for p in _asset_hashes if p == prefix or p.startswith(prefix + '/')]:
+        _asset_hashes.pop(relpath, None)
+
+def move_asset_hashes(old_prefix, new_prefix):
+    """Keep the cached hashes of the assets under a path after it has been renamed (which keeps their size and mtime)."""
+    for relpath in [p for p in _asset_hashes if p == old_prefix or p.startswith(old_prefix + '/')]:
+        cached = _asset_hashes.pop(relpath, None)
+        if cached:
+            _asset_hashes[new_prefix + relpath[len(old_prefix):]] = cached
+
+def asset_url(relpath, digest=None):
+    """Get the URL of an asset, fingerprinted with its content hash when known."""
+    return f"/assets/{digest}/{relpath}" if digest else f"/assets/{relpath}"
+
+# Content-addressed media
+# Item media is served from /media/<hash>.<extension>, so identical files used by
+# several items (e.g. ear/ears) share one URL and one browser cache entry. On disk
+# each copy is a hard link to the same file in the store, and the link count is its
+# reference count: deleting an item's file drops one reference, and the store file
+# is removed once nothing else links to it.
+_media_paths = {}  # Content hash -> {path: None} of the media files with that content
+
+def media_url(relpath, digest=None):
+    """Get the content-addressed URL of an item's media file, or its plain URL if the hash isn't known."""
+    if not digest:
+        return asset_url(relpath)
+    return f"/media/{digest}.{relpath.rsplit('.', 1)[-1].lower()}"
+
+def find_media_path(digest):
+    """Find the path (relative to ASSETS_DIR) of a catalog media file with this content hash.
+    
+    Copies with generated variants are preferred, so they can be served in place of
+    the original. Hashes the catalog hasn't seen are not looked for.
+    """
+    # Categories still waiting in the manifest may hold it
+    if digest not in _media_paths and _catalog_manifest['index']:
+        for category_id in list(_catalog_manifest['index']):
+            get_catalog_snapshot(category_id)
+    
+    copies = _media_paths.get(digest, {})
+    found = None
+    for relpath in list(copies):
+        if get_asset_hash(relpath) != digest:
+            copies.pop(relpath, None)  # Changed or deleted since
+            continue
+        category_id, item_id, key = relpath.split('/', 2)
+        entry = get_catalog_item(category_id, item_id)
+        if entry and entry['variants'].get(key):
+            return relpath
+        found = found or relpath
+    return found
+
+def _store_path(digest, filename):
+    """Get the path of the content store file for a hash."""
+    extension = os.path.splitext(filename)[1].lower()
+    return os.path.join(ASSETS_DIR, MEDIA_STORE_DIR_NAME, digest[:2], digest + extension)
+
+def store_media_file(relpath):
+    """Link a media file into the content store, replacing it with a link to an identical stored file.
+    
+    Returns the number of bytes freed. Filesystems without hard links are left alone.
+    """
+    digest = get_asset_hash(relpath)
+    if not digest:
+        return 0
+    path = os.path.join(ASSETS_DIR, relpath)
+    store_path = _store_path(digest, relpath)
     
-    for item_id in os.listdir(category_dir):
-        item_dir = os.path.join(category_dir, item_id)
-        welsh_path = os.path.join(item_dir, 'welsh.txt')
+    try:
+        os.makedirs(os.path.dirname(store_path), exist_ok=True)
+        try:
+            os.link(path, store_path)  # First copy of these bytes
+            return 0
+        except FileExistsError:
+            pass
         
-        if os.path.isdir(item_dir) and os.path.exists(welsh_path):
-            welsh_word = ""
-            with open(welsh_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-                if lines:
-                    welsh_word = lines[0].strip()
-            
-            # Count files and variations
-            images_count = len([f for f in os.listdir(os.path.join(item_dir, 'images')) 
-                               if os.path.isfile(os.path.join(item_dir, 'images', f)) and 
-                               any(f.lower().endswith(ext) for ext in ALLOWED_IMAGE_EXTENSIONS)])
-            
-            english_audio_count = len([f for f in os.listdir(os.path.join(item_dir, 'english_audio')) 
-                                      if os.path.isfile(os.path.join(item_dir, 'english_audio', f)) and 
-                                      any(f.lower().endswith(ext) for ext in ALLOWED_AUDIO_EXTENSIONS)])
-            
-            welsh_audio_count = len([f for f in os.listdir(os.path.join(item_dir, 'welsh_audio')) 
-                                    if os.path.isfile(os.path.join(item_dir, 'welsh_audio', f)) and 
-                                    any(f.lower().endswith(ext) for ext in ALLOWED_AUDIO_EXTENSIONS)])
-            
-            english_variations_count = 0
-            english_path = os.path.join(item_dir, 'english.txt')
-            if os.path.exists(english_path):
-                with open(english_path, 'r', encoding='utf-8') as f:
-                    english_variations_count = sum(1 for line in f if line.strip())
-            
-            welsh_variations_count = 0
-            with open(welsh_path, 'r', encoding='utf-8') as f:
-                welsh_variations_count = sum(1 for line in f if line.strip())
-            
-            items.append({
-                'id': item_id,
-                'welsh': welsh_word,
-                'images_count': images_count,
-                'english_audio_count': english_audio_count,
-                'welsh_audio_count': welsh_audio_count,
-                'english_variations_count': english_variations_count,
-                'welsh_variations_count': welsh_variations_count
+        # Compare the bytes too, the hash is only a prefix
+        if os.path.samefile(path, store_path) or not filecmp.cmp(path, store_path, shallow=False):
+            return 0
+        size = os.path.getsize(path)
+        directory, name = os.path.split(path)
+        tmp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex}.tmp")
+        os.link(store_path, tmp_path)
+        os.replace(tmp_path, path)
+        return size
+    except OSError as e:
+        app.logger.warning(f"Could not add {relpath} to the media store: {str(e)}")
+        return 0
+
+def get_store_paths(entries):
+    """Get the content store paths the original media files of some catalog entries link to."""
+    return {_store_path(digest, key) for entry in entries for key, digest in entry['hashes'].items()
+            if digest and f"/{DERIVED_DIR_NAME}/" not in key}
+
+def release_store_paths(store_paths):
+    """Delete content store files that no media file links to any more, returning the bytes freed."""
+    freed = 0
+    for store_path in store_paths:
+        try:
+            stat = os.stat(store_path)
+            if stat.st_nlink == 1:
+                os.remove(store_path)
+                freed += stat.st_size
+        except OSError:
+            pass
+    return freed
+
+def _item_signature(item_dir):
+    """Get the mtimes that change whenever an item's text, media or derived media changes."""
+    names = ('.', 'english.txt', 'welsh.txt') + tuple(MEDIA_DIRS)
+    names += tuple(os.path.join(media_dir, DERIVED_DIR_NAME) for media_dir in MEDIA_DIRS)
+    return tuple(_get_mtime(os.path.join(item_dir, name)) for name in names)
+
+def _list_derived(directory):
+    """List the generated variants in a media directory, grouped by original filename."""
+    derived = {}
+    derived_dir = os.path.join(directory, DERIVED_DIR_NAME)
+    count_filesystem('stat')
+    if not os.path.isdir(derived_dir):
+        return derived
+    
+    count_filesystem('listdir')
+    for name in sorted(os.listdir(derived_dir)):
+        parts = name.rsplit('.', 2)
+        if len(parts) == 3 and not name.startswith('.'):
+            original, tag, fmt = parts
+            count_filesystem('stat')
+            derived.setdefault(original, []).append({
+                'name': name,
+                'tag': tag,
+                'format': fmt,
+                'size': os.path.getsize(os.path.join(derived_dir, name))
             })
+    return derived
+
+def remove_derived_files(directory, filename):
+    """Delete the generated variants of a media file, returning their paths relative to directory."""
+    removed = []
+    for variant in _list_derived(directory).get(filename, []):
+        os.remove(os.path.join(directory, DERIVED_DIR_NAME, variant['name']))
+        removed.append(f"{DERIVED_DIR_NAME}/{variant['name']}")
+    return removed
+
+# Fields of the item objects returned by the items API, in output order
+ITEM_RECORD_FIELDS = ('id', 'english', 'welsh', 'englishTexts', 'welshTexts', 'images', 'imageSrcsets',
+                      'englishAudio', 'welshAudio')
+
+def parse_fields_param(value):
+    """Parse a comma-separated fields= projection, returning None to keep every field."""
+    if not value:
+        return None
     
-    return sorted(items, key=lambda x: x['id'])
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in ITEM_RECORD_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
 
-def get_item_details(category_id, item_id):
-    """Get detailed information about a specific item."""
+def project_item_record(record, fields):
+    """Reduce an item object to the requested fields."""
+    if fields is None:
+        return record
+    return {field: record[field] for field in fields}
+
+def pick_audio_file(entry, media_dir, filename, audio_formats):
+    """Pick the smallest of an audio file and its variants that the client can play."""
+    original_format = filename.rsplit('.', 1)[-1].lower()
+    best = (entry['sizes'].get(f"{media_dir}/{filename}", 0), filename) if original_format in audio_formats else None
+    
+    for variant in entry['variants'].get(f"{media_dir}/{filename}", []):
+        if variant['format'] in audio_formats and (best is None or variant['size'] < best[0]):
+            best = (variant['size'], f"{DERIVED_DIR_NAME}/{variant['name']}")
+    
+    return best[1] if best else filename
+
+def build_item_record(category_id, entry, audio_formats=DEFAULT_AUDIO_FORMATS):
+    """Build the item object returned by the items API from a catalog entry."""
+    item_id = entry['id']
+    english_texts = entry['english_variations']
+    welsh_texts = entry['welsh_variations']
+    
+    # Skip if no Welsh word
+    if not welsh_texts:
+        return None
+    
+    # Default English is the directory name if no file exists
+    english = english_texts[0] if english_texts else item_id.replace('_', ' ')
+    welsh = welsh_texts[0]  # First entry is the primary form
+    
+    # Media URLs are content-addressed so browsers can cache them forever
+    # and audio points at the smallest variant in a format the client can play
+    media_urls = {}
+    for media_dir in MEDIA_DIRS:
+        files = entry[media_dir]
+        if media_dir != 'images':
+            files = [pick_audio_file(entry, media_dir, f, audio_formats) for f in files]
+        media_urls[media_dir] = [media_url(f"{category_id}/{item_id}/{media_dir}/{f}",
+                                           entry['hashes'].get(f"{media_dir}/{f}"))
+                                 for f in files]
+    images = media_urls['images']
+    
+    # Resized copies of each image as a srcset string per format, in the same order as images
+    image_srcsets = []
+    for f in entry['images']:
+        srcsets = {}
+        for variant in entry['variants'].get(f"images/{f}", []):
+            key = f"images/{DERIVED_DIR_NAME}/{variant['name']}"
+            url = media_url(f"{category_id}/{item_id}/{key}", entry['hashes'].get(key))
+            srcsets.setdefault(variant['format'], []).append(f"{url} {variant['tag']}")
+        image_srcsets.append({fmt: ', '.join(urls) for fmt, urls in srcsets.items()})
+    
+    english_audio = media_urls['english_audio']
+    welsh_audio = media_urls['welsh_audio']
+    
+    # Add default placeholders if no files found
+    if not images:
+        images = [f"/assets/{category_id}/{item_id}/images/placeholder.jpg"]
+        image_srcsets = [{}]
+    if not english_audio:
+        english_audio = [f"/assets/{category_id}/{item_id}/english_audio/placeholder.mp3"]
+    if not welsh_audio:
+        welsh_audio = [f"/assets/{category_id}/{item_id}/welsh_audio/placeholder.mp3"]
+    
+    return {
+        'id': item_id,
+        'english': english,
+        'welsh': welsh,
+        'englishTexts': english_texts or [english],
+        'welshTexts': welsh_texts,
+        'images': images,
+        'imageSrcsets': image_srcsets,
+        'englishAudio': english_audio,
+        'welshAudio': welsh_audio
+    }
+
+def parse_audio_formats(value):
+    """Parse a comma-separated audio= list of formats the client can play."""
+    formats = frozenset(f.strip().lower() for f in (value or '').split(',')) & AUDIO_FORMATS
+    return formats or DEFAULT_AUDIO_FORMATS
+
+def get_item_records(category_id, items, audio_formats=DEFAULT_AUDIO_FORMATS):
+    """Get the item objects of the playable items in a set of catalog entries."""
+    if audio_formats == DEFAULT_AUDIO_FORMATS:
+        records = (entry['record'] for entry in items.values())
+    else:
+        records = (build_item_record(category_id, entry, audio_formats) for entry in items.values())
+    return [record for record in records if record]
+
+def _list_item_files(category_id, item_id):
+    """List an item's media files and generated variants on disk as {path: (size, hash)}."""
+    files = {}
+    item_dir = os.path.join(ASSETS_DIR, category_id, item_id)
+    for media_dir, allowed_extensions in MEDIA_DIRS.items():
+        media_path = os.path.join(item_dir, media_dir)
+        names = _list_media(media_path, allowed_extensions)
+        names += [f"{DERIVED_DIR_NAME}/{variant['name']}"
+                  for variants in _list_derived(media_path).values() for variant in variants]
+        count_filesystem('stat', len(names))
+        for name in names:
+            key = f"{media_dir}/{name}"
+            files[key] = (os.path.getsize(os.path.join(media_path, name)),
+                          get_asset_hash(f"{category_id}/{item_id}/{key}"))
+    return files
+
+def _build_entry(category_id, item_id, english_variations, welsh_variations, files, signature=None):
+    """Build the catalog entry of an item from its variations and media file listing."""
+    entry = {
+        'id': item_id,
+        'signature': signature,
+        'english_variations': english_variations,
+        'welsh_variations': welsh_variations,
+        'hashes': {key: digest for key, (size, digest) in files.items()},
+        'sizes': {},
+        'variants': {}
+    }
+    derived = {}
+    for key, (size, digest) in sorted(files.items()):
+        media_dir, _, name = key.partition('/')
+        if not name.startswith(DERIVED_DIR_NAME + '/'):
+            entry['sizes'][key] = size
+            continue
+        name = name[len(DERIVED_DIR_NAME) + 1:]
+        original, tag, fmt = name.rsplit('.', 2)
+        derived.setdefault(f"{media_dir}/{original}", []).append(
+            {'name': name, 'tag': tag, 'format': fmt, 'size': size})
+    
+    for media_dir in MEDIA_DIRS:
+        entry[media_dir] = [key.partition('/')[2] for key in entry['sizes'] if key.startswith(media_dir + '/')]
+        for f in entry[media_dir]:
+            entry['variants'][f"{media_dir}/{f}"] = derived.get(f"{media_dir}/{f}", [])
+    entry['record'] = build_item_record(category_id, entry)
+    for key, digest in entry['hashes'].items():
+        if digest:
+            _media_paths.setdefault(digest, {})[f"{category_id}/{item_id}/{key}"] = None
+    return entry
+
+def scan_item(category_id, item_id):
+    """Read an item's variations and media listing from disk into a catalog entry."""
+    if CATALOG_BACKEND == 'sqlite':
+        return db_scan_item(category_id, item_id)
+    
     item_dir = os.path.join(ASSETS_DIR, category_id, item_id)
+    count_filesystem('stat', 2)
+    if not os.path.isdir(item_dir) or not os.path.exists(os.path.join(item_dir, 'welsh.txt')):
+        return None
+    
+    try:
+        signature = _item_signature(item_dir)
+        return _build_entry(category_id, item_id,
+                            _read_variations(os.path.join(item_dir, 'english.txt')),
+                            _read_variations(os.path.join(item_dir, 'welsh.txt')),
+                            _list_item_files(category_id, item_id), signature)
+    except (OSError, UnicodeDecodeError) as e:
+        app.logger.error(f"Error processing item {item_id}: {str(e)}")
+        return None
+
+def _scan_category(category_id, cached=None):
+    """Scan a category directory, reusing cached entries whose signature is unchanged."""
+    if CATALOG_BACKEND == 'sqlite':
+        return _db_scan_category(category_id, cached)
+    
+    category_dir = os.path.join(ASSETS_DIR, category_id)
+    mtime = _get_mtime(category_dir)
+    count_filesystem('stat')
+    if mtime is None or not os.path.isdir(category_dir):
+        return None
+    
+    old_items = cached['items'] if cached else {}
+    if cached and cached['mtime'] == mtime:
+        item_ids = cached['names']
+    else:
+        count_filesystem('listdir')
+        item_ids = sorted(os.listdir(category_dir))
+    
+    items = {}
+    for item_id in item_ids:
+        old_entry = old_items.get(item_id)
+        if old_entry and old_entry['signature'] == _item_signature(os.path.join(category_dir, item_id)):
+            items[item_id] = old_entry
+            continue
+        entry = scan_item(category_id, item_id)
+        if entry:
+            items[item_id] = entry
+    
+    changed = (not cached or items.keys() != old_items.keys() or
+               any(entry is not old_items[item_id] for item_id, entry in items.items()))
+    
+    # Keep the directory listing so half-created items are picked up later
+    return {
+        'version': _next_catalog_version() if changed else cached['version'],
+        'mtime': mtime,
+        'checked': time.monotonic(),
+        'names': item_ids,
+        'items': items
+    }
+
+def get_catalog_snapshot(category_id):
+    """Get the cached state of a category (version and items), or None if it doesn't exist.
+    
+    Entries are served from memory and only revalidated against directory
+    mtimes every CATALOG_REVALIDATE_SECONDS, so assets copied into assets/ by
+    hand still show up without a restart.
+    """
+    cached = _catalog['items'].get(category_id)
+    if cached and time.monotonic() - cached['checked'] < CATALOG_REVALIDATE_SECONDS:
+        count_cache('catalog', True)
+        return cached
+    
+    with _catalog_lock:
+        cached = _catalog['items'].get(category_id)
+        if cached and time.monotonic() - cached['checked'] < CATALOG_REVALIDATE_SECONDS:
+            count_cache('catalog', True)
+            return cached
+        count_cache('catalog', False)
+        
+        # Trust the manifest at first, it is checked against the disk at the next revalidation
+        if cached is None and category_id in _catalog_manifest['index']:
+            cached = _catalog['items'][category_id] = _load_manifest_category(category_id)
+            return cached
+        
+        if cached is not None:
+            # Other requests keep being served this snapshot while this one revalidates it
+            cached = _catalog['items'][category_id] = dict(cached, checked=time.monotonic())
+    
+    # The scan stats every item, so it runs without the lock, which is only held to swap in its result
+    scanned = _scan_category(category_id, cached)
+    with _catalog_lock:
+        current = _catalog['items'].get(category_id)
+        if current is not cached:
+            return current  # Refreshed meanwhile, which is at least as new as this scan
+        if scanned is None:
+            _catalog['items'].pop(category_id, None)
+            return None
+        _catalog['items'][category_id] = scanned
+        return scanned
+
+def get_catalog_category(category_id):
+    """Get the catalog entries of a category keyed by item ID, or None if it doesn't exist."""
+    snapshot = get_catalog_snapshot(category_id)
+    return snapshot['items'] if snapshot else None
+
+def get_catalog_item(category_id, item_id):
+    """Get the catalog entry for a single item, or None if it doesn't exist."""
+    items = get_catalog_category(category_id)
+    if items is None:
+        return None
+    return items.get(item_id)
+
+def refresh_catalog_item(category_id, item_id):
+    """Re-read a single item into the catalog after it has been changed on disk."""
+    refresh_catalog_items(category_id, [item_id])
+
+def refresh_catalog_items(category_id, item_ids):
+    """Re-read several items of a category into the catalog as one change.
+    
+    The items are read before taking the catalog lock, which is only held to swap
+    them in, so requests aren't kept waiting on the disk; refreshes still run one
+    at a time, so an older read never replaces a newer one.
+    """
+    with _catalog_refresh_lock:
+        if category_id not in _catalog['items']:
+            return  # Not loaded yet, it will be scanned on first use
+        entries = {item_id: scan_item(category_id, item_id) for item_id in item_ids}
+        
+        with _catalog_lock:
+            cached = _catalog['items'].get(category_id)
+            if cached is None:
+                return
+            items = dict(cached['items'])
+            for item_id, entry in entries.items():
+                if entry:
+                    items[item_id] = entry
+                else:
+                    items.pop(item_id, None)
+            _catalog['items'][category_id] = dict(cached, items=dict(sorted(items.items())),
+                                                  version=_next_catalog_version())
+
+def record_media_change(category_id, item_ids):
+    """Re-read items into the catalog after their media files were added, removed or regenerated.
+    
+    With the SQLite backend the files are recorded in the database first, so other
+    worker processes pick up the change too.
+    """
+    if CATALOG_BACKEND == 'sqlite':
+        db_save_media(category_id, item_ids)
+    refresh_catalog_items(category_id, item_ids)
+
+def forget_catalog_category(category_id):
+    """Drop a category from the catalog after it has been deleted."""
+    with _catalog_lock:
+        _catalog['items'].pop(category_id, None)
+        for key in [k for k in _payload_cache if isinstance(k, tuple) and k[1] == category_id]:
+            _payload_cache.pop(key, None)
+        for relpath in [p for p in _derived_manifests if p.startswith(category_id + '/')]:
+            _derived_manifests.pop(relpath, None)
+    with _item_listings_lock:
+        for key in [k for k in _item_listings if k[0] == category_id]:
+            _item_listings.pop(key, None)
+
+def _list_category_ids():
+    """List the IDs of the categories in the catalog store (the category folders, or the database)."""
+    if CATALOG_BACKEND == 'sqlite':
+        return [row[0] for row in get_db().execute(
+            'SELECT id FROM categories UNION SELECT category_id FROM items ORDER BY 1')]
+    return [c for c in sorted(os.listdir(ASSETS_DIR))
+            if is_valid_identifier(c) and os.path.isdir(os.path.join(ASSETS_DIR, c))]
+
+def build_catalog():
+    """Scan every category in the assets directory into the catalog."""
+    get_categories()
+    for category_id in _list_category_ids():
+        get_catalog_category(category_id)
+
+def get_catalog_category_ids():
+    """Get the IDs of the categories in the catalog, including those not yet loaded from the manifest."""
+    # Categories created since the manifest was written (or the catalog was built) are only in categories.json
+    added = {c['id'] for c in get_categories()
+             if c['id'] not in _catalog['items'] and c['id'] not in _catalog_manifest['index']}
+    return sorted(set(_catalog['items']) | set(_catalog_manifest['index']) |
+                  {category_id for category_id in added if is_valid_category(category_id)})
+
+# Catalog manifest
+# `flask build-manifest` writes the file-backed catalog (categories.json, and each
+# item's variations, signature and media files with their sizes, hashes and mtimes)
+# to CATALOG_MANIFEST_FILE: one header line holding the byte range of every category,
+# then one JSON document per category. At startup the file is memory-mapped and only
+# the header is read; a category is decoded from it the first time it is used instead
+# of scanning its folder, then revalidated against the disk like any other, so stale
+# parts of the manifest are replaced after CATALOG_REVALIDATE_SECONDS.
+CATALOG_MANIFEST_FORMAT = 1
+
+# 'data' is the mapped file, 'index' maps the categories not yet decoded to (start, end) offsets
+_catalog_manifest = {'data': None, 'index': {}}
+
+def write_catalog_manifest(path=CATALOG_MANIFEST_FILE):
+    """Scan the catalog from disk and write it to a manifest, returning the number of categories and items."""
+    documents, index, position, item_count = [], {}, 0, 0
+    for category_id in _list_category_ids():
+        scanned = _scan_category(category_id)
+        if scanned is None:
+            continue
+        items = {}
+        for item_id, entry in scanned['items'].items():
+            files = {}
+            for key, digest in entry['hashes'].items():
+                cached = _asset_hashes.get(f"{category_id}/{item_id}/{key}")
+                if digest and cached:
+                    files[key] = cached
+            items[item_id] = {
+                'signature': entry['signature'],
+                'english': entry['english_variations'],
+                'welsh': entry['welsh_variations'],
+                'files': files
+            }
+        document = json.dumps({'mtime': scanned['mtime'], 'names': scanned['names'], 'items': items},
+                              separators=(',', ':'))
+        documents.append(document)
+        index[category_id] = (position, position + len(document))
+        position += len(document)
+        item_count += len(items)
+    
+    with open(CATEGORIES_FILE, 'r', encoding='utf-8') as f:
+        categories = json.load(f).get('categories', [])
+    header = json.dumps({
+        'format': CATALOG_MANIFEST_FORMAT,
+        'categories': categories,
+        'categories_mtime': _get_mtime(CATEGORIES_FILE),
+        'index': index
+    }, separators=(',', ':'))
+    # json.dumps escapes non-ASCII characters, so string lengths are byte offsets
+    _atomic_write(path, header + '\n' + ''.join(documents), durable=True)
+    return {'categories': len(index), 'items': item_count}
+
+def load_catalog_manifest(path=CATALOG_MANIFEST_FILE):
+    """Map a catalog manifest and read its header, returning whether one was loaded."""
+    if CATALOG_BACKEND != 'files':
+        return False
+    try:
+        with open(path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return False  # Missing or empty
+    
+    body = data.find(b'\n') + 1
+    try:
+        header = json.loads(data[:body])
+    except ValueError:
+        header = {}
+    if not body or header.get('format') != CATALOG_MANIFEST_FORMAT:
+        app.logger.warning(f"Ignoring {path}: not a catalog manifest this version can read")
+        data.close()
+        return False
+    
+    with _catalog_lock:
+        _catalog_manifest['data'] = data
+        _catalog_manifest['index'] = {category_id: (body + start, body + end)
+                                      for category_id, (start, end) in header['index'].items()}
+        if header['categories_mtime'] == _get_mtime(CATEGORIES_FILE):
+            _catalog['categories'] = header['categories']
+            _catalog['categories_mtime'] = header['categories_mtime']
+            _catalog['categories_checked'] = time.monotonic()
+            _catalog['categories_version'] = _next_catalog_version()
+    return True
+
+def _load_manifest_category(category_id):
+    """Decode a category from the manifest into a catalog snapshot (called with _catalog_lock held)."""
+    start, end = _catalog_manifest['index'].pop(category_id)
+    document = json.loads(_catalog_manifest['data'][start:end])
+    
+    items = {}
+    for item_id, item in document['items'].items():
+        # Seed the hash cache too, so files are only read again once they change
+        for key, (size, mtime, digest) in item['files'].items():
+            _asset_hashes[f"{category_id}/{item_id}/{key}"] = (size, mtime, digest)
+        files = {key: (size, digest) for key, (size, mtime, digest) in item['files'].items()}
+        items[item_id] = _build_entry(category_id, item_id, item['english'], item['welsh'], files,
+                                      tuple(item['signature']))
+    return {
+        'version': _next_catalog_version(),
+        'mtime': document['mtime'],
+        'checked': time.monotonic(),
+        'names': document['names'],
+        'items': items
+    }
+
+def get_items_in_category(category_id):
+    """Get all items in a category with basic info."""
+    if not is_valid_identifier(category_id):
+        return []
+    
+    items = get_catalog_category(category_id)
+    if items is None:
+        return []
     
-    # Get English variations
-    english_variations = []
-    english_path = os.path.join(item_dir, 'english.txt')
-    if os.path.exists(english_path):
-        with open(english_path, 'r', encoding='utf-8') as f:
-            english_variations = [line.strip() for line in f if line.strip()]
-    
-    # Get Welsh variations
-    welsh_variations = []
-    welsh_path = os.path.join(item_dir, 'welsh.txt')
-    if os.path.exists(welsh_path):
-        with open(welsh_path, 'r', encoding='utf-8') as f:
-            welsh_variations = [line.strip() for line in f if line.strip()]
-    
-    # Get images
-    images = []
-    images_dir = os.path.join(item_dir, 'images')
-    if os.path.exists(images_dir):
-        images = [f for f in os.listdir(images_dir) 
-                 if os.path.isfile(os.path.join(images_dir, f)) and 
-                 any(f.lower().endswith(ext) for ext in ALLOWED_IMAGE_EXTENSIONS)]
-    
-    # Get English audio
-    english_audio = []
-    english_audio_dir = os.path.join(item_dir, 'english_audio')
-    if os.path.exists(english_audio_dir):
-        english_audio = [f for f in os.listdir(english_audio_dir) 
-                        if os.path.isfile(os.path.join(english_audio_dir, f)) and 
-                        any(f.lower().endswith(ext) for ext in ALLOWED_AUDIO_EXTENSIONS)]
-    
-    # Get Welsh audio
-    welsh_audio = []
-    welsh_audio_dir = os.path.join(item_dir, 'welsh_audio')
-    if os.path.exists(welsh_audio_dir):
-        welsh_audio = [f for f in os.listdir(welsh_audio_dir) 
-                      if os.path.isfile(os.path.join(welsh_audio_dir, f)) and 
-                      any(f.lower().endswith(ext) for ext in ALLOWED_AUDIO_EXTENSIONS)]
+    return [{
+        'id': entry['id'],
+        'welsh': entry['welsh_variations'][0] if entry['welsh_variations'] else "",
+        'images_count': len(entry['images']),
+        'english_audio_count': len(entry['english_audio']),
+        'welsh_audio_count': len(entry['welsh_audio']),
+        'english_variations_count': len(entry['english_variations']),
+        'welsh_variations_count': len(entry['welsh_variations'])
+    } for entry in items.values()]
+
+def get_item_details(category_id, item_id):
+    """Get detailed information about a specific item."""
+    entry = get_catalog_item(category_id, item_id) or {}
+    welsh_variations = entry.get('welsh_variations', [])
     
     return {
         'id': item_id,
         'welsh': welsh_variations[0] if welsh_variations else "",
-        'english_variations': english_variations,
+        'english_variations': entry.get('english_variations', []),
         'welsh_variations': welsh_variations,
-        'images': images,
-        'english_audio': english_audio,
-        'welsh_audio': welsh_audio
+        'images': entry.get('images', []),
+        'english_audio': entry.get('english_audio', []),
+        'welsh_audio': entry.get('welsh_audio', [])
     }
 
 def create_item_structure(category_id, item_id, welsh_word, english_variations, welsh_variations):
@@ -192,57 +1393,2369 @@ def create_item_structure(category_id, item_id, welsh_word, english_variations,
     os.makedirs(os.path.join(item_dir, 'english_audio'), exist_ok=True)
     os.makedirs(os.path.join(item_dir, 'welsh_audio'), exist_ok=True)
     
-    # Create English variations file
-    with open(os.path.join(item_dir, 'english.txt'), 'w', encoding='utf-8') as f:
-        f.write('\n'.join(english_variations))
+    if CATALOG_BACKEND == 'sqlite':
+        db_save_item(category_id, item_id, english_variations, welsh_variations)
+    else:
+        # Create the English and Welsh variations files
+        write_metadata_files({
+            os.path.join(item_dir, 'english.txt'): '\n'.join(english_variations),
+            os.path.join(item_dir, 'welsh.txt'): '\n'.join(welsh_variations)
+        })
+    
+    # Create placeholder files
+    create_placeholder_file(os.path.join(item_dir, 'images', 'placeholder.jpg'), 
+                           f"Placeholder image for {item_id}")
+    
+    create_placeholder_file(os.path.join(item_dir, 'english_audio', 'placeholder.mp3'), 
+                           f"Placeholder English audio for {item_id}")
+    
+    create_placeholder_file(os.path.join(item_dir, 'welsh_audio', 'placeholder.mp3'), 
+                           f"Placeholder Welsh audio for {welsh_word}")
+    
+    record_media_change(category_id, [item_id])
+
+def create_placeholder_file(filepath, content):
+    """Create a file with placeholder content."""
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+def update_item_variations(category_id, item_id, english_variations, welsh_variations):
+    """Update the English and Welsh variations for an item."""
+    if CATALOG_BACKEND == 'sqlite':
+        db_save_item(category_id, item_id, english_variations, welsh_variations)
+        refresh_catalog_item(category_id, item_id)
+        return
+    
+    item_dir = os.path.join(ASSETS_DIR, category_id, item_id)
+    
+    # Update the English and Welsh variations
+    write_metadata_files({
+        os.path.join(item_dir, 'english.txt'): '\n'.join(english_variations),
+        os.path.join(item_dir, 'welsh.txt'): '\n'.join(welsh_variations)
+    })
+    
+    refresh_catalog_item(category_id, item_id)
+
+def delete_media_file(category_id, item_id, media_dir, filename):
+    """Delete a media file with its generated variants, releasing its content store reference."""
+    media_path = os.path.join(ASSETS_DIR, category_id, item_id, media_dir)
+    relpath = f"{category_id}/{item_id}/{media_dir}/{filename}"
+    digest = get_asset_hash(relpath)
+    os.remove(os.path.join(media_path, filename))
+    for name in [filename] + remove_derived_files(media_path, filename):
+        forget_asset_hashes(f"{category_id}/{item_id}/{media_dir}/{name}")
+    if digest:
+        release_store_paths([_store_path(digest, filename)])
+    record_media_change(category_id, [item_id])
+
+def delete_item_directory(category_id, item_id):
+    """Delete an item directory and all its contents."""
+    item_dir = os.path.join(ASSETS_DIR, category_id, item_id)
+    entry = get_catalog_item(category_id, item_id)
+    if os.path.exists(item_dir):
+        shutil.rmtree(item_dir)
+    if entry:
+        release_store_paths(get_store_paths([entry]))
+    if CATALOG_BACKEND == 'sqlite':
+        db_delete_items(category_id, item_id)
+    forget_asset_hashes(f"{category_id}/{item_id}")
+    refresh_catalog_item(category_id, item_id)
+    for audio_type in AUDIO_TYPES:
+        schedule_audio_sprite(category_id, audio_type)
+    schedule_image_atlas(category_id)
+
+def delete_category_directory(category_id):
+    """Delete a category directory and all its contents."""
+    category_dir = os.path.join(ASSETS_DIR, category_id)
+    store_paths = get_store_paths((get_catalog_category(category_id) or {}).values())
+    if os.path.exists(category_dir):
+        shutil.rmtree(category_dir)
+    release_store_paths(store_paths)
+    if CATALOG_BACKEND == 'sqlite':
+        db_delete_items(category_id)
+    forget_asset_hashes(category_id)
+    forget_catalog_category(category_id)
+    
+    # Also remove from categories.json
+    with metadata_lock():
+        categories = get_categories(revalidate=True)
+        categories = [c for c in categories if c['id'] != category_id]
+        save_categories(categories)
+
+# Audio transcoding
+# Uploaded WAV files are handed to a small pool of background threads that write
+# compact speech variants next to them; the original file is never modified.
+_audio_executor = None
+_audio_executor_lock = threading.Lock()
+
+def _read_speech_frames(source_path):
+    """Read an audio file as mono, 16-bit PCM frames at SPEECH_SAMPLE_RATE.
+    
+    PCM WAV files are converted with the stdlib; anything else (or WAV files
+    when audioop is unavailable) needs ffmpeg.
+    """
+    if source_path.lower().endswith('.wav') and audioop is not None:
+        with wave.open(source_path, 'rb') as w:
+            channels, width, rate = w.getnchannels(), w.getsampwidth(), w.getframerate()
+            frames = w.readframes(w.getnframes())
+        
+        if width == 1:
+            frames = audioop.bias(frames, 1, -128)  # 8-bit WAV samples are unsigned
+        if width != 2:
+            frames = audioop.lin2lin(frames, width, 2)
+        if channels == 2:
+            frames = audioop.tomono(frames, 2, 0.5, 0.5)
+        elif channels != 1:
+            raise ValueError(f"Unsupported channel count: {channels}")
+        if rate != SPEECH_SAMPLE_RATE:
+            frames, _ = audioop.ratecv(frames, 2, 1, rate, SPEECH_SAMPLE_RATE, None)
+        return frames
+    
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        raise ValueError(f"No decoder available for {os.path.basename(source_path)}")
+    result = subprocess.run([ffmpeg, '-nostdin', '-loglevel', 'error', '-i', source_path, '-vn',
+                             '-f', 's16le', '-ac', '1', '-ar', str(SPEECH_SAMPLE_RATE), '-'],
+                            check=True, capture_output=True, timeout=AUDIO_TRANSCODE_TIMEOUT)
+    return result.stdout
+
+def _write_wav(target_path, frames):
+    """Write mono, 16-bit PCM frames at SPEECH_SAMPLE_RATE to a WAV file."""
+    with wave.open(target_path, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(SPEECH_SAMPLE_RATE)
+        w.writeframes(frames)
+
+def _encode_with_ffmpeg(source_path, target_base):
+    """Write the compressed (FFMPEG_AUDIO_VARIANTS) versions of an audio file, if ffmpeg is installed."""
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        return
+    
+    for fmt, encoder_args in FFMPEG_AUDIO_VARIANTS.items():
+        tmp_path = os.path.join(os.path.dirname(target_base), f".tmp-{uuid.uuid4().hex}.{fmt}")
+        try:
+            subprocess.run([ffmpeg, '-nostdin', '-loglevel', 'error', '-y', '-i', source_path,
+                            '-vn', '-ac', '1', *encoder_args, tmp_path],
+                           check=True, capture_output=True, timeout=AUDIO_TRANSCODE_TIMEOUT)
+            os.replace(tmp_path, f"{target_base}.{fmt}")
+        except (subprocess.SubprocessError, OSError) as e:
+            app.logger.warning(f"Could not encode {source_path} to {fmt}: {str(e)}")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+def transcode_audio(source_path):
+    """Write the speech variants of a WAV file into its media directory's .derived folder."""
+    derived_dir = os.path.join(os.path.dirname(source_path), DERIVED_DIR_NAME)
+    os.makedirs(derived_dir, exist_ok=True)
+    target_base = os.path.join(derived_dir, os.path.basename(source_path))
+    
+    # Each variant is written to a temporary name first so it never appears half-written
+    if audioop is not None:
+        tmp_path = os.path.join(derived_dir, f".tmp-{uuid.uuid4().hex}.wav")
+        try:
+            _write_wav(tmp_path, _read_speech_frames(source_path))
+            os.replace(tmp_path, f"{target_base}.speech.wav")
+        except (wave.Error, ValueError, EOFError) as e:
+            app.logger.warning(f"Could not downsample {source_path}: {str(e)}")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    _encode_with_ffmpeg(source_path, f"{target_base}.speech")
+
+def _transcode_item_audio(category_id, item_id, audio_type, filename):
+    """Transcode one audio file, refresh its item in the catalog and queue a sprite rebuild."""
+    try:
+        transcode_audio(os.path.join(ASSETS_DIR, category_id, item_id, audio_type, filename))
+        record_media_change(category_id, [item_id])
+        schedule_audio_sprite(category_id, audio_type)
+    except Exception as e:
+        app.logger.error(f"Error transcoding {category_id}/{item_id}/{audio_type}/{filename}: {str(e)}")
+
+def _get_audio_executor():
+    """Get the background thread pool used for audio work, starting it on first use."""
+    global _audio_executor
+    with _audio_executor_lock:
+        if _audio_executor is None:
+            _audio_executor = ThreadPoolExecutor(max_workers=AUDIO_TRANSCODE_WORKERS,
+                                                 thread_name_prefix='audio-transcode')
+        return _audio_executor
+
+def submit_audio_transcode(category_id, item_id, audio_type, filename):
+    """Queue an uploaded WAV file for transcoding in the background."""
+    return _get_audio_executor().submit(_transcode_item_audio, category_id, item_id, audio_type, filename)
+
+# Audio sprites
+# All clips of one language in a category are concatenated into a single file,
+# with a JSON manifest of where each clip starts and ends, so a client can fetch
+# one file per category and play clips by offset. Sprites live in the category's
+# .derived folder as <audio_type>.sprite.<format> and <audio_type>.sprite.json.
+_sprite_build_locks = {}
+_pending_sprites = set()
+
+def _sprite_path(category_id, audio_type, fmt):
+    """Get the path of a category's audio sprite (or its manifest), relative to ASSETS_DIR."""
+    return f"{category_id}/{DERIVED_DIR_NAME}/{audio_type}.sprite.{fmt}"
+
+def get_media_sources_version(items, media_dir):
+    """Get a hash of the files of one media type in a category, to tell when a sprite or atlas is out of date."""
+    sources = [(item_id, f, entry['hashes'].get(f"{media_dir}/{f}"))
+               for item_id, entry in items.items() for f in entry[media_dir]]
+    return hashlib.sha256(json.dumps(sources).encode('utf-8')).hexdigest()[:16]
+
+def get_derived_manifest(relpath):
+    """Get a sprite or atlas manifest from the assets directory, or None if it hasn't been built yet."""
+    manifest_path = os.path.join(ASSETS_DIR, relpath)
+    mtime = _get_mtime(manifest_path)
+    if mtime is None:
+        return None
+    
+    cached = _derived_manifests.get(relpath)
+    fresh = bool(cached) and cached[0] == mtime
+    count_cache('derived_manifest', fresh)
+    if fresh:
+        return cached[1]
+    
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    _derived_manifests[relpath] = (mtime, manifest)
+    return manifest
+
+def _write_derived_manifest(relpath, manifest):
+    """Atomically write a sprite or atlas manifest."""
+    manifest_path = os.path.join(ASSETS_DIR, relpath)
+    tmp_path = os.path.join(os.path.dirname(manifest_path), f".tmp-{uuid.uuid4().hex}.json")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+def _sprite_build_lock(category_id, audio_type):
+    """Get the lock held while a sprite is built."""
+    with _audio_executor_lock:
+        return _sprite_build_locks.setdefault((category_id, audio_type), threading.RLock())
+
+def _reusable_sprite_clips(category_id, audio_type):
+    """Get the clips of the current sprite WAV as {(item_id, file, hash): (first frame, frame count)}."""
+    manifest = get_derived_manifest(_sprite_path(category_id, audio_type, 'json'))
+    wav_relpath = _sprite_path(category_id, audio_type, 'wav')
+    wav_digest = get_asset_hash(wav_relpath)
+    # Only trust offsets that were written together with the WAV that is on disk now
+    if not manifest or not wav_digest or manifest['sprites'].get('wav', {}).get('url') != asset_url(wav_relpath, wav_digest):
+        return {}
+    return {(item_id, clip['file'], clip['hash']): tuple(clip['frames'])
+            for item_id, item_clips in manifest['clips'].items() for clip in item_clips
+            if clip.get('hash') and 'frames' in clip}
+
+def build_audio_sprite(category_id, audio_type):
+    """Concatenate every clip of one language in a category into a sprite and write its manifest.
+    
+    Clips whose source file hasn't changed are copied from the previous sprite
+    WAV, and the others are read from their speech WAV variants where those
+    exist, so only new or changed clips need decoding and resampling. The
+    compressed sprites are encoded again from the whole WAV.
+    """
+    with _sprite_build_lock(category_id, audio_type):
+        items = get_catalog_category(category_id)
+        if items is None:
+            return None
+        
+        derived_dir = os.path.join(ASSETS_DIR, category_id, DERIVED_DIR_NAME)
+        os.makedirs(derived_dir, exist_ok=True)
+        gap = b'\0\0' * int(SPRITE_GAP_SECONDS * SPEECH_SAMPLE_RATE)
+        clips = {}
+        length = 0
+        
+        wav_path = os.path.join(ASSETS_DIR, _sprite_path(category_id, audio_type, 'wav'))
+        reusable = _reusable_sprite_clips(category_id, audio_type)
+        previous = None
+        tmp_path = os.path.join(derived_dir, f".tmp-{uuid.uuid4().hex}.wav")
+        try:
+            if reusable:
+                previous = wave.open(wav_path, 'rb')
+            with wave.open(tmp_path, 'wb') as sprite:
+                sprite.setnchannels(1)
+                sprite.setsampwidth(2)
+                sprite.setframerate(SPEECH_SAMPLE_RATE)
+                for item_id, entry in items.items():
+                    for f in entry[audio_type]:
+                        digest = entry['hashes'].get(f"{audio_type}/{f}")
+                        media_dir = os.path.join(ASSETS_DIR, category_id, item_id, audio_type)
+                        speech = [v for v in entry['variants'][f"{audio_type}/{f}"]
+                                  if v['tag'] == 'speech' and v['format'] == 'wav']
+                        source_path = (os.path.join(media_dir, DERIVED_DIR_NAME, speech[0]['name'])
+                                       if speech else os.path.join(media_dir, f))
+                        try:
+                            if (item_id, f, digest) in reusable:
+                                first, count = reusable[(item_id, f, digest)]
+                                previous.setpos(first)
+                                frames = previous.readframes(count)
+                            else:
+                                frames = _read_speech_frames(source_path)
+                        except (wave.Error, ValueError, EOFError, subprocess.SubprocessError, OSError) as e:
+                            app.logger.warning(f"Leaving {item_id}/{audio_type}/{f} out of the sprite: {str(e)}")
+                            continue
+                        
+                        start = length
+                        sprite.writeframes(frames)
+                        length += len(frames) // 2
+                        clips.setdefault(item_id, []).append({
+                            'file': f,
+                            'start': round(start / SPEECH_SAMPLE_RATE, 3),
+                            'end': round(length / SPEECH_SAMPLE_RATE, 3),
+                            'hash': digest,
+                            'frames': [start, length - start]
+                        })
+                        sprite.writeframes(gap)
+                        length += len(gap) // 2
+            os.replace(tmp_path, wav_path)
+        finally:
+            if previous:
+                previous.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        
+        _encode_with_ffmpeg(wav_path, os.path.join(derived_dir, f"{audio_type}.sprite"))
+        
+        sprites = {}
+        for fmt in ['wav'] + list(FFMPEG_AUDIO_VARIANTS):
+            relpath = _sprite_path(category_id, audio_type, fmt)
+            digest = get_asset_hash(relpath)
+            if digest:
+                sprites[fmt] = {'url': asset_url(relpath, digest),
+                                'size': os.path.getsize(os.path.join(ASSETS_DIR, relpath))}
+        
+        manifest = {
+            'version': get_media_sources_version(items, audio_type),
+            'duration': round(length / SPEECH_SAMPLE_RATE, 3),
+            'sprites': sprites,
+            'clips': clips
+        }
+        _write_derived_manifest(_sprite_path(category_id, audio_type, 'json'), manifest)
+        return manifest
+
+def _build_audio_sprite_task(category_id, audio_type):
+    """Rebuild a sprite in the background, logging rather than raising errors."""
+    # Wait for a build already running first, so changes made meanwhile are all picked up by one more build
+    with _sprite_build_lock(category_id, audio_type):
+        with _audio_executor_lock:
+            # Any change made from here on needs another build
+            _pending_sprites.discard((category_id, audio_type))
+        try:
+            build_audio_sprite(category_id, audio_type)
+        except Exception as e:
+            app.logger.error(f"Error building {audio_type} sprite for {category_id}: {str(e)}")
+
+def schedule_audio_sprite(category_id, audio_type):
+    """Queue a sprite rebuild, unless one is already waiting to start or for a running build (or in a command line tool)."""
+    if RUNNING_COMMAND:
+        return
+    
+    with _audio_executor_lock:
+        if (category_id, audio_type) in _pending_sprites:
+            return
+        _pending_sprites.add((category_id, audio_type))
+    _get_audio_executor().submit(_build_audio_sprite_task, category_id, audio_type)
+
+# Image variants
+# Resizing and encoding is CPU bound, so it runs in a pool of worker processes. They
+# are started from a fresh server process (or spawned where forkserver isn't
+# available) rather than forked from a web worker, whose other threads may be
+# holding locks at the time of the fork.
+_image_executor = None
+_image_executor_lock = threading.Lock()
+
+def _get_image_executor():
+    """Get the process pool used for image work, starting it on first use."""
+    global _image_executor
+    with _image_executor_lock:
+        if _image_executor is None:
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _image_executor = ProcessPoolExecutor(max_workers=IMAGE_VARIANT_WORKERS,
+                                                  mp_context=multiprocessing.get_context(method))
+        return _image_executor
+
+def _replace_image_executor(broken):
+    """Drop a pool that lost a process, so the next job starts a new one (unless another thread already did)."""
+    global _image_executor
+    with _image_executor_lock:
+        if _image_executor is broken:
+            _image_executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+def submit_image_job(fn, *args):
+    """Run a function in the image process pool, returning a future of its result.
+    
+    A pool whose process died (killed, out of memory, a crash in Pillow) can't take
+    any more work, so it is replaced and the job is tried once more in the new one.
+    """
+    result = Future()
+    
+    def attempt(retry):
+        executor = _get_image_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool as e:
+            future = Future()
+            future.set_exception(e)
+        
+        def done(future):
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool) and retry:
+                _replace_image_executor(executor)
+                attempt(False)
+            elif error:
+                result.set_exception(error)
+            else:
+                result.set_result(future.result())
+        future.add_done_callback(done)
+    
+    attempt(True)
+    return result
+
+def _variant_width(variant):
+    """Get the width of an image variant from its tag (e.g. '320w')."""
+    return int(variant['tag'][:-1])
+
+def generate_image_variants(source_path, force=False):
+    """Write resized copies of an image in each modern format into its .derived folder.
+    
+    This runs in a worker process, so it only works with the filesystem and
+    leaves refreshing the catalog to the caller.
+    """
+    with Image.open(source_path) as image:
+        image.seek(0)  # First frame of animated GIFs
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+    
+    derived_dir = os.path.join(os.path.dirname(source_path), DERIVED_DIR_NAME)
+    os.makedirs(derived_dir, exist_ok=True)
+    filename = os.path.basename(source_path)
+    
+    widths = sorted({w for w in IMAGE_VARIANT_WIDTHS if w < image.width} | {image.width})
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for fmt in IMAGE_VARIANT_FORMATS:
+            target_path = os.path.join(derived_dir, f"{filename}.{width}w.{fmt}")
+            if os.path.exists(target_path) and not force:
+                continue
+            tmp_path = os.path.join(derived_dir, f".tmp-{uuid.uuid4().hex}.{fmt}")
+            try:
+                resized.save(tmp_path, format=fmt.upper(), quality=IMAGE_VARIANT_QUALITY)
+                os.replace(tmp_path, target_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+def submit_image_variants(category_id, item_id, filename, force=False):
+    """Queue an image for variant generation, refreshing its item in the catalog when done."""
+    if not IMAGE_VARIANT_FORMATS:
+        return None
+    
+    def done(future):
+        if future.exception():
+            app.logger.error(f"Error generating variants of {category_id}/{item_id}/images/{filename}: "
+                             f"{str(future.exception())}")
+        record_media_change(category_id, [item_id])
+    
+    future = submit_image_job(generate_image_variants,
+                              os.path.join(ASSETS_DIR, category_id, item_id, 'images', filename), force)
+    future.add_done_callback(done)
+    return future
+
+def pick_image_variant(relpath, min_width=None):
+    """Pick the best variant of an original image for the current request's Accept header.
+    
+    Returns the variant's path and content hash, or None to serve the original.
+    With min_width the narrowest variant at least that wide is chosen, otherwise
+    the full-width variant is used if it is smaller than the original.
+    """
+    parts = relpath.split('/')
+    if len(parts) != 4 or parts[2] != 'images' or not all(is_valid_identifier(p) for p in parts[:2]):
+        return None
+    entry = get_catalog_item(parts[0], parts[1])
+    if entry is None:
+        return None
+    
+    accepted = {value for value, quality in request.accept_mimetypes if quality > 0}
+    candidates = [v for v in entry['variants'].get(f"images/{parts[3]}", [])
+                  if IMAGE_FORMAT_MIMETYPES.get(v['format']) in accepted]
+    if not candidates:
+        return None
+    
+    widths = sorted({_variant_width(v) for v in candidates})
+    wide_enough = [w for w in widths if min_width and w >= min_width]
+    width = wide_enough[0] if wide_enough else widths[-1]
+    best = min((v for v in candidates if _variant_width(v) == width), key=lambda v: v['size'])
+    if not min_width and best['size'] >= entry['sizes'].get(f"images/{parts[3]}", 0):
+        return None
+    
+    key = f"images/{DERIVED_DIR_NAME}/{best['name']}"
+    return f"{parts[0]}/{parts[1]}/{key}", entry['hashes'].get(key)
+
+# Image atlases
+# The atlas of a category lives in its .derived folder as images.atlas.<format>
+# with a images.atlas.json manifest of where each image was placed.
+_pending_atlases = set()
+_atlas_executor = None
+
+def _atlas_path(category_id, fmt):
+    """Get the path of a category's image atlas (or its manifest), relative to ASSETS_DIR."""
+    return f"{category_id}/{DERIVED_DIR_NAME}/images.atlas.{fmt}"
+
+def build_image_atlas(category_id, sources, version):
+    """Pack thumbnails of a category's images into atlas sheets and write the manifest.
+    
+    sources is a list of (item_id, filename) pairs. This runs in a worker
+    process, so it is given everything it needs rather than reading the catalog.
+    """
+    thumbnails = []
+    for item_id, filename in sources:
+        try:
+            with Image.open(os.path.join(ASSETS_DIR, category_id, item_id, 'images', filename)) as image:
+                image.draft('RGB', (ATLAS_TILE_SIZE, ATLAS_TILE_SIZE))  # Faster JPEG decoding
+                image.seek(0)
+                image = image.convert('RGBA')
+            image.thumbnail((ATLAS_TILE_SIZE, ATLAS_TILE_SIZE), Image.LANCZOS)
+            thumbnails.append((item_id, filename, image))
+        except (OSError, ValueError):
+            continue  # Placeholders and unreadable files are left out
+    
+    columns = max(1, math.ceil(math.sqrt(len(thumbnails))))
+    rows = max(1, math.ceil(len(thumbnails) / columns))
+    sheet = Image.new('RGBA', (columns * ATLAS_TILE_SIZE, rows * ATLAS_TILE_SIZE), (0, 0, 0, 0))
+    
+    # Each thumbnail is centred in its tile
+    images = {}
+    for index, (item_id, filename, image) in enumerate(thumbnails):
+        x = (index % columns) * ATLAS_TILE_SIZE + (ATLAS_TILE_SIZE - image.width) // 2
+        y = (index // columns) * ATLAS_TILE_SIZE + (ATLAS_TILE_SIZE - image.height) // 2
+        sheet.paste(image, (x, y))
+        images.setdefault(item_id, []).append({'file': filename, 'x': x, 'y': y, 'w': image.width, 'h': image.height})
+    
+    derived_dir = os.path.join(ASSETS_DIR, category_id, DERIVED_DIR_NAME)
+    os.makedirs(derived_dir, exist_ok=True)
+    sheets = {}
+    for fmt in [f for f in IMAGE_VARIANT_FORMATS if f == 'webp'] + ['png']:
+        relpath = _atlas_path(category_id, fmt)
+        tmp_path = os.path.join(derived_dir, f".tmp-{uuid.uuid4().hex}.{fmt}")
+        try:
+            sheet.save(tmp_path, format=fmt.upper(), **({'quality': IMAGE_VARIANT_QUALITY} if fmt == 'webp' else {'optimize': True}))
+            os.replace(tmp_path, os.path.join(ASSETS_DIR, relpath))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        sheets[fmt] = asset_url(relpath, get_asset_hash(relpath))
+    
+    manifest = {
+        'version': version,
+        'tileSize': ATLAS_TILE_SIZE,
+        'width': sheet.width,
+        'height': sheet.height,
+        'sheets': sheets,
+        'images': images
+    }
+    _write_derived_manifest(_atlas_path(category_id, 'json'), manifest)
+    return manifest
+
+def _build_image_atlas_task(category_id):
+    """Rebuild an atlas in the image worker pool, returning its manifest (None if the category is gone)."""
+    with _image_executor_lock:
+        # Any change made from here on needs another build
+        _pending_atlases.discard(category_id)
+    items = get_catalog_category(category_id)
+    if items is None:
+        return None
+    
+    sources = [(item_id, f) for item_id, entry in items.items() for f in entry['images']]
+    version = get_media_sources_version(items, 'images')
+    try:
+        return submit_image_job(build_image_atlas, category_id, sources, version).result()
+    except Exception as e:
+        app.logger.error(f"Error building image atlas for {category_id}: {str(e)}")
+        raise
+
+def schedule_image_atlas(category_id):
+    """Queue an atlas rebuild, unless one is already waiting to start (or in a command line tool)."""
+    global _atlas_executor
+    if RUNNING_COMMAND or not IMAGE_VARIANT_FORMATS or get_catalog_category(category_id) is None:
+        return None
+    
+    with _image_executor_lock:
+        if category_id in _pending_atlases:
+            return None
+        _pending_atlases.add(category_id)
+        if _atlas_executor is None:
+            # Threads that take the sources when a build starts and wait for the worker process
+            _atlas_executor = ThreadPoolExecutor(max_workers=IMAGE_VARIANT_WORKERS, thread_name_prefix='image-atlas')
+    return _atlas_executor.submit(_build_image_atlas_task, category_id)
+
+# Bulk import
+# Items arrive as a zip archive (or a directory) laid out like a category folder,
+# <item_id>/welsh.txt, <item_id>/english.txt and <item_id>/<media_dir>/<file>,
+# nested under any number of folders. Items are validated and extracted into a
+# staging folder inside the category by a pool of threads, reading archive members
+# one at a time, then moved into place together as a single catalog change.
+IMPORT_TEXT_FILES = ('english.txt', 'welsh.txt')
+
+@contextmanager
+def open_import_source(source):
+    """Open a zip archive (path or file object) or directory, yielding its files as {path: (size, opener)}."""
+    if isinstance(source, str) and os.path.isdir(source):
+        files = {}
+        for root, dirs, names in os.walk(source):
+            for name in names:
+                path = os.path.join(root, name)
+                relpath = os.path.relpath(path, source).replace(os.sep, '/')
+                files[relpath] = (os.path.getsize(path), partial(open, path, 'rb'))
+        yield files
+        return
+    
+    with zipfile.ZipFile(source) as archive:
+        yield {info.filename: (info.file_size, partial(archive.open, info))
+               for info in archive.infolist() if not info.is_dir()}
+
+def plan_import_items(paths):
+    """Group the file paths of an import source by the item folder they belong to.
+    
+    An item folder is any folder holding an english.txt or welsh.txt. Hidden files,
+    generated variants and anything else inside an item folder are counted as ignored.
+    """
+    paths = [p for p in paths
+             if not any(part.startswith('.') or part == '__MACOSX' for part in p.split('/'))]
+    roots = {p.rpartition('/')[0] for p in paths if p.rpartition('/')[2] in IMPORT_TEXT_FILES}
+    
+    plans = {}
+    for root in sorted(roots):
+        item_id = root.rpartition('/')[2]
+        plan = plans.setdefault(item_id.lower(), {'roots': [], 'text': {}, 'media': [], 'ignored': 0})
+        plan['roots'].append(root)
+    
+    for path in paths:
+        parent, _, name = path.rpartition('/')
+        grandparent, _, media_dir = parent.rpartition('/')
+        if parent in roots and name in IMPORT_TEXT_FILES:
+            plans[parent.rpartition('/')[2].lower()]['text'][name] = path
+        elif grandparent in roots and media_dir in MEDIA_DIRS:
+            plans[grandparent.rpartition('/')[2].lower()]['media'].append((media_dir, path))
+        else:
+            root = next((r for r in roots if path.startswith(r + '/')), None)
+            if root is not None:
+                plans[root.rpartition('/')[2].lower()]['ignored'] += 1
+    return plans
+
+def _stage_import_item(files, item_id, plan, staging_dir):
+    """Validate an item and extract it into the staging folder, returning its variations and file counts."""
+    if not is_valid_identifier(item_id):
+        raise ValueError('Item ID can only contain lowercase letters, numbers, and hyphens')
+    if len(plan['roots']) > 1:
+        raise ValueError(f"Found in more than one folder: {', '.join(plan['roots'])}")
+    
+    variations = {}
+    for name in IMPORT_TEXT_FILES:
+        variations[name] = []
+        if name in plan['text']:
+            size, opener = files[plan['text'][name]]
+            if size > IMPORT_MAX_FILE_SIZE:
+                raise ValueError(f'{name} is too large')
+            with opener() as f:
+                text = f.read().decode('utf-8-sig')
+            variations[name] = [line.strip() for line in text.splitlines() if line.strip()]
+    if not variations['welsh.txt']:
+        raise ValueError('welsh.txt is missing or empty')
+    
+    item_dir = os.path.join(staging_dir, item_id)
+    for media_dir in MEDIA_DIRS:
+        os.makedirs(os.path.join(item_dir, media_dir), exist_ok=True)
+    if CATALOG_BACKEND != 'sqlite':
+        for name in IMPORT_TEXT_FILES:
+            with open(os.path.join(item_dir, name), 'w', encoding='utf-8') as f:
+                f.write('\n'.join(variations[name]))
+                f.flush()
+                os.fsync(f.fileno())
+    
+    media_count, ignored = 0, plan['ignored']
+    for media_dir, path in plan['media']:
+        size, opener = files[path]
+        filename = secure_filename(path.rpartition('/')[2])
+        if not filename or not allowed_file(filename, MEDIA_DIRS[media_dir]) or size > IMPORT_MAX_FILE_SIZE:
+            ignored += 1
+            continue
+        target_path = os.path.join(item_dir, media_dir, filename)
+        with opener() as source, open(target_path, 'wb') as target:
+            shutil.copyfileobj(source, target, 1024 * 1024)
+            target.flush()
+            os.fsync(target.fileno())
+        store_media_file(os.path.relpath(target_path, ASSETS_DIR).replace(os.sep, '/'))
+        media_count += 1
+    
+    # Flushed here, in parallel and before the move, so the move itself is only renames
+    for media_dir in MEDIA_DIRS:
+        _fsync_path(os.path.join(item_dir, media_dir))
+    _fsync_path(item_dir)
+    return variations['english.txt'], variations['welsh.txt'], media_count, ignored
+
+def import_items(category_id, source, replace=False):
+    """Import a zip archive or directory of items into an existing category, returning a report row per item."""
+    category_dir = os.path.join(ASSETS_DIR, category_id)
+    staging_dir = os.path.join(category_dir, f".import-{uuid.uuid4().hex}")
+    os.makedirs(staging_dir)
+    report = {}
+    replaced_store_paths = set()
+    
+    try:
+        with open_import_source(source) as files:
+            plans = plan_import_items(files)
+            with ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix='import') as executor:
+                futures = {}
+                for item_id, plan in sorted(plans.items()):
+                    if os.path.exists(os.path.join(category_dir, item_id)) and not replace:
+                        report[item_id] = {'id': item_id, 'status': 'skipped', 'message': 'Item already exists',
+                                           'media': 0, 'ignored': 0}
+                        continue
+                    futures[item_id] = executor.submit(_stage_import_item, files, item_id, plan, staging_dir)
+            
+            staged = {}
+            for item_id, future in futures.items():
+                try:
+                    staged[item_id] = future.result()
+                except (OSError, ValueError, zipfile.BadZipFile) as e:
+                    report[item_id] = {'id': item_id, 'status': 'failed', 'message': str(e), 'media': 0, 'ignored': 0}
+        
+        # Move everything into place, then swap the items into the catalog as one change. The
+        # media were hashed while staged and keep their size and mtime through the rename, so
+        # their hashes are carried over rather than read again.
+        replaced_dir = os.path.join(staging_dir, '.replaced')
+        os.makedirs(replaced_dir)
+        _fsync_path(staging_dir)
+        staging_relpath = os.path.relpath(staging_dir, ASSETS_DIR).replace(os.sep, '/')
+        for item_id, (english_variations, welsh_variations, media_count, ignored) in staged.items():
+            item_dir = os.path.join(category_dir, item_id)
+            existed = os.path.exists(item_dir)
+            if existed:
+                replaced_entry = get_catalog_item(category_id, item_id)
+                if replaced_entry:
+                    replaced_store_paths.update(get_store_paths([replaced_entry]))
+                os.replace(item_dir, os.path.join(replaced_dir, item_id))
+                forget_asset_hashes(f"{category_id}/{item_id}")
+            os.replace(os.path.join(staging_dir, item_id), item_dir)
+            move_asset_hashes(f"{staging_relpath}/{item_id}", f"{category_id}/{item_id}")
+            report[item_id] = {'id': item_id, 'status': 'replaced' if existed else 'added', 'message': '',
+                               'media': media_count, 'ignored': ignored}
+        _fsync_path(category_dir)  # Makes the renames durable
+        
+        if CATALOG_BACKEND == 'sqlite' and staged:
+            db_save_items(category_id, {item_id: values[:2] for item_id, values in staged.items()})
+        record_media_change(category_id, list(staged))
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        forget_asset_hashes(os.path.relpath(staging_dir, ASSETS_DIR).replace(os.sep, '/'))
+        release_store_paths(replaced_store_paths)
+    
+    # Variants, sprites and the atlas are generated in the background as for uploads
+    items = get_catalog_category(category_id) or {}
+    for item_id in staged:
+        entry = items.get(item_id)
+        if not entry:
+            continue
+        for filename in entry['images']:
+            submit_image_variants(category_id, item_id, filename)
+        for audio_type in AUDIO_TYPES:
+            for filename in entry[audio_type]:
+                if filename.lower().endswith('.wav'):
+                    submit_audio_transcode(category_id, item_id, audio_type, filename)
+    if staged:
+        for audio_type in AUDIO_TYPES:
+            schedule_audio_sprite(category_id, audio_type)
+        schedule_image_atlas(category_id)
+    
+    return [report[item_id] for item_id in sorted(report)]
+
+# Export
+# Categories are written out as a zip laid out like assets/ (and accepted by the
+# bulk import), streamed chunk by chunk as it is built so memory use doesn't grow
+# with the size of the category. Generated variants are left out.
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# Media in these formats is already compressed, so it is stored as-is
+EXPORT_STORED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'webp', 'avif', 'mp3', 'ogg', 'm4a'}
+
+class ZipStream:
+    """A write-only file object that hands out what was written so far, for streaming a zip."""
+    def __init__(self):
+        self.chunks = []
+    
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def _export_members(category_id):
+    """List the files of a category export as (archive path, source path, text) with one of the last two set."""
+    items = get_catalog_category(category_id) or {}
+    for item_id, entry in items.items():
+        prefix = f"{category_id}/{item_id}"
+        # Text is taken from the catalog so the export works with either storage backend
+        yield f"{prefix}/english.txt", None, '\n'.join(entry['english_variations'])
+        yield f"{prefix}/welsh.txt", None, '\n'.join(entry['welsh_variations'])
+        for media_dir in MEDIA_DIRS:
+            for filename in entry[media_dir]:
+                path = os.path.join(ASSETS_DIR, category_id, item_id, media_dir, filename)
+                yield f"{prefix}/{media_dir}/{filename}", path, None
+
+def get_export_category_ids(categories):
+    """Get the categories of a whole-catalog export: the listed ones, then any other category folders."""
+    category_ids = [c['id'] for c in categories]
+    category_ids += [category_id for category_id in get_catalog_category_ids() if category_id not in category_ids]
+    return [category_id for category_id in category_ids if is_valid_category(category_id)]
+
+def generate_export(category_ids, categories=None):
+    """Generate the chunks of a zip of some categories, with categories.json at the top if given."""
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w') as archive:
+        if categories is not None:
+            archive.writestr('categories.json', json.dumps({"categories": categories}, indent=2),
+                             compress_type=zipfile.ZIP_DEFLATED)
+            yield stream.pop()
+        
+        for category_id in category_ids:
+            for arcname, path, text in _export_members(category_id):
+                if path is None:
+                    archive.writestr(arcname, text, compress_type=zipfile.ZIP_DEFLATED)
+                    yield stream.pop()
+                    continue
+                
+                try:
+                    info = zipfile.ZipInfo.from_file(path, arcname)
+                    with open(path, 'rb') as f:
+                        if path.rpartition('.')[2].lower() not in EXPORT_STORED_EXTENSIONS:
+                            info.compress_type = zipfile.ZIP_DEFLATED
+                        with archive.open(info, 'w', force_zip64=info.file_size > 2 ** 31) as target:
+                            for chunk in iter(lambda: f.read(EXPORT_CHUNK_SIZE), b''):
+                                target.write(chunk)
+                                yield stream.pop()
+                except FileNotFoundError:
+                    continue  # Deleted since the listing was taken
+                yield stream.pop()
+    yield stream.pop()
+
+# Precompressed API responses
+# Serialized payloads keyed by name, each stored with the catalog version it was built from
+_payload_cache = {}
+
+def build_json_payload(data):
+    """Serialize data to JSON once and keep compressed copies alongside it."""
+    body = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    
+    encodings = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    if zstd is not None:
+        encodings['zstd'] = zstd.compress(body)
+    
+    return {
+        'encodings': encodings,
+        'etags': {encoding: digest if encoding == 'identity' else f"{digest}-{encoding}"
+                  for encoding in encodings}
+    }
+
+def get_json_payload(key, version, build):
+    """Get a cached payload for the given catalog version, building it if it is out of date."""
+    cached = _payload_cache.get(key)
+    fresh = bool(cached) and cached[0] == version
+    count_cache('json_payload', fresh)
+    if fresh:
+        return cached[1]
+    
+    payload = build_json_payload(build())
+    _payload_cache[key] = (version, payload)
+    return payload
+
+def send_json_payload(payload):
+    """Send a prebuilt payload, answering If-None-Match with a 304 and honouring Accept-Encoding."""
+    encoding = 'identity'
+    for candidate in ('zstd', 'gzip'):
+        if candidate in payload['encodings'] and request.accept_encodings[candidate]:
+            encoding = candidate
+            break
+    
+    # A cached copy in any encoding is still current; the 304 names the one that matched, so a
+    # cache holding the gzip copy keeps it (checking the negotiated encoding first, e.g. for "*")
+    matched = next((e for e in [encoding] + list(payload['etags'])
+                    if request.if_none_match.contains(payload['etags'][e])), None)
+    if matched:
+        response = app.response_class(status=304)
+        response.set_etag(payload['etags'][matched])
+    else:
+        response = app.response_class(payload['encodings'][encoding], mimetype='application/json')
+        if encoding != 'identity':
+            response.content_encoding = encoding
+        response.set_etag(payload['etags'][encoding])
+    
+    # Let browsers keep a copy but revalidate it, since admins can change the catalog at any time
+    response.vary.add('Accept-Encoding')
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def get_categories_payload():
+    """Get the cached payload of the category list, revalidating categories.json first."""
+    get_categories()
+    # Read the version only after revalidating, so an edit by another worker gets a new payload
+    return get_json_payload('categories', _catalog['categories_version'], get_categories)
+
+def get_items_payload(category_id, snapshot, audio_formats=DEFAULT_AUDIO_FORMATS):
+    """Get the cached payload of a category's items for a set of audio formats."""
+    return get_json_payload(('items', category_id, audio_formats), snapshot['version'],
+                            lambda: get_item_records(category_id, snapshot['items'], audio_formats))
+
+# Paged item listings
+# The items API can return a category a page at a time (?limit=, then ?cursor= with the
+# nextCursor of the previous page), in ID order and optionally only with the items that
+# have images, English audio or Welsh audio of their own (?media=welshAudio). A cursor
+# is the ID of the last item of the previous page, so it means the same in every worker
+# process and after any edit: the walk carries on after that ID in the current catalog,
+# which may include edits made since the first page but never repeats or skips an item
+# that was there all along.
+ITEMS_PAGE_DEFAULT = 100
+ITEMS_PAGE_MAX = 1000
+
+# Media filter name (as the item object field) -> media folder
+ITEMS_MEDIA_FILTERS = {'images': 'images', 'englishAudio': 'english_audio', 'welshAudio': 'welsh_audio'}
+
+# Keyed by (category ID, audio formats, media filter): (catalog version, item objects, IDs)
+_item_listings = {}
+_item_listings_lock = threading.Lock()
+
+def parse_media_filter(value):
+    """Parse a comma-separated media= filter, returning the media every item must have."""
+    media = tuple(sorted({m.strip() for m in (value or '').split(',') if m.strip()}))
+    unknown = [m for m in media if m not in ITEMS_MEDIA_FILTERS]
+    if unknown:
+        raise ValueError(f"Unknown media: {', '.join(unknown)}")
+    return media
+
+def parse_items_limit(value):
+    """Parse a page size, capping it at ITEMS_PAGE_MAX."""
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("limit must be a whole number") from None
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    return min(limit, ITEMS_PAGE_MAX)
+
+def parse_items_cursor(value):
+    """Parse a cursor from a previous page into the last item ID it returned."""
+    if not is_valid_identifier(value):
+        raise ValueError("Invalid cursor")
+    return value
+
+def filter_item_records(records, items, media):
+    """Keep the item objects whose catalog entries have files of every requested kind of media."""
+    if not media:
+        return records
+    media_dirs = [ITEMS_MEDIA_FILTERS[m] for m in media]
+    return [record for record in records if all(items[record['id']][d] for d in media_dirs)]
+
+def get_item_listing(category_id, snapshot, audio_formats, media):
+    """Get (item objects sorted by ID, their IDs) to cut pages of a category from."""
+    key = (category_id, audio_formats, media)
+    cached = _item_listings.get(key)
+    fresh = bool(cached) and cached[0] == snapshot['version']
+    count_cache('item_listing', fresh)
+    if fresh:
+        return cached[1:]
+    
+    records = sorted(filter_item_records(get_round_pool(category_id, snapshot, audio_formats),
+                                         snapshot['items'], media), key=lambda record: record['id'])
+    listing = (snapshot['version'], tuple(records), [record['id'] for record in records])
+    with _item_listings_lock:
+        _item_listings[key] = listing
+    return listing[1:]
+
+# Confusable distractors
+# For every item, the DISTRACTOR_TABLE_SIZE other items of its category it is most
+# easily confused with, scored from the primary Welsh and English forms by edit
+# distance, a shared stem and singular/plural pairing (llygad/llygaid, ear/ears).
+# Only the DISTRACTOR_CANDIDATES items sharing the most letter pairs with an item are
+# scored for its row (every item in small categories), found from a per-category index
+# of the letter pairs of each word. Tables are built by a background thread, each under
+# its own category lock, and updated item by item when the catalog changes; requests
+# never wait for one and fall back to random distractors until it is up to date.
+DISTRACTOR_TABLE_SIZE = 16
+DISTRACTOR_CANDIDATES = 64
+DISTRACTOR_EXACT_ITEMS = 100  # Categories up to this size have every pair scored
+DISTRACTOR_POSTINGS_BUDGET = 1000  # Most item IDs counted from the letter pair postings per row
+DISTRACTOR_DIFFICULTIES = ('easy', 'medium', 'hard')
+DISTRACTOR_MIN_STEM = 3
+WELSH_PLURAL_SUFFIXES = ('oedd', 'iaid', 'iau', 'aid', 'ion', 'ydd', 'edd', 'au', 'on', 'od', 'ed', 'i')
+
+# Per category: {'version', 'features': {item_id: (welsh, english)}, 'rows': {item_id: [(score, other_id)]},
+# 'postings': ({letter pair: Welsh words' item IDs}, {letter pair: English words' item IDs}),
+# 'ids': sorted item IDs, the same order as the round pool, 'positions': {item_id: index in ids}}
+_distractor_indexes = {}
+_distractor_locks = {}
+_distractor_locks_lock = threading.Lock()
+_pending_distractors = set()
+_distractor_executor = None
+
+def _pattern_masks(word):
+    """Get the character bit masks of a word, used as the pattern in edit_distance()."""
+    masks = {}
+    for i, char in enumerate(word):
+        masks[char] = masks.get(char, 0) | (1 << i)
+    return masks
+
+def edit_distance(a, b, masks=None):
+    """Get the Levenshtein distance between two words with the bit-parallel algorithm of Myers/Hyyrö."""
+    if not a or not b:
+        return len(a) + len(b)
+    masks = masks or _pattern_masks(a)
+    full = (1 << len(a)) - 1
+    last = 1 << (len(a) - 1)
+    vp, vn, distance = full, 0, len(a)
+    for char in b:
+        eq = masks.get(char, 0)
+        xv = eq | vn
+        xh = (((eq & vp) + vp) ^ vp) | eq
+        hp = vn | (~(xh | vp) & full)
+        hn = vp & xh
+        if hp & last:
+            distance += 1
+        elif hn & last:
+            distance -= 1
+        hp = ((hp << 1) | 1) & full
+        hn = (hn << 1) & full
+        vp = hn | (~(xv | hp) & full)
+        vn = hp & xv
+    return distance
+
+def _similarity(a, b, masks):
+    """Get how alike two words are, from 0 (nothing in common) to 1 (identical)."""
+    if not a or not b:
+        return 0.0
+    return 1 - edit_distance(a, b, masks) / max(len(a), len(b))
+
+def _common_prefix(a, b):
+    """Get the length of the longest common prefix of two words."""
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+def is_plural_pair(english_a, english_b, welsh_a, welsh_b):
+    """Check whether one item looks like the plural of the other (ear/ears, foot/feet, llygad/llygaid)."""
+    short, long = sorted((english_a, english_b), key=len)
+    if short and (long in (short + 's', short + 'es') or
+                  (short.endswith('y') and long == short[:-1] + 'ies') or
+                  (short.endswith('f') and long == short[:-1] + 'ves') or
+                  ('oo' in short and long == short.replace('oo', 'ee'))):
+        return True
+    
+    # Welsh plurals add a suffix, often changing a vowel of the stem (braich/breichiau, llygad/llygaid)
+    short, long = sorted((welsh_a, welsh_b), key=len)
+    if not short or long == short or not long.endswith(WELSH_PLURAL_SUFFIXES):
+        return False
+    return any(
+        long.endswith(suffix) and edit_distance(short, long[:-len(suffix)]) <= max(1, len(short) // 3)
+        for suffix in WELSH_PLURAL_SUFFIXES)
+
+def distractor_score(features_a, features_b, masks_a):
+    """Score how easily two items are confused; higher is harder to tell apart."""
+    (welsh_a, english_a), (welsh_b, english_b) = features_a, features_b
+    score = max(_similarity(welsh_a, welsh_b, masks_a[0]), 0.6 * _similarity(english_a, english_b, masks_a[1]))
+    stem = _common_prefix(welsh_a, welsh_b)
+    if stem >= DISTRACTOR_MIN_STEM:
+        score += 0.25 * stem / min(len(welsh_a), len(welsh_b))
+    if is_plural_pair(english_a, english_b, welsh_a, welsh_b):
+        score += 0.5
+    return round(score, 4)
+
+def _distractor_features(entry):
+    """Get the normalised primary Welsh and English forms an item is compared by."""
+    english = entry['english_variations'][0] if entry['english_variations'] else entry['id'].replace('_', ' ')
+    return entry['welsh_variations'][0].lower(), english.lower()
+
+def _letter_pairs(word):
+    """Get the letter pairs of a word, with its first and last letters marked."""
+    padded = f"^{word}$"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+def _update_postings(postings, item_id, features, add):
+    """Add an item's words to (or remove them from) the letter pair postings."""
+    for language, word in enumerate(features):
+        for pair in _letter_pairs(word):
+            ids = postings[language].setdefault(pair, set())
+            if add:
+                ids.add(item_id)
+            else:
+                ids.discard(item_id)
+                if not ids:
+                    del postings[language][pair]
+
+def _distractor_candidates(item_id, features, postings):
+    """Get the items to score an item against: all of them in small categories, else those sharing most letter pairs."""
+    if len(features) <= DISTRACTOR_EXACT_ITEMS:
+        return [other for other in features if other != item_id]
+    # Rare letter pairs say the most, and common ones are only counted while within budget
+    postings_of_word = sorted((postings[language].get(pair, ()) for language, word in enumerate(features[item_id])
+                               for pair in _letter_pairs(word)), key=len)
+    shared = Counter()
+    budget = DISTRACTOR_POSTINGS_BUDGET
+    for ids in postings_of_word:
+        if budget <= 0:
+            break
+        shared.update(ids)
+        budget -= len(ids)
+    shared.pop(item_id, None)
+    return [other for other, count in
+            heapq.nsmallest(DISTRACTOR_CANDIDATES, shared.items(), key=lambda s: (-s[1], s[0]))]
+
+def _rank_distractors(item_id, candidates, score):
+    """Get the row of an item: the candidates it is most easily confused with, best first."""
+    scores = [(score(item_id, other), other) for other in candidates]
+    scores.sort(key=lambda s: (-s[0], s[1]))
+    return scores[:DISTRACTOR_TABLE_SIZE]
+
+def _insert_distractor(row, score, other_id):
+    """Insert an item into a row if it ranks among the most confusable, keeping the row sorted."""
+    if len(row) >= DISTRACTOR_TABLE_SIZE and (-score, other_id) >= (-row[-1][0], row[-1][1]):
+        return
+    row.append((score, other_id))
+    row.sort(key=lambda s: (-s[0], s[1]))
+    del row[DISTRACTOR_TABLE_SIZE:]
+
+def _distractor_lock(category_id):
+    """Get the lock that serializes updates of one category's distractor table."""
+    with _distractor_locks_lock:
+        return _distractor_locks.setdefault(category_id, threading.Lock())
+
+def build_distractor_index(category_id, snapshot):
+    """Bring the distractor table of a category up to date, updating only the rows affected by changed items."""
+    with _distractor_lock(category_id):
+        index = _distractor_indexes.get(category_id)
+        if index and index['version'] >= snapshot['version']:
+            return index
+        
+        features = {item_id: _distractor_features(entry)
+                    for item_id, entry in snapshot['items'].items() if entry['welsh_variations']}
+        masks = {item_id: (_pattern_masks(welsh), _pattern_masks(english))
+                 for item_id, (welsh, english) in features.items()}
+        
+        # Scores are symmetric, so each pair is only scored once per update
+        scores = {}
+        def score(a, b):
+            pair = (a, b) if a < b else (b, a)
+            if pair not in scores:
+                scores[pair] = distractor_score(features[pair[0]], features[pair[1]], masks[pair[0]])
+            return scores[pair]
+        old_features = index['features'] if index else {}
+        rows = dict(index['rows']) if index else {}
+        postings = tuple({pair: set(ids) for pair, ids in language.items()}
+                         for language in (index['postings'] if index else ({}, {})))
+        
+        changed = {item_id for item_id in features if old_features.get(item_id) != features[item_id]}
+        removed = set(old_features) - set(features)
+        for item_id in removed | (changed & set(old_features)):
+            _update_postings(postings, item_id, old_features[item_id], add=False)
+        for item_id in changed:
+            _update_postings(postings, item_id, features[item_id], add=True)
+        for item_id in removed:
+            rows.pop(item_id, None)
+        
+        # Rows that listed a changed or removed item may now be missing their next best
+        # candidate, so they are ranked again; the rows of a changed item's candidates
+        # only need it added
+        stale = changed | {item_id for item_id, row in rows.items()
+                           if any(other in changed or other in removed for score, other in row)}
+        candidates = {}
+        for item_id in stale:
+            candidates[item_id] = _distractor_candidates(item_id, features, postings)
+            rows[item_id] = _rank_distractors(item_id, candidates[item_id], score)
+        for other in changed:
+            for item_id in set(candidates[other]) - stale:
+                row = list(rows[item_id])
+                _insert_distractor(row, score(item_id, other), other)
+                rows[item_id] = row
+        
+        index = {
+            'version': snapshot['version'],
+            'features': features,
+            'rows': rows,
+            'postings': postings,
+            'ids': tuple(sorted(features)),
+            'positions': {item_id: position for position, item_id in enumerate(sorted(features))}
+        }
+        _distractor_indexes[category_id] = index
+        return index
+
+def _build_distractor_index_task(category_id):
+    """Update a category's distractor table in the background from its latest snapshot."""
+    with _distractor_locks_lock:
+        # Changes arriving while this runs schedule another update
+        _pending_distractors.discard(category_id)
+    try:
+        snapshot = get_catalog_snapshot(category_id)
+        if snapshot is not None:
+            build_distractor_index(category_id, snapshot)
+    except Exception as e:
+        app.logger.error(f"Error building the distractor table of {category_id}: {str(e)}")
+
+def get_distractor_index(category_id, snapshot):
+    """Get the distractor table of a category, or None (scheduling an update) if it isn't up to date yet."""
+    global _distractor_executor
+    index = _distractor_indexes.get(category_id)
+    fresh = bool(index) and index['version'] == snapshot['version']
+    count_cache('distractors', fresh)
+    if fresh:
+        return index
+    
+    with _distractor_locks_lock:
+        if category_id not in _pending_distractors:
+            _pending_distractors.add(category_id)
+            if _distractor_executor is None:
+                _distractor_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='distractors')
+            _distractor_executor.submit(_build_distractor_index_task, category_id)
+    return None
+
+def unranked_distractor_index(snapshot):
+    """Get a distractor table without rows, for random picks while the real one is being built."""
+    ids = tuple(sorted(item_id for item_id, entry in snapshot['items'].items() if entry['welsh_variations']))
+    return {'features': dict.fromkeys(ids), 'rows': {}, 'ids': ids,
+            'positions': {item_id: position for position, item_id in enumerate(ids)}}
+
+def pick_distractors(index, item_id, count, difficulty, rng):
+    """Pick the IDs of count distractors for an item at a difficulty, independent of the category size.
+    
+    Hard takes the most confusable items, medium samples from the item's table
+    and easy samples from the whole category.
+    """
+    item_ids = index['ids']
+    position = index['positions'].get(item_id)
+    others = len(item_ids) - (position is not None)
+    count = min(count, others)
+    
+    row = [other for score, other in index['rows'].get(item_id, [])]
+    if difficulty == 'hard' and len(row) >= count:
+        return row[:count]
+    if difficulty == 'medium' and len(row) >= count:
+        return rng.sample(row, count)
+    
+    # Sample positions among the other items, skipping over the item itself
+    if position is None:
+        return [item_ids[i] for i in rng.sample(range(others), count)]
+    return [item_ids[i + (i >= position)] for i in rng.sample(range(others), count)]
+
+# Typed answer matching
+# A typed answer is accepted if, once normalized (case folded, accents and punctuation
+# dropped, so "pen-ol" reads as "pen-ôl"), it is one of the item's variations, mutated
+# forms included, or within ANSWER_MAX_EDITS of one. Each category keeps a matcher per
+# language: the normalized variations, their prefixes (to tell a partly typed answer
+# apart from a wrong one) and their single-character deletions, so a lookup is a handful
+# of dict probes for the answer and its deletions whatever the size of the category.
+ANSWER_LANGUAGES = ('welsh', 'english')
+ANSWER_MAX_EDITS = 1
+ANSWER_MIN_FUZZY_LENGTH = 4
+ANSWER_MAX_LENGTH = 100
+
+# Per category: {'version', 'welsh': matcher, 'english': matcher}, where a matcher is
+# {'exact': {answer: {item_id: variation}}, 'prefixes': {prefix: item IDs},
+#  'deletions': {answer or deletion: answers}}
+_answer_matchers = {}
+_answer_matcher_lock = threading.Lock()
+
+def normalize_answer(text):
+    """Normalize an answer for matching: case folded, without accents, punctuation or extra spaces."""
+    text = unicodedata.normalize('NFKD', text.casefold())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(re.sub(r'[\W_]+', ' ', text).split())
+
+def _answer_deletions(answer):
+    """Get the strings one character shorter than an answer."""
+    return {answer[:i] + answer[i + 1:] for i in range(len(answer))}
+
+def _is_transposition(a, b):
+    """Check whether two words differ only by swapping two adjacent characters."""
+    if len(a) != len(b):
+        return False
+    diffs = [i for i in range(len(a)) if a[i] != b[i]]
+    return len(diffs) == 2 and diffs[1] == diffs[0] + 1 and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]]
+
+def _build_answer_matcher(items, field):
+    """Build the matcher for one language from a category's items."""
+    exact, prefixes, deletions = {}, {}, {}
+    for item_id, entry in items.items():
+        for variation in entry[field]:
+            answer = normalize_answer(variation)
+            if not answer:
+                continue
+            exact.setdefault(answer, {}).setdefault(item_id, variation)
+            for i in range(1, len(answer) + 1):
+                prefixes.setdefault(answer[:i], set()).add(item_id)
+    for answer in exact:
+        if len(answer) >= ANSWER_MIN_FUZZY_LENGTH:
+            for key in _answer_deletions(answer) | {answer}:
+                deletions.setdefault(key, set()).add(answer)
+    return {'exact': exact, 'prefixes': prefixes, 'deletions': deletions}
+
+def get_answer_matcher(category_id, snapshot):
+    """Get the typed answer matchers of a category, rebuilt when its catalog version changes."""
+    matcher = _answer_matchers.get(category_id)
+    if matcher is not None and matcher['version'] == snapshot['version']:
+        count_cache('answer_matcher', True)
+        return matcher
+    
+    with _answer_matcher_lock:
+        matcher = _answer_matchers.get(category_id)
+        fresh = matcher is not None and matcher['version'] == snapshot['version']
+        count_cache('answer_matcher', fresh)
+        if fresh:
+            return matcher
+        matcher = {'version': snapshot['version']}
+        for language in ANSWER_LANGUAGES:
+            matcher[language] = _build_answer_matcher(snapshot['items'], f'{language}_variations')
+        _answer_matchers[category_id] = matcher
+        return matcher
+
+def find_answer_matches(matcher, answer):
+    """Find the variations a normalized answer matches, as (edits, variation) pairs, closest first."""
+    if answer in matcher['exact']:
+        return [(0, answer)]
+    if len(answer) < ANSWER_MIN_FUZZY_LENGTH - ANSWER_MAX_EDITS:
+        return []
+    
+    # Any variation within one edit (or one swap of adjacent characters) shares the
+    # answer or one of its deletions as a key
+    candidates = set()
+    for key in _answer_deletions(answer) | {answer}:
+        candidates.update(matcher['deletions'].get(key, ()))
+    matches = []
+    for candidate in candidates:
+        edits = edit_distance(answer, candidate)
+        if edits == 2 and _is_transposition(answer, candidate):
+            edits = 1
+        if edits <= ANSWER_MAX_EDITS:
+            matches.append((edits, candidate))
+    return sorted(matches)
+
+def check_answer(matcher, item_id, text):
+    """Check a typed answer for an item against a language matcher."""
+    answer = normalize_answer(text)
+    matches = find_answer_matches(matcher, answer) if answer else []
+    
+    for edits, match in matches:
+        if item_id in matcher['exact'][match]:
+            return {
+                'correct': True,
+                'exact': edits == 0,
+                'variation': matcher['exact'][match][item_id],
+                'item': item_id
+            }
+    
+    # A wrong answer may still be another item of the category, or the start of the right one
+    other = next(iter(matcher['exact'][matches[0][1]])) if matches else None
+    return {
+        'correct': False,
+        'exact': False,
+        'variation': matcher['exact'][matches[0][1]][other] if matches else None,
+        'item': other,
+        'partial': bool(answer) and item_id in matcher['prefixes'].get(answer, ())
+    }
+
+# Spaced repetition
+# Every answer is a review of the item for that learner, scheduled with SM-2: the
+# interval before the item is due again grows by the item's ease factor after each
+# correct answer, and a wrong answer brings it back after SRS_RELEARN_SECONDS. Reviews
+# are indexed by (learner, category, due time), so the next due items of a category
+# are the first rows of one index range whatever the number of learners and items.
+SRS_INITIAL_EASE = 2.5
+SRS_MIN_EASE = 1.3
+SRS_RELEARN_SECONDS = 10 * 60
+SRS_DAY_SECONDS = 24 * 60 * 60
+SRS_CORRECT_QUALITY = 4  # SM-2 quality (0-5) of a plain right or wrong answer
+SRS_WRONG_QUALITY = 1
+SRS_FAST_ANSWER_MS = 3000  # Right answers quicker than this are perfect (5), slower than the next hesitant (3)
+SRS_SLOW_ANSWER_MS = 15000
+
+PROGRESS_DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviews (
+    learner_id TEXT NOT NULL,
+    category_id TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    repetitions INTEGER NOT NULL,
+    interval REAL NOT NULL,
+    ease REAL NOT NULL,
+    lapses INTEGER NOT NULL,
+    due REAL NOT NULL,
+    reviewed REAL NOT NULL,
+    PRIMARY KEY (learner_id, category_id, item_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS reviews_due ON reviews (learner_id, category_id, due);
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY,
+    time REAL NOT NULL,
+    learner_id TEXT NOT NULL,
+    category_id TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    correct INTEGER NOT NULL,
+    latency INTEGER
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    name TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+"""
+
+_progress_local = threading.local()
+
+def get_progress_db():
+    """Get this thread's connection to the progress database, creating the schema on first use."""
+    if getattr(_progress_local, 'pid', None) != os.getpid():
+        db = sqlite3.connect(PROGRESS_DB_FILE, timeout=30)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.executescript(PROGRESS_DB_SCHEMA)
+        _progress_local.db, _progress_local.pid = db, os.getpid()
+    return _progress_local.db
+
+def get_learner_id():
+    """Get the learner ID of the request, assigning a new one (sent back as a cookie) if it has none."""
+    learner_id = request.cookies.get(LEARNER_COOKIE, '')
+    if not LEARNER_ID_PATTERN.match(learner_id):
+        learner_id = g.new_learner_id = uuid.uuid4().hex
+    return learner_id
+
+@app.after_request
+def set_learner_cookie(response):
+    """Send the learner ID cookie when one was assigned during the request."""
+    if 'new_learner_id' in g:
+        response.set_cookie(LEARNER_COOKIE, g.new_learner_id, max_age=LEARNER_COOKIE_MAX_AGE, samesite='Lax')
+    return response
+
+def schedule_review(state, quality, now):
+    """Apply one SM-2 review of the given quality (0-5) to (repetitions, interval in days, ease, lapses).
+    
+    Returns the new state and the time the item is next due.
+    """
+    repetitions, interval, ease, lapses = state
+    if quality >= 3:
+        interval = 1 if repetitions == 0 else 6 if repetitions == 1 else interval * ease
+        repetitions += 1
+        due = now + interval * SRS_DAY_SECONDS
+    else:
+        repetitions, interval, lapses = 0, 0, lapses + 1
+        due = now + SRS_RELEARN_SECONDS
+    ease = max(SRS_MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return (repetitions, interval, ease, lapses), due
+
+def answer_quality(correct, latency=None):
+    """Get the SM-2 quality of an answer from whether it was right and how long it took (in milliseconds)."""
+    if not correct:
+        return SRS_WRONG_QUALITY
+    if latency is not None and latency < SRS_FAST_ANSWER_MS:
+        return 5
+    if latency is not None and latency > SRS_SLOW_ANSWER_MS:
+        return 3
+    return SRS_CORRECT_QUALITY
+
+def _db_apply_reviews(db, reviews):
+    """Apply (learner_id, category_id, item_id, quality, time) reviews inside a transaction."""
+    results = []
+    for learner_id, category_id, item_id, quality, now in reviews:
+        row = db.execute('SELECT repetitions, interval, ease, lapses FROM reviews '
+                         'WHERE learner_id = ? AND category_id = ? AND item_id = ?',
+                         (learner_id, category_id, item_id)).fetchone()
+        state, due = schedule_review(row or (0, 0, SRS_INITIAL_EASE, 0), quality, now)
+        db.execute('INSERT OR REPLACE INTO reviews (learner_id, category_id, item_id, repetitions, '
+                   'interval, ease, lapses, due, reviewed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                   (learner_id, category_id, item_id, *state, due, now))
+        results.append({
+            'id': item_id,
+            'repetitions': state[0],
+            'interval': state[1],
+            'ease': round(state[2], 4),
+            'lapses': state[3],
+            'due': due
+        })
+    return results
+
+def record_reviews(reviews):
+    """Record (learner_id, category_id, item_id, quality, time) reviews in one transaction.
+    
+    Returns the new state of each reviewed item as a dict, in the same order.
+    """
+    db = get_progress_db()
+    with db:
+        # Take the write lock up front so concurrent reviews of an item are applied in turn
+        db.execute('BEGIN IMMEDIATE')
+        return _db_apply_reviews(db, reviews)
+
+def get_due_items(learner_id, category_id, item_ids, count, now=None):
+    """Get up to count items due for review by a learner in a category, most overdue first.
+    
+    Returns (item_id, due time) pairs. item_ids is the collection of playable items;
+    reviews of items that have since been removed are skipped.
+    """
+    now = time.time() if now is None else now
+    due_items = []
+    
+    # The cursor walks the due index lazily, so only the rows returned are read
+    rows = get_progress_db().execute('SELECT item_id, due FROM reviews '
+                                     'WHERE learner_id = ? AND category_id = ? AND due <= ? ORDER BY due',
+                                     (learner_id, category_id, now))
+    for item_id, due in rows:
+        if len(due_items) == count:
+            break
+        if item_id in item_ids:
+            due_items.append((item_id, due))
+    return due_items
+
+# Game results
+# The game sends its answers in batches to /api/results. Request threads only check
+# them and put them on a bounded in-memory queue; a background thread in each process
+# writes whatever has queued up in one transaction, appending the answers to the
+# answers table of the progress database and scheduling the reviews they imply. When
+# the queue is full the API answers 503 and the game keeps the results to send again
+# later, so a burst at the end of a lesson never holds request threads on disk writes.
+RESULTS_MAX_EVENTS = 100  # Answers per request
+RESULTS_QUEUE_SIZE = 1000  # Requests waiting to be written, per process
+RESULTS_WRITE_BATCH = 5000  # Most answers written in one transaction
+RESULTS_RETRY_SECONDS = 5
+RESULTS_WRITE_ATTEMPTS = 5  # Tries of each transaction, waiting twice as long after each failure
+RESULTS_WRITE_BACKOFF = 0.5  # Seconds before the first retry
+RESULTS_MAX_LATENCY = 10 * 60 * 1000  # Response times are in milliseconds, capped at this
+
+_results_queue = queue.Queue(maxsize=RESULTS_QUEUE_SIZE)
+_results_writer = {'thread': None, 'lock': threading.Lock()}
+
+def parse_result_event(event, snapshot):
+    """Check one answer sent to /api/results, returning (item_id, mode, correct, latency) or an error message."""
+    if not isinstance(event, dict):
+        return "Each result must be an object"
+    item_id = str(event.get('item', ''))
+    mode = event.get('mode')
+    correct = event.get('correct')
+    latency = event.get('latency')
+    
+    if item_id not in snapshot['items']:
+        return f"Invalid item: {item_id}"
+    if mode not in ROUND_MODES:
+        return "Invalid mode"
+    if not isinstance(correct, bool):
+        return "Correct must be true or false"
+    if latency is not None:
+        if isinstance(latency, bool) or not isinstance(latency, (int, float)) or not 0 <= latency < math.inf:
+            return "Latency must be a number of milliseconds"
+        latency = min(int(latency), RESULTS_MAX_LATENCY)
+    return item_id, mode, correct, latency
+
+def write_results(events):
+    """Append (time, learner_id, category_id, item_id, mode, correct, latency) answers and schedule their reviews."""
+    db = get_progress_db()
+    with db:
+        db.execute('BEGIN IMMEDIATE')
+        db.executemany('INSERT INTO answers (time, learner_id, category_id, item_id, mode, correct, latency) '
+                       'VALUES (?, ?, ?, ?, ?, ?, ?)', events)
+        _db_apply_reviews(db, [(learner_id, category_id, item_id, answer_quality(correct, latency), now)
+                               for now, learner_id, category_id, item_id, mode, correct, latency in events])
+
+def _write_results_forever():
+    """Write queued results until the None sent by stop_results_writer() is reached."""
+    stopping = False
+    while not stopping:
+        # Wait for one request's results, then take everything else already queued
+        batches = [_results_queue.get()]
+        count = len(batches[0] or ())
+        while count < RESULTS_WRITE_BATCH:
+            try:
+                batches.append(_results_queue.get_nowait())
+            except queue.Empty:
+                break
+            count += len(batches[-1] or ())
+        
+        stopping = None in batches
+        events = [event for batch in batches if batch for event in batch]
+        if events:
+            _write_results_with_retries(events)
+
+def _write_results_with_retries(events):
+    """Write answers, retrying with a growing delay when the database is locked or busy.
+    
+    The queue fills up meanwhile, so the API asks the game to send later rather
+    than piling up more answers; they are only dropped after the last attempt.
+    """
+    delay = RESULTS_WRITE_BACKOFF
+    for attempt in range(1, RESULTS_WRITE_ATTEMPTS + 1):
+        try:
+            write_results(events)
+            count_metric(('results', 'written'))
+            return
+        except sqlite3.Error as e:
+            if attempt == RESULTS_WRITE_ATTEMPTS:
+                count_metric(('results', 'dropped'))
+                app.logger.error(f"Error writing {len(events)} game results, dropping them: {str(e)}")
+                return
+            count_metric(('results', 'retried'))
+            app.logger.warning(f"Error writing {len(events)} game results, retrying in {delay}s: {str(e)}")
+            time.sleep(delay)
+            delay *= 2
+
+def _start_results_writer():
+    """Start the background thread that writes queued results, once per process."""
+    with _results_writer['lock']:
+        thread = _results_writer['thread']
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(target=_write_results_forever, name='results-writer', daemon=True)
+            _results_writer['thread'] = thread
+            thread.start()
+
+def submit_results(events):
+    """Queue answers to be written in the background, raising queue.Full when too many are waiting."""
+    _start_results_writer()
+    _results_queue.put_nowait(events)
+
+@atexit.register
+def stop_results_writer(timeout=10):
+    """Write the results still queued and stop the writer thread."""
+    thread = _results_writer['thread']
+    if thread is not None and thread.is_alive():
+        try:
+            _results_queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+
+# Answer statistics
+# Attempts, accuracy and median response time of the answers in the answers table,
+# per category and within each category per learner, item and mode. Every process
+# folds the answers appended since it last looked into its own counters from a
+# background thread, and checkpoints them to the progress database so a restart only
+# reads the answers since the checkpoint. Leaderboards and hardest-item lists are
+# ranked whenever a category's counters change, so requests only slice them.
+STATS_REFRESH_SECONDS = 2
+STATS_CHECKPOINT_SECONDS = 60
+STATS_REFRESH_BATCH = 50000
+STATS_MIN_ATTEMPTS = 5  # Items answered fewer times than this aren't ranked among the hardest
+STATS_MAX_RANKED = 100
+STATS_CHECKPOINT = 'answer_stats'
+
+# Upper bounds (in milliseconds) of the response time histogram the median is estimated from
+LATENCY_BUCKETS = (250, 500, 750, 1000, 1500, 2000, 3000, 4000, 5000, 7500,
+                   10000, 15000, 20000, 30000, 60000, RESULTS_MAX_LATENCY)
+
+# Counters are lists of [attempts, correct] followed by one count per latency bucket;
+# 'categories' maps category IDs to {'total': counters, 'learners': {learner_id: counters},
+# 'items': {item_id: counters}, 'modes': {mode: counters}} and 'views' to their rankings
+_answer_stats = {'lock': threading.Lock(), 'thread': None, 'position': None, 'checkpointed': 0,
+                 'checkpoint_time': 0, 'categories': {}, 'views': {}}
+
+def _new_counters():
+    """Get empty answer counters."""
+    return [0, 0] + [0] * len(LATENCY_BUCKETS)
+
+def _count_answer(counters, correct, latency):
+    """Add one answer to a set of counters."""
+    counters[0] += 1
+    counters[1] += correct
+    if latency is not None:
+        counters[2 + bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+def _median_latency(buckets):
+    """Estimate the median response time from a latency histogram, interpolating within its bucket."""
+    half = sum(buckets) / 2
+    seen, lower = 0, 0
+    for upper, count in zip(LATENCY_BUCKETS, buckets):
+        if count and seen + count >= half:
+            return round(lower + (upper - lower) * (half - seen) / count)
+        seen, lower = seen + count, upper
+    return None
+
+def summarize_counters(counters):
+    """Get the attempts, right answers, accuracy and median response time of a set of counters."""
+    attempts, correct = counters[0], counters[1]
+    return {
+        'attempts': attempts,
+        'correct': correct,
+        'accuracy': round(correct / attempts, 4) if attempts else None,
+        'median_latency': _median_latency(counters[2:])
+    }
+
+def _rank_answer_stats(stats):
+    """Build the summaries and rankings of a category's counters."""
+    learners = sorted(((learner_id, summarize_counters(counters)) for learner_id, counters in stats['learners'].items()),
+                      key=lambda entry: (-entry[1]['correct'], -entry[1]['accuracy'], entry[0]))
+    hardest = sorted(((item_id, summarize_counters(counters)) for item_id, counters in stats['items'].items()
+                      if counters[0] >= STATS_MIN_ATTEMPTS),
+                     key=lambda entry: (entry[1]['accuracy'], -entry[1]['attempts'], entry[0]))
+    return {
+        'total': summarize_counters(stats['total']),
+        'modes': {mode: summarize_counters(counters) for mode, counters in sorted(stats['modes'].items())},
+        'leaderboard': learners,
+        'ranks': {learner_id: rank for rank, (learner_id, summary) in enumerate(learners, 1)},
+        'hardest': hardest
+    }
+
+def refresh_answer_stats():
+    """Fold the answers written since the last refresh into the counters, checkpointing them now and then."""
+    with _answer_stats['lock']:
+        db = get_progress_db()
+        categories = _answer_stats['categories']
+        changed = set()
+        
+        if _answer_stats['position'] is None:
+            row = db.execute('SELECT position, data FROM checkpoints WHERE name = ?', (STATS_CHECKPOINT,)).fetchone()
+            position, data = row if row else (0, '{}')
+            categories.update(json.loads(data))
+            changed.update(categories)
+            _answer_stats['position'] = _answer_stats['checkpointed'] = position
+            _answer_stats['checkpoint_time'] = time.monotonic()
+        
+        # Answer IDs only grow, since every write takes the database's write lock in turn
+        while True:
+            rows = db.execute('SELECT id, learner_id, category_id, item_id, mode, correct, latency FROM answers '
+                              'WHERE id > ? ORDER BY id LIMIT ?',
+                              (_answer_stats['position'], STATS_REFRESH_BATCH)).fetchall()
+            for answer_id, learner_id, category_id, item_id, mode, correct, latency in rows:
+                stats = categories.get(category_id)
+                if stats is None:
+                    stats = categories[category_id] = {'total': _new_counters(), 'learners': {}, 'items': {}, 'modes': {}}
+                for counters in (stats['total'],
+                                 stats['learners'].setdefault(learner_id, _new_counters()),
+                                 stats['items'].setdefault(item_id, _new_counters()),
+                                 stats['modes'].setdefault(mode, _new_counters())):
+                    _count_answer(counters, correct, latency)
+                changed.add(category_id)
+            if rows:
+                _answer_stats['position'] = rows[-1][0]
+            if len(rows) < STATS_REFRESH_BATCH:
+                break
+        
+        for category_id in changed:
+            _answer_stats['views'][category_id] = _rank_answer_stats(categories[category_id])
+        
+        if (_answer_stats['position'] > _answer_stats['checkpointed'] and
+                time.monotonic() - _answer_stats['checkpoint_time'] >= STATS_CHECKPOINT_SECONDS):
+            with db:
+                db.execute('INSERT INTO checkpoints (name, position, data) VALUES (?, ?, ?) '
+                           'ON CONFLICT (name) DO UPDATE SET position = excluded.position, data = excluded.data '
+                           'WHERE excluded.position > checkpoints.position',
+                           (STATS_CHECKPOINT, _answer_stats['position'], json.dumps(categories)))
+            _answer_stats['checkpointed'] = _answer_stats['position']
+            _answer_stats['checkpoint_time'] = time.monotonic()
+
+def _refresh_answer_stats_forever():
+    """Refresh the answer statistics every STATS_REFRESH_SECONDS."""
+    while True:
+        time.sleep(STATS_REFRESH_SECONDS)
+        try:
+            refresh_answer_stats()
+        except sqlite3.Error as e:
+            app.logger.error(f"Error refreshing answer statistics: {str(e)}")
+
+def get_answer_stats(category_id):
+    """Get the summaries and rankings of a category's answers, or None if it has none yet."""
+    if _answer_stats['position'] is None:
+        refresh_answer_stats()
+    
+    # Start the background refresh, once per process
+    with _answer_stats['lock']:
+        thread = _answer_stats['thread']
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(target=_refresh_answer_stats_forever, name='answer-stats', daemon=True)
+            _answer_stats['thread'] = thread
+            thread.start()
+    return _answer_stats['views'].get(category_id)
+
+def get_category_report(category_id, items, count, learner_id=None):
+    """Get a category's answer totals, per mode summaries and the top count of its leaderboard and hardest items.
+    
+    items is the category's catalog entries; items that have since been removed are
+    left out of the hardest list. With learner_id, also that learner's own rank.
+    """
+    view = get_answer_stats(category_id)
+    if view is None:
+        view = _rank_answer_stats({'total': _new_counters(), 'learners': {}, 'items': {}, 'modes': {}})
+    
+    hardest = []
+    for item_id, summary in view['hardest']:
+        if len(hardest) == count:
+            break
+        if item_id in items:
+            hardest.append({'id': item_id, 'welsh': (items[item_id]['welsh_variations'] or [''])[0], **summary})
+    
+    report = {
+        'total': view['total'],
+        'modes': view['modes'],
+        'leaderboard': [{'rank': rank, 'learner': leader_id[:8], **summary}
+                        for rank, (leader_id, summary) in enumerate(view['leaderboard'][:count], 1)],
+        'hardest': hardest
+    }
+    if learner_id is not None:
+        rank = view['ranks'].get(learner_id)
+        report['you'] = {'rank': rank, **view['leaderboard'][rank - 1][1]} if rank else None
+    return report
+
+# Quiz round generation
+# Question and answer types for each game mode, matching static/js/game.js
+ROUND_MODES = {
+    'image-to-welsh': ('image', 'welsh-text'),
+    'english-to-welsh': ('english-text', 'welsh-text'),
+    'welsh-to-english': ('welsh-text', 'english-text'),
+    'audio-to-welsh': ('english-audio', 'welsh-text'),
+    'welsh-audio-to-english': ('welsh-audio', 'english-text'),
+    'mixed': None
+}
+MIXED_QUESTION_TYPES = ('image', 'english-text', 'welsh-text', 'english-audio', 'welsh-audio')
+ROUND_MAX_QUESTIONS = 100
+ROUND_MAX_OPTIONS = 9
+
+# Which item field holds the values for each question/answer type
+ROUND_TYPE_FIELDS = {
+    'image': 'images',
+    'english-text': 'englishTexts',
+    'welsh-text': 'welshTexts',
+    'english-audio': 'englishAudio',
+    'welsh-audio': 'welshAudio'
+}
+
+# Item objects of each category as a tuple, keyed by category ID and audio formats
+# with the catalog version
+_round_pools = {}
+_round_positions = {}
+
+def get_round_pool(category_id, snapshot, audio_formats=DEFAULT_AUDIO_FORMATS):
+    """Get the playable items of a category as an indexable tuple."""
+    key = (category_id, audio_formats)
+    cached = _round_pools.get(key)
+    fresh = bool(cached) and cached[0] == snapshot['version']
+    count_cache('round_pool', fresh)
+    if fresh:
+        return cached[1]
+    
+    pool = tuple(get_item_records(category_id, snapshot['items'], audio_formats))
+    _round_pools[key] = (snapshot['version'], pool)
+    return pool
+
+def get_round_positions(category_id, snapshot, audio_formats=DEFAULT_AUDIO_FORMATS):
+    """Get the index of each item in its round pool, by item ID."""
+    key = (category_id, audio_formats)
+    cached = _round_positions.get(key)
+    if cached and cached[0] == snapshot['version']:
+        return cached[1]
+    
+    positions = {record['id']: i for i, record in enumerate(get_round_pool(category_id, snapshot, audio_formats))}
+    _round_positions[key] = (snapshot['version'], positions)
+    return positions
+
+def choose_round_types(mode, rng):
+    """Choose the question and answer type of a question, using the same rules as game.js."""
+    if ROUND_MODES[mode]:
+        return ROUND_MODES[mode]
+    
+    question_type = rng.choice(MIXED_QUESTION_TYPES)
+    if question_type in ('english-text', 'welsh-text'):
+        # Text questions are usually answered in the other language, sometimes with an image
+        other = 'welsh-text' if question_type == 'english-text' else 'english-text'
+        return question_type, other if rng.random() < 0.7 else 'image'
+    if question_type == 'welsh-audio':
+        # Welsh audio questions must never show Welsh text or images
+        return question_type, 'english-text'
+    return question_type, 'welsh-text'
+
+def pick_round_value(record, value_type, rng, primary_words, primary_media):
+    """Pick the text or media URL shown for an item as a question or option."""
+    values = record[ROUND_TYPE_FIELDS[value_type]]
+    use_primary = primary_words if value_type.endswith('-text') else primary_media
+    return values[0] if use_primary else rng.choice(values)
+
+def generate_round(pool, mode, question_count, option_count, seed, primary_words=True, primary_media=False,
+                   difficulty='easy', distractor_index=None, focus=()):
+    """Generate a reproducible round of questions from a category's item pool.
+    
+    The pool indexes in focus (such as a learner's due items) are asked first, then
+    items are drawn without replacement (refilling the pool if it has fewer
+    items than questions, as game.js does) and distractors are sampled by
+    index, or taken from the distractor table above the easy difficulty, so
+    the cost depends on the number of questions, not the category size.
+    """
+    rng = random.Random(seed)
+    option_count = min(option_count, len(pool))
     
-    # Create Welsh variations file
-    with open(os.path.join(item_dir, 'welsh.txt'), 'w', encoding='utf-8') as f:
-        f.write('\n'.join(welsh_variations))
+    order = list(focus[:question_count])
+    skip = set(order)
+    while len(order) < question_count:
+        needed = question_count - len(order)
+        sample = rng.sample(range(len(pool)), min(len(pool), needed + len(skip)))
+        order.extend([i for i in sample if i not in skip][:needed])
+        skip = set()
     
-    # Create placeholder files
-    create_placeholder_file(os.path.join(item_dir, 'images', 'placeholder.jpg'), 
-                           f"Placeholder image for {item_id}")
+    questions = []
+    for index in order:
+        record = pool[index]
+        question_type, answer_type = choose_round_types(mode, rng)
+        
+        # Sample distractors from every other index, then slot the answer in at random
+        if difficulty == 'easy' or distractor_index is None:
+            option_indexes = [i + (i >= index) for i in rng.sample(range(len(pool) - 1), option_count - 1)]
+        else:
+            option_indexes = [distractor_index['positions'][item_id] for item_id in
+                              pick_distractors(distractor_index, record['id'], option_count - 1, difficulty, rng)]
+        answer = rng.randrange(option_count)
+        option_indexes.insert(answer, index)
+        
+        questions.append({
+            'id': record['id'],
+            'questionType': question_type,
+            'answerType': answer_type,
+            'prompt': pick_round_value(record, question_type, rng, primary_words, primary_media),
+            'options': [{
+                'id': pool[i]['id'],
+                'value': pick_round_value(pool[i], answer_type, rng, primary_words, primary_media)
+            } for i in option_indexes],
+            'answer': answer
+        })
     
-    create_placeholder_file(os.path.join(item_dir, 'english_audio', 'placeholder.mp3'), 
-                           f"Placeholder English audio for {item_id}")
+    return questions
+
+# Cache warming
+# warm_caches() builds everything the API serves from for every category ahead of
+# the first request. wsgi.py calls it in the server's master process, so the forked
+# workers share the result copy-on-write and are ready as soon as they start.
+# Audio format lists browsers usually send (see audioFormats in static/js/app.js)
+WARM_AUDIO_FORMATS = (DEFAULT_AUDIO_FORMATS, frozenset({'ogg', 'mp3', 'wav'}))
+_readiness = {'warmed': False}
+
+def warm_caches():
+    """Build the JSON payloads, round pools, answer matchers and distractor tables of every category."""
+    build_catalog()
+    get_categories_payload()
+    for category_id in sorted(_catalog['items']):
+        snapshot = get_catalog_snapshot(category_id)
+        if snapshot is None:
+            continue
+        for audio_formats in WARM_AUDIO_FORMATS:
+            get_items_payload(category_id, snapshot, audio_formats)
+            get_round_positions(category_id, snapshot, audio_formats)
+        get_answer_matcher(category_id, snapshot)
+        build_distractor_index(category_id, snapshot)
+    _readiness['warmed'] = True
+
+# Metrics
+# Request latency per endpoint, response bytes per content type, cache hits and misses
+# and the filesystem operations of the catalog scans and asset hashing, in the Prometheus
+# text format at /metrics. Every thread counts into its own dict, so recording never
+# takes a lock. Each worker process adds up the dicts of its threads (folding in those of
+# threads that have exited) every METRICS_SAVE_SECONDS and writes the totals to its own
+# file in METRICS_DIR; a scrape, whichever worker answers it, saves that worker's totals
+# and adds up every file. A process that exits adds its totals to METRICS_EXITED_FILE and
+# removes its own file, so counters only ever go up while the folder holds one file per
+# live process. With METRICS_ENABLED off none of this runs and /metrics is a 404.
+METRICS_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRICS_SAVE_SECONDS = 5
+METRICS_EXITED_FILE = 'exited.json'
+
+# Metric name, type, help text and label names of each kind of counter key
+METRICS = {
+    'requests': ('http_requests_total', 'counter', 'Requests handled, by endpoint and status.',
+                 ('endpoint', 'status')),
+    'latency': ('http_request_duration_seconds', 'histogram', 'Time spent handling requests, by endpoint.',
+                ('endpoint',)),
+    'bytes': ('http_response_bytes_total', 'counter', 'Bytes of responses with a known length, by content type.',
+              ('type',)),
+    'cache': ('cache_lookups_total', 'counter', 'Lookups in in-memory caches, by cache and result.',
+              ('cache', 'result')),
+    'filesystem': ('filesystem_operations_total', 'counter',
+                   'Filesystem operations of catalog scans and asset hashing, by endpoint '
+                   '("background" outside requests) and operation.', ('endpoint', 'operation')),
+    'results': ('results_writes_total', 'counter',
+                'Transactions of the game results writer, by outcome (written, retried or dropped).', ('outcome',))
+}
+
+# Counters are keyed by (kind, label values...); latency histograms are lists of one count
+# per bucket (and one for slower requests) followed by the total time. 'file' is where this
+# process saves its totals, named by its PID and a random suffix so a reused PID starts afresh.
+# Saving holds 'save_lock', and stops once the process has folded its file into METRICS_EXITED_FILE.
+_metrics_local = threading.local()
+_metrics = {'lock': threading.Lock(), 'shards': [], 'retired': {}, 'thread': None, 'file': None,
+            'save_lock': threading.Lock(), 'exited': False}
+
+if METRICS_ENABLED and METRICS_DIR:
+    os.makedirs(METRICS_DIR, exist_ok=True)
+
+def _metrics_shard():
+    """Get the counters of the current thread."""
+    shard = getattr(_metrics_local, 'shard', None)
+    if shard is None:
+        shard = _metrics_local.shard = {}
+        with _metrics['lock']:
+            _metrics['shards'].append((threading.current_thread(), shard))
+            if METRICS_DIR and (_metrics['thread'] is None or not _metrics['thread'].is_alive()):
+                _metrics['thread'] = threading.Thread(target=_save_metrics_forever, daemon=True)
+                _metrics['thread'].start()
+    return shard
+
+def count_metric(key, amount=1):
+    """Add to one of the current thread's counters."""
+    if METRICS_ENABLED:
+        shard = _metrics_shard()
+        shard[key] = shard.get(key, 0) + amount
+
+def count_cache(cache, hit):
+    """Count a lookup in one of the in-memory caches."""
+    count_metric(('cache', cache, 'hit' if hit else 'miss'))
+
+def count_filesystem(operation, amount=1):
+    """Count filesystem operations against the endpoint being handled by this thread."""
+    if METRICS_ENABLED:
+        endpoint = getattr(_metrics_local, 'endpoint', None) or 'background'
+        count_metric(('filesystem', endpoint, operation), amount)
+
+def _start_request_metrics():
+    """Note which endpoint the current thread is handling, and since when."""
+    _metrics_local.endpoint = request.endpoint or 'unmatched'
+    _metrics_local.started = time.perf_counter()
+
+def _record_request_metrics(response):
+    """Count a finished request, its duration and the size of its response."""
+    started = getattr(_metrics_local, 'started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    endpoint = _metrics_local.endpoint
     
-    create_placeholder_file(os.path.join(item_dir, 'welsh_audio', 'placeholder.mp3'), 
-                           f"Placeholder Welsh audio for {welsh_word}")
+    shard = _metrics_shard()
+    histogram = shard.get(('latency', endpoint))
+    if histogram is None:
+        histogram = shard[('latency', endpoint)] = [0] * (len(METRICS_LATENCY_BUCKETS) + 2)
+    histogram[bisect.bisect_left(METRICS_LATENCY_BUCKETS, elapsed)] += 1
+    histogram[-1] += elapsed
+    count_metric(('requests', endpoint, str(response.status_code)))
+    
+    if response.content_length:
+        kind, _, subtype = (response.mimetype or '').partition('/')
+        content_type = kind if kind in ('image', 'audio') else subtype if subtype in ('json', 'html', 'zip') else 'other'
+        count_metric(('bytes', content_type), response.content_length)
+    return response
 
-def create_placeholder_file(filepath, content):
-    """Create a file with placeholder content."""
-    with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(content)
+def _end_request_metrics(exception=None):
+    """Count filesystem operations from now on as background work."""
+    _metrics_local.endpoint = None
+    _metrics_local.started = None
 
-def update_item_variations(category_id, item_id, english_variations, welsh_variations):
-    """Update the English and Welsh variations for an item."""
-    item_dir = os.path.join(ASSETS_DIR, category_id, item_id)
+def _add_metrics(totals, counters):
+    """Add a copy of some counters into totals."""
+    for key, value in counters.items():
+        if isinstance(value, list):
+            current = totals.get(key)
+            if current is None:
+                totals[key] = list(value)
+            else:
+                for i, amount in enumerate(value):
+                    current[i] += amount
+        else:
+            totals[key] = totals.get(key, 0) + value
+
+def collect_metrics():
+    """Add up the counters of every thread of this process."""
+    with _metrics['lock']:
+        live = []
+        for thread, shard in _metrics['shards']:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                _add_metrics(_metrics['retired'], shard)
+        _metrics['shards'] = live
+        totals = {}
+        _add_metrics(totals, _metrics['retired'])
     
-    # Update English variations
-    with open(os.path.join(item_dir, 'english.txt'), 'w', encoding='utf-8') as f:
-        f.write('\n'.join(english_variations))
+    # Other threads keep counting meanwhile, copying a dict is atomic
+    for _, shard in live:
+        _add_metrics(totals, shard.copy())
+    return totals
+
+def _write_metrics_file(path, totals):
+    """Write collected counters to a file in METRICS_DIR."""
+    _atomic_write(path, json.dumps([[list(key), value] for key, value in totals.items()]))
+
+def _read_metrics_file(path):
+    """Read counters written by _write_metrics_file()."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return {tuple(key): value for key, value in json.load(f)}
+
+@contextmanager
+def _metrics_dir_lock(operation):
+    """Hold a shared (LOCK_SH) or exclusive (LOCK_EX) lock on METRICS_DIR across processes."""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(METRICS_DIR, '.lock'), 'a') as lock_file:
+        fcntl.flock(lock_file, getattr(fcntl, operation))
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def save_metrics():
+    """Write this process's totals to its file in METRICS_DIR (if there is one), returning them."""
+    totals = collect_metrics()
+    if not METRICS_DIR:
+        return totals
+    with _metrics['save_lock']:
+        if _metrics['exited']:
+            return totals
+        if _metrics['file'] is None:
+            _metrics['file'] = os.path.join(METRICS_DIR, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.json")
+        _write_metrics_file(_metrics['file'], totals)
+    return totals
+
+def _save_metrics_forever():
+    """Save this process's totals every METRICS_SAVE_SECONDS."""
+    while True:
+        time.sleep(METRICS_SAVE_SECONDS)
+        try:
+            save_metrics()
+        except OSError as e:
+            app.logger.warning(f"Could not save metrics: {str(e)}")
+
+def collect_all_metrics():
+    """Add up the saved totals of every worker process, this one's saved first."""
+    totals = save_metrics()
+    if not METRICS_DIR:
+        return totals
+    # Not while an exiting process moves its totals from its own file to METRICS_EXITED_FILE
+    with _metrics_dir_lock('LOCK_SH'):
+        for name in os.listdir(METRICS_DIR):
+            path = os.path.join(METRICS_DIR, name)
+            if not name.endswith('.json') or path == _metrics['file']:
+                continue
+            try:
+                _add_metrics(totals, _read_metrics_file(path))
+            except (OSError, ValueError) as e:
+                app.logger.warning(f"Skipping metrics file {name}: {str(e)}")
+    return totals
+
+def _reset_metrics_after_fork():
+    """Start a forked worker's counters from zero, its parent's are in the parent's file."""
+    _metrics.update(lock=threading.Lock(), shards=[], retired={}, thread=None, file=None,
+                    save_lock=threading.Lock(), exited=False)
+    _metrics_local.shard = None
+
+def retire_metrics():
+    """Add this process's totals to METRICS_EXITED_FILE and remove its own file, when it exits."""
+    if not METRICS_ENABLED or not METRICS_DIR:
+        return
+    with _metrics['save_lock']:
+        if _metrics['exited']:
+            return
+        _metrics['exited'] = True
+        totals = collect_metrics()
+        if not totals and _metrics['file'] is None:
+            return
+        try:
+            with _metrics_dir_lock('LOCK_EX'):
+                exited_path = os.path.join(METRICS_DIR, METRICS_EXITED_FILE)
+                try:
+                    exited = _read_metrics_file(exited_path)
+                except FileNotFoundError:
+                    exited = {}
+                _add_metrics(exited, totals)
+                _write_metrics_file(exited_path, exited)
+                if _metrics['file'] is not None:
+                    os.remove(_metrics['file'])
+        except (OSError, ValueError) as e:
+            app.logger.warning(f"Could not save metrics: {str(e)}")
+
+def render_metrics(totals):
+    """Write collected counters in the Prometheus text exposition format."""
+    lines = []
+    for kind, (name, metric_type, help_text, label_names) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for key in sorted(k for k in totals if k[0] == kind):
+            labels = ','.join(f'{label}="{value}"' for label, value in zip(label_names, key[1:]))
+            if metric_type != 'histogram':
+                lines.append(f"{name}{{{labels}}} {totals[key]}")
+                continue
+            histogram = totals[key]
+            cumulative = 0
+            for bound, count in zip(METRICS_LATENCY_BUCKETS + ('+Inf',), histogram):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram[-1]:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+if METRICS_ENABLED:
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_reset_metrics_after_fork)
+    atexit.register(retire_metrics)
+    app.before_request(_start_request_metrics)
+    app.after_request(_record_request_metrics)
+    app.teardown_request(_end_request_metrics)
+
+# Request profiling
+# An admin can add ?profile=1 (or an X-Profile: 1 header) to any request to run it under
+# cProfile while a thread samples its stack every PROFILE_SAMPLE_SECONDS. Each capture is
+# saved in PROFILES_DIR as <id>.pstats (for pstats, snakeviz or gprof2dot), <id>.folded
+# (collapsed stacks for flamegraph.pl or speedscope) and <id>.json, a summary with the
+# hottest functions that the admin Profiles page lists; the response names the capture
+# in an X-Profile-Id header. Only one request per process is profiled at a time, since
+# Python 3.12+ allows a single active profiler; others asking meanwhile run unprofiled.
+PROFILE_SAMPLE_SECONDS = 0.001
+PROFILE_MAX_CAPTURES = 50
+PROFILE_TOP_FUNCTIONS = 15
+PROFILE_ID_PATTERN = re.compile(r'^\d{8}-\d{6}-[0-9a-f]{8}$')
+PROFILE_FILE_KINDS = ('pstats', 'folded')
+
+_profile_local = threading.local()
+_profile_lock = threading.Lock()
+
+def _function_name(file, line, name):
+    """Get a short readable name for a function, as in pstats output."""
+    if file == '~':
+        return name  # Built-in function
+    return f"{name} ({os.path.basename(file)}:{line})"
+
+def _sample_stacks(thread_id, stop, stacks):
+    """Count the stacks a thread is seen in until stop is set."""
+    while not stop.wait(PROFILE_SAMPLE_SECONDS):
+        frame = sys._current_frames().get(thread_id)
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(_function_name(code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+        if names:
+            stack = ';'.join(reversed(names))
+            stacks[stack] = stacks.get(stack, 0) + 1
+
+@app.before_request
+def _start_profile():
+    """Start profiling the request if an admin asked for it."""
+    if '1' not in (request.args.get('profile'), request.headers.get('X-Profile')) or not is_admin_request():
+        return
+    if not _profile_lock.acquire(blocking=False):
+        return
     
-    # Update Welsh variations
-    with open(os.path.join(item_dir, 'welsh.txt'), 'w', encoding='utf-8') as f:
-        f.write('\n'.join(welsh_variations))
+    stop = threading.Event()
+    stacks = {}
+    sampler = threading.Thread(target=_sample_stacks, args=(threading.get_ident(), stop, stacks), daemon=True)
+    profiler = cProfile.Profile()
+    _profile_local.capture = {'profiler': profiler, 'sampler': sampler, 'stop': stop, 'stacks': stacks,
+                              'time': time.time(), 'started': time.perf_counter()}
+    sampler.start()
+    profiler.enable()
 
-def delete_item_directory(category_id, item_id):
-    """Delete an item directory and all its contents."""
-    item_dir = os.path.join(ASSETS_DIR, category_id, item_id)
-    if os.path.exists(item_dir):
-        shutil.rmtree(item_dir)
+def _stop_profile():
+    """Stop profiling the current request, returning its capture (or None if it wasn't profiled)."""
+    capture = getattr(_profile_local, 'capture', None)
+    if capture is None:
+        return None
+    capture['profiler'].disable()
+    capture['seconds'] = time.perf_counter() - capture['started']
+    capture['stop'].set()
+    capture['sampler'].join()
+    _profile_local.capture = None
+    _profile_lock.release()
+    return capture
 
-def delete_category_directory(category_id):
-    """Delete a category directory and all its contents."""
-    category_dir = os.path.join(ASSETS_DIR, category_id)
-    if os.path.exists(category_dir):
-        shutil.rmtree(category_dir)
+@app.after_request
+def _finish_profile(response):
+    """Save the profile of a profiled request."""
+    capture = _stop_profile()
+    if capture is not None:
+        try:
+            response.headers['X-Profile-Id'] = save_profile(capture, response.status_code)
+        except OSError as e:
+            app.logger.warning(f"Could not save the profile of {request.path}: {str(e)}")
+    return response
+
+@app.teardown_request
+def _abandon_profile(exception=None):
+    """Stop a profile that wasn't saved because the request failed."""
+    _stop_profile()
+
+def save_profile(capture, status):
+    """Write a capture's profile, stacks and summary to PROFILES_DIR, returning its ID."""
+    os.makedirs(PROFILES_DIR, exist_ok=True)
+    capture_id = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(capture['time']))}-{uuid.uuid4().hex[:8]}"
+    base = os.path.join(PROFILES_DIR, capture_id)
     
-    # Also remove from categories.json
-    categories = get_categories()
-    categories = [c for c in categories if c['id'] != category_id]
-    save_categories(categories)
+    capture['profiler'].dump_stats(base + '.pstats')
+    with open(base + '.folded', 'w', encoding='utf-8') as f:
+        f.writelines(f"{stack} {count}\n" for stack, count in sorted(capture['stacks'].items()))
+    
+    # Hottest by time spent in the function itself: (primitive calls, calls, own time, cumulative time, callers)
+    stats = pstats.Stats(capture['profiler']).stats
+    hottest = sorted(stats.items(), key=lambda stat: stat[1][2], reverse=True)[:PROFILE_TOP_FUNCTIONS]
+    summary = {
+        'id': capture_id,
+        'time': capture['time'],
+        'started': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(capture['time'])),
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        'status': status,
+        'seconds': capture['seconds'],
+        'samples': sum(capture['stacks'].values()),
+        'functions': [{'function': _function_name(*key), 'calls': calls, 'own_seconds': own,
+                       'total_seconds': total} for key, (_, calls, own, total, _) in hottest]
+    }
+    # The summary goes last, so captures are only listed once all their files exist
+    _atomic_write(base + '.json', json.dumps(summary))
+    
+    for old_id in list_profile_ids()[PROFILE_MAX_CAPTURES:]:
+        for extension in PROFILE_FILE_KINDS + ('json',):
+            try:
+                os.remove(os.path.join(PROFILES_DIR, f"{old_id}.{extension}"))
+            except OSError:
+                pass
+    return capture_id
+
+def list_profile_ids():
+    """Get the IDs of the saved captures, newest first."""
+    try:
+        names = os.listdir(PROFILES_DIR)
+    except OSError:
+        return []
+    return sorted((name[:-5] for name in names if name.endswith('.json') and PROFILE_ID_PATTERN.match(name[:-5])),
+                  reverse=True)
+
+def get_profile_summaries():
+    """Get the summaries of the saved captures, newest first."""
+    summaries = []
+    for capture_id in list_profile_ids():
+        try:
+            with open(os.path.join(PROFILES_DIR, f"{capture_id}.json"), 'r', encoding='utf-8') as f:
+                summaries.append(json.load(f))
+        except (OSError, json.JSONDecodeError):
+            continue
+    return summaries
+
+# Finish any metadata writes interrupted by a crash when a command line tool starts
+# (servers do it once before starting their workers, see wsgi.py), then load the
+# catalog manifest, or without one build the catalog once at startup, so the first
+# requests are served from memory. Image worker processes don't use the catalog.
+if RUNNING_COMMAND:
+    compact_metadata_journal(replay=True)
+if multiprocessing.parent_process() is None and not load_catalog_manifest():
+    build_catalog()
 
 # Add this decorator function to check for site password
 def site_password_required(f):
@@ -254,14 +3767,47 @@ def site_password_required(f):
     return decorated_function
 
 # Basic security wrapper for admin routes
+def is_admin_request():
+    return request.cookies.get('admin_authenticated') == 'true'
+
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not request.cookies.get('admin_authenticated') == 'true':
+        if not is_admin_request():
             return redirect(url_for('admin_login'))
         return f(*args, **kwargs)
     return decorated_function
 
+# Health checks for load balancers and orchestrators
+@app.route('/healthz')
+def health_check():
+    """Liveness check: the process is serving requests"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readiness_check():
+    """Readiness check: the caches are warm and the progress database answers"""
+    if not _readiness['warmed']:
+        return jsonify({'status': 'warming'}), 503
+    try:
+        get_progress_db().execute('SELECT 1')
+    except sqlite3.Error as e:
+        return jsonify({'status': 'unavailable', 'error': str(e)}), 503
+    return jsonify({'status': 'ready', 'categories': len(get_catalog_category_ids())})
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics of every worker process, for an admin or a scraper with METRICS_TOKEN"""
+    if not METRICS_ENABLED:
+        abort(404)
+    authorization = request.headers.get('Authorization', '')
+    token_ok = METRICS_TOKEN and hmac.compare_digest(authorization.encode(), f"Bearer {METRICS_TOKEN}".encode())
+    if not token_ok and not is_admin_request():
+        response = jsonify({"error": "A bearer token or admin login is required"})
+        response.headers['WWW-Authenticate'] = 'Bearer'
+        return response, 401
+    return app.response_class(render_metrics(collect_all_metrics()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # Main App Routes
 @app.route('/login', methods=['GET', 'POST'])
 def site_login():
@@ -288,100 +3834,364 @@ def index():
 @site_password_required
 def api_get_categories():
     """API endpoint to get all categories"""
-    categories = get_categories()
-    return jsonify(categories)
+    return send_json_payload(get_categories_payload())
 
 @app.route('/api/category/<category_id>/items')
 @site_password_required
 def api_get_items(category_id):
-    """API endpoint to get all items in a category"""
-    if not is_valid_category(category_id):
+    """API endpoint to get the items in a category, all at once or a page at a time"""
+    snapshot = get_catalog_snapshot(category_id) if is_valid_identifier(category_id) else None
+    if snapshot is None:
         return jsonify({"error": "Invalid category"}), 404
     
-    items = []
-    for item_id in os.listdir(os.path.join(ASSETS_DIR, category_id)):
-        item_dir = os.path.join(ASSETS_DIR, category_id, item_id)
-        welsh_path = os.path.join(item_dir, 'welsh.txt')
-        
-        if os.path.isdir(item_dir) and os.path.exists(welsh_path):
-            try:
-                # Get English variations
-                english_texts = []
-                english_path = os.path.join(item_dir, 'english.txt')
-                if os.path.exists(english_path):
-                    with open(english_path, 'r', encoding='utf-8') as f:
-                        english_texts = [line.strip() for line in f.readlines() if line.strip()]
-                
-                # Default English is the directory name if no file exists
-                english = item_id.replace('_', ' ')
-                if english_texts:
-                    english = english_texts[0]  # First entry is the primary form
-                
-                # Get Welsh variations
-                welsh_texts = []
-                with open(welsh_path, 'r', encoding='utf-8') as f:
-                    welsh_texts = [line.strip() for line in f.readlines() if line.strip()]
-                
-                # Default Welsh if file is empty or doesn't exist
-                welsh = ""
-                if welsh_texts:
-                    welsh = welsh_texts[0]  # First entry is the primary form
-                else:
-                    continue  # Skip if no Welsh word
-                
-                # Get all images
-                images = []
-                images_dir = os.path.join(item_dir, 'images')
-                if os.path.exists(images_dir):
-                    images = [f"/assets/{category_id}/{item_id}/images/{f}" for f in os.listdir(images_dir)
-                             if f.lower().endswith(('.jpg', '.jpeg', '.png', '.gif'))]
-                
-                # Get all English audio files
-                english_audio = []
-                english_audio_dir = os.path.join(item_dir, 'english_audio')
-                if os.path.exists(english_audio_dir):
-                    english_audio = [f"/assets/{category_id}/{item_id}/english_audio/{f}" for f in os.listdir(english_audio_dir)
-                                   if f.lower().endswith(('.mp3', '.wav'))]
-                
-                # Get all Welsh audio files
-                welsh_audio = []
-                welsh_audio_dir = os.path.join(item_dir, 'welsh_audio')
-                if os.path.exists(welsh_audio_dir):
-                    welsh_audio = [f"/assets/{category_id}/{item_id}/welsh_audio/{f}" for f in os.listdir(welsh_audio_dir)
-                                 if f.lower().endswith(('.mp3', '.wav'))]
-                
-                # Add default placeholders if no files found
-                if not images:
-                    images = [f"/assets/{category_id}/{item_id}/images/placeholder.jpg"]
-                if not english_audio:
-                    english_audio = [f"/assets/{category_id}/{item_id}/english_audio/placeholder.mp3"]
-                if not welsh_audio:
-                    welsh_audio = [f"/assets/{category_id}/{item_id}/welsh_audio/placeholder.mp3"]
-                
-                # Create item object
-                item = {
-                    'id': item_id,
-                    'english': english,
-                    'welsh': welsh,
-                    'englishTexts': english_texts or [english],
-                    'welshTexts': welsh_texts or [welsh],
-                    'images': images,
-                    'englishAudio': english_audio,
-                    'welshAudio': welsh_audio
-                }
-                
-                items.append(item)
-            except Exception as e:
-                app.logger.error(f"Error processing item {item_id}: {str(e)}")
+    try:
+        fields = parse_fields_param(request.args.get('fields'))
+        media = parse_media_filter(request.args.get('media'))
+        cursor = parse_items_cursor(request.args['cursor']) if 'cursor' in request.args else None
+        limit = parse_items_limit(request.args['limit']) if 'limit' in request.args else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    audio_formats = parse_audio_formats(request.args.get('audio'))
+    if limit is None and cursor is None:
+        if fields is None and not media:
+            return send_json_payload(get_items_payload(category_id, snapshot, audio_formats))
+        records = filter_item_records(get_round_pool(category_id, snapshot, audio_formats), snapshot['items'], media)
+        return jsonify([project_item_record(record, fields) for record in records])
     
-    return jsonify(items)
+    limit = ITEMS_PAGE_DEFAULT if limit is None else limit
+    records, ids = get_item_listing(category_id, snapshot, audio_formats, media)
+    start = bisect.bisect_right(ids, cursor) if cursor else 0
+    page = records[start:start + limit]
+    more = start + limit < len(records)
+    return jsonify({
+        'items': [project_item_record(record, fields) for record in page],
+        'nextCursor': page[-1]['id'] if more else None
+    })
 
-@app.route('/assets/<path:filepath>')
-def serve_asset(filepath):
-    """Serve files from the assets directory"""
+@app.route('/api/catalog')
+@site_password_required
+def api_get_catalog():
+    """API endpoint to get every category with its items in a single streamed response"""
+    try:
+        fields = parse_fields_param(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    audio_formats = parse_audio_formats(request.args.get('audio'))
+    categories = get_categories()
+    if request.args.get('categories'):
+        wanted = {c.strip() for c in request.args['categories'].split(',')}
+        categories = [c for c in categories if c['id'] in wanted]
+    
+    def generate():
+        yield '{"categories":['
+        for index, category in enumerate(categories):
+            items = get_catalog_category(category['id']) if is_valid_identifier(category['id']) else None
+            records = get_item_records(category['id'], items or {}, audio_formats)
+            category = dict(category, items=[project_item_record(record, fields) for record in records])
+            yield (',' if index else '') + json.dumps(category, separators=(',', ':'))
+        yield ']}'
+    
+    return app.response_class(generate(), mimetype='application/json')
+
+@app.route('/api/round')
+@site_password_required
+def api_get_round():
+    """API endpoint to generate a quiz round, reproducible by passing the same seed"""
+    category_id = request.args.get('category', '')
+    mode = request.args.get('mode', 'image-to-welsh')
+    question_count = request.args.get('questions', 10, type=int)
+    option_count = request.args.get('options', 3, type=int)
+    seed = request.args.get('seed', type=int)
+    primary_words = request.args.get('primary_words', 'true').lower() not in ('0', 'false')
+    primary_media = request.args.get('primary_media', 'false').lower() not in ('0', 'false')
+    audio_formats = parse_audio_formats(request.args.get('audio'))
+    difficulty = request.args.get('difficulty', 'easy')
+    review = request.args.get('review', 'false').lower() not in ('0', 'false')
+    
+    if mode not in ROUND_MODES:
+        return jsonify({"error": "Invalid mode"}), 400
+    if difficulty not in DISTRACTOR_DIFFICULTIES:
+        return jsonify({"error": f"Difficulty must be one of {', '.join(DISTRACTOR_DIFFICULTIES)}"}), 400
+    if not 1 <= question_count <= ROUND_MAX_QUESTIONS:
+        return jsonify({"error": f"Number of questions must be between 1 and {ROUND_MAX_QUESTIONS}"}), 400
+    if not 2 <= option_count <= ROUND_MAX_OPTIONS:
+        return jsonify({"error": f"Number of options must be between 2 and {ROUND_MAX_OPTIONS}"}), 400
+    
+    snapshot = get_catalog_snapshot(category_id) if is_valid_identifier(category_id) else None
+    if snapshot is None:
+        return jsonify({"error": "Invalid category"}), 404
+    
+    pool = get_round_pool(category_id, snapshot, audio_formats)
+    if not pool:
+        return jsonify({"error": "No items available in this category"}), 404
+    
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    
+    # A review round asks the learner's due items first
+    focus = ()
+    if review:
+        positions = get_round_positions(category_id, snapshot, audio_formats)
+        due_items = get_due_items(get_learner_id(), category_id, positions, question_count)
+        focus = [positions[item_id] for item_id, due in due_items]
+    
+    distractor_index = get_distractor_index(category_id, snapshot) if difficulty != 'easy' else None
+    return jsonify({
+        'category': category_id,
+        'mode': mode,
+        'difficulty': difficulty,
+        'seed': seed,
+        'questions': generate_round(pool, mode, question_count, option_count, seed,
+                                    primary_words, primary_media, difficulty, distractor_index, focus)
+    })
+
+@app.route('/api/category/<category_id>/due')
+@site_password_required
+def api_get_due_items(category_id):
+    """API endpoint to get the items the learner should review next in a category"""
+    count = request.args.get('count', 10, type=int)
+    audio_formats = parse_audio_formats(request.args.get('audio'))
+    
+    if not 1 <= count <= ROUND_MAX_QUESTIONS:
+        return jsonify({"error": f"Number of items must be between 1 and {ROUND_MAX_QUESTIONS}"}), 400
+    
+    snapshot = get_catalog_snapshot(category_id) if is_valid_identifier(category_id) else None
+    if snapshot is None:
+        return jsonify({"error": "Invalid category"}), 404
+    
+    positions = get_round_positions(category_id, snapshot, audio_formats)
+    due_items = get_due_items(get_learner_id(), category_id, positions, count)
+    return jsonify({
+        'category': category_id,
+        'items': [{'id': item_id, 'due': due} for item_id, due in due_items]
+    })
+
+@app.route('/api/results', methods=['POST'])
+@site_password_required
+def api_record_results():
+    """API endpoint to record a batch of answers from the game"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "The request body must be a JSON object"}), 400
+    category_id = str(data.get('category', ''))
+    events = data.get('events')
+    
+    if not isinstance(events, list) or not 1 <= len(events) <= RESULTS_MAX_EVENTS:
+        return jsonify({"error": f"Between 1 and {RESULTS_MAX_EVENTS} results must be sent at once"}), 400
+    
+    snapshot = get_catalog_snapshot(category_id) if is_valid_identifier(category_id) else None
+    if snapshot is None:
+        return jsonify({"error": "Invalid category"}), 404
+    
+    learner_id = get_learner_id()
+    now = time.time()
+    rows = []
+    for event in events:
+        parsed = parse_result_event(event, snapshot)
+        if isinstance(parsed, str):
+            return jsonify({"error": parsed}), 400
+        rows.append((now, learner_id, category_id, *parsed))
+    
+    try:
+        submit_results(rows)
+    except queue.Full:
+        response = jsonify({"error": "Too many results are waiting to be saved, try again later"})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(RESULTS_RETRY_SECONDS)
+        return response
+    return jsonify({'accepted': len(rows)}), 202
+
+@app.route('/api/category/<category_id>/stats')
+@site_password_required
+def api_get_category_stats(category_id):
+    """API endpoint to get a category's answer statistics, leaderboard and hardest items"""
+    count = request.args.get('count', 10, type=int)
+    
+    if not 1 <= count <= STATS_MAX_RANKED:
+        return jsonify({"error": f"Number of ranked entries must be between 1 and {STATS_MAX_RANKED}"}), 400
+    
+    snapshot = get_catalog_snapshot(category_id) if is_valid_identifier(category_id) else None
+    if snapshot is None:
+        return jsonify({"error": "Invalid category"}), 404
+    
+    report = get_category_report(category_id, snapshot['items'], count, get_learner_id())
+    return jsonify({'category': category_id, **report})
+
+@app.route('/api/review', methods=['POST'])
+@site_password_required
+def api_record_review():
+    """API endpoint to record the learner's answer to an item and schedule its next review"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "The request body must be a JSON object"}), 400
+    category_id = str(data.get('category', ''))
+    item_id = str(data.get('item', ''))
+    quality = data.get('quality')
+    
+    if quality is None:
+        if not isinstance(data.get('correct'), bool):
+            return jsonify({"error": "Either correct or quality is required"}), 400
+        quality = SRS_CORRECT_QUALITY if data['correct'] else SRS_WRONG_QUALITY
+    if not isinstance(quality, int) or isinstance(quality, bool) or not 0 <= quality <= 5:
+        return jsonify({"error": "Quality must be an integer between 0 and 5"}), 400
+    
+    snapshot = get_catalog_snapshot(category_id) if is_valid_identifier(category_id) else None
+    if snapshot is None:
+        return jsonify({"error": "Invalid category"}), 404
+    if item_id not in snapshot['items']:
+        return jsonify({"error": "Invalid item"}), 404
+    
+    result, = record_reviews([(get_learner_id(), category_id, item_id, quality, time.time())])
+    return jsonify(result)
+
+@app.route('/api/category/<category_id>/distractors/<item_id>')
+@site_password_required
+def api_get_distractors(category_id, item_id):
+    """API endpoint to get distractors for an item: its most confusable neighbours at the chosen difficulty"""
+    count = request.args.get('count', 3, type=int)
+    difficulty = request.args.get('difficulty', 'hard')
+    
+    if difficulty not in DISTRACTOR_DIFFICULTIES:
+        return jsonify({"error": f"Difficulty must be one of {', '.join(DISTRACTOR_DIFFICULTIES)}"}), 400
+    if not 1 <= count <= ROUND_MAX_OPTIONS - 1:
+        return jsonify({"error": f"Number of distractors must be between 1 and {ROUND_MAX_OPTIONS - 1}"}), 400
+    
+    snapshot = get_catalog_snapshot(category_id) if is_valid_identifier(category_id) else None
+    if snapshot is None:
+        return jsonify({"error": "Invalid category"}), 404
+    
+    index = get_distractor_index(category_id, snapshot) or unranked_distractor_index(snapshot)
+    if item_id not in index['features']:
+        return jsonify({"error": "Invalid item"}), 404
+    
+    rng = random.Random(request.args.get('seed', type=int))
+    scores = {other: score for score, other in index['rows'].get(item_id, [])}
+    return jsonify({
+        'id': item_id,
+        'difficulty': difficulty,
+        'distractors': [{
+            'id': other,
+            'welsh': snapshot['items'][other]['welsh_variations'][0],
+            'score': scores.get(other)
+        } for other in pick_distractors(index, item_id, count, difficulty, rng)]
+    })
+
+@app.route('/api/check-answer')
+@site_password_required
+def api_check_answer():
+    """API endpoint to check a typed answer for an item"""
+    category_id = request.args.get('category', '')
+    item_id = request.args.get('item', '')
+    answer = request.args.get('answer', '')
+    language = request.args.get('language', 'welsh')
+    
+    if language not in ANSWER_LANGUAGES:
+        return jsonify({"error": f"Language must be one of {', '.join(ANSWER_LANGUAGES)}"}), 400
+    if len(answer) > ANSWER_MAX_LENGTH:
+        return jsonify({"error": f"Answer must be at most {ANSWER_MAX_LENGTH} characters"}), 400
+    
+    snapshot = get_catalog_snapshot(category_id) if is_valid_identifier(category_id) else None
+    if snapshot is None:
+        return jsonify({"error": "Invalid category"}), 404
+    if item_id not in snapshot['items']:
+        return jsonify({"error": "Invalid item"}), 404
+    
+    matcher = get_answer_matcher(category_id, snapshot)[language]
+    return jsonify(check_answer(matcher, item_id, answer))
+
+@app.route('/api/category/<category_id>/audio-sprite/<audio_type>')
+@site_password_required
+def api_get_audio_sprite(category_id, audio_type):
+    """API endpoint to get a category's audio sprite URL and clip offsets"""
+    if audio_type not in AUDIO_TYPES:
+        return jsonify({"error": "Invalid audio type"}), 404
+    
+    items = get_catalog_category(category_id) if is_valid_identifier(category_id) else None
+    if items is None:
+        return jsonify({"error": "Invalid category"}), 404
+    
+    # An out of date sprite is still served (its offsets match its own file) while a new one is built
+    manifest = get_derived_manifest(_sprite_path(category_id, audio_type, 'json'))
+    if manifest is None or manifest['version'] != get_media_sources_version(items, audio_type):
+        schedule_audio_sprite(category_id, audio_type)
+    if manifest is None or not manifest['sprites']:
+        response = jsonify({"error": "Audio sprite is being built"})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    
+    audio_formats = parse_audio_formats(request.args.get('audio'))
+    sprites = [s for fmt, s in manifest['sprites'].items() if fmt in audio_formats] or list(manifest['sprites'].values())
+    return jsonify({
+        'version': manifest['version'],
+        'url': min(sprites, key=lambda s: s['size'])['url'],
+        'duration': manifest['duration'],
+        'clips': manifest['clips']
+    })
+
+@app.route('/api/category/<category_id>/image-atlas')
+@site_password_required
+def api_get_image_atlas(category_id):
+    """API endpoint to get a category's image atlas sheets and where each image is on them"""
+    items = get_catalog_category(category_id) if is_valid_identifier(category_id) else None
+    if items is None:
+        return jsonify({"error": "Invalid category"}), 404
+    
+    # An out of date atlas is still served (its coordinates match its own sheets) while a new one is built
+    manifest = get_derived_manifest(_atlas_path(category_id, 'json'))
+    if manifest is None or manifest['version'] != get_media_sources_version(items, 'images'):
+        schedule_image_atlas(category_id)
+    if manifest is None:
+        response = jsonify({"error": "Image atlas is being built"})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    
+    return jsonify(manifest)
+
+def send_asset(filepath, etag=True, fingerprinted=False):
+    """Send a file from the assets directory, caching it forever if its URL is fingerprinted"""
+    # Images are swapped for a resized/re-encoded variant when the browser accepts one
+    variant = pick_image_variant(filepath, request.args.get('w', type=int))
+    if variant:
+        filepath, etag = variant[0], variant[1] or True
+    
     directory = os.path.dirname(filepath)
     filename = os.path.basename(filepath)
-    return send_from_directory(os.path.join(ASSETS_DIR, directory), filename)
+    response = send_from_directory(os.path.join(ASSETS_DIR, directory), filename, etag=etag,
+                                   max_age=ASSET_MAX_AGE if fingerprinted else None)
+    if fingerprinted:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    if '/images/' in filepath:
+        response.vary.add('Accept')
+    return response
+
+@app.route('/assets/<path:filepath>')
+def serve_asset(filepath):
+    """Serve files from the assets directory, caching fingerprinted URLs forever"""
+    etag = True
+    fingerprinted = False
+    digest, _, relpath = filepath.partition('/')
+    if ASSET_HASH_PATTERN.match(digest):
+        current_digest = get_asset_hash(relpath)
+        if current_digest:
+            # If the file has changed since this URL was handed out, serve it without the long cache
+            fingerprinted = current_digest == digest
+            etag = digest if fingerprinted else True
+            filepath = relpath
+    
+    return send_asset(filepath, etag, fingerprinted)
+
+@app.route('/media/<filename>')
+def serve_media(filename):
+    """Serve an item's media file by content hash, from whichever item holds a copy"""
+    digest, _, extension = filename.partition('.')
+    relpath = find_media_path(digest) if ASSET_HASH_PATTERN.match(digest) else None
+    if relpath is None or relpath.rsplit('.', 1)[-1].lower() != extension.lower():
+        abort(404)
+    
+    return send_asset(relpath, digest, True)
 
 # Admin Routes
 @app.route('/admin/login', methods=['GET', 'POST'])
@@ -438,12 +4248,13 @@ def add_category():
         os.makedirs(os.path.join(ASSETS_DIR, category_id), exist_ok=True)
         
         # Add to categories.json
-        categories = get_categories()
-        categories.append({
-            'id': category_id,
-            'name': category_name
-        })
-        save_categories(categories)
+        with metadata_lock():
+            categories = get_categories(revalidate=True)
+            categories.append({
+                'id': category_id,
+                'name': category_name
+            })
+            save_categories(categories)
         
         flash(f'Successfully added category: {category_name}', 'success')
         return redirect(url_for('admin_dashboard'))
@@ -471,13 +4282,14 @@ def edit_category(category_id):
             return render_template('admin/edit_category.html', category=category)
         
         # Update in categories.json
-        categories = get_categories()
-        for cat in categories:
-            if cat['id'] == category_id:
-                cat['name'] = category_name
-                break
-        
-        save_categories(categories)
+        with metadata_lock():
+            categories = get_categories(revalidate=True)
+            for cat in categories:
+                if cat['id'] == category_id:
+                    cat['name'] = category_name
+                    break
+            
+            save_categories(categories)
         
         flash(f'Successfully updated category: {category_name}', 'success')
         return redirect(url_for('admin_dashboard'))
@@ -515,6 +4327,38 @@ def view_category(category_id):
     
     return render_template('admin/view_category.html', category=category, items=items)
 
+@app.route('/admin/category/<category_id>/stats')
+@admin_required
+def view_category_stats(category_id):
+    if not is_valid_category(category_id):
+        flash('Invalid category', 'error')
+        return redirect(url_for('admin_dashboard'))
+    
+    category = get_category_by_id(category_id)
+    if not category:
+        flash('Category not found', 'error')
+        return redirect(url_for('admin_dashboard'))
+    
+    snapshot = get_catalog_snapshot(category_id)
+    report = get_category_report(category_id, snapshot['items'] if snapshot else {}, 20)
+    
+    return render_template('admin/category_stats.html', category=category, report=report,
+                           min_attempts=STATS_MIN_ATTEMPTS)
+
+# Request profiles
+@app.route('/admin/profiles')
+@admin_required
+def view_profiles():
+    return render_template('admin/profiles.html', captures=get_profile_summaries(),
+                           max_captures=PROFILE_MAX_CAPTURES)
+
+@app.route('/admin/profiles/<capture_id>.<kind>')
+@admin_required
+def download_profile(capture_id, kind):
+    if not PROFILE_ID_PATTERN.match(capture_id) or kind not in PROFILE_FILE_KINDS:
+        abort(404)
+    return send_from_directory(PROFILES_DIR, f"{capture_id}.{kind}", as_attachment=True)
+
 # Item Management
 @app.route('/admin/category/<category_id>/item/add', methods=['GET', 'POST'])
 @admin_required
@@ -636,6 +4480,61 @@ def delete_item(category_id, item_id):
     
     return redirect(url_for('view_category', category_id=category_id))
 
+@app.route('/admin/category/<category_id>/import', methods=['POST'])
+@admin_required
+def import_category_items(category_id):
+    if not is_valid_category(category_id):
+        flash('Invalid category', 'error')
+        return redirect(url_for('admin_dashboard'))
+    
+    category = get_category_by_id(category_id)
+    if not category:
+        flash('Category not found', 'error')
+        return redirect(url_for('admin_dashboard'))
+    
+    file = request.files.get('archive')
+    if not file or file.filename == '':
+        flash('No archive selected', 'error')
+        return redirect(url_for('view_category', category_id=category_id))
+    
+    if not allowed_file(file.filename, {'zip'}):
+        flash('Invalid file type. Only ZIP archives are allowed', 'error')
+        return redirect(url_for('view_category', category_id=category_id))
+    
+    # Large uploads are spooled to a temporary file, which the archive is read from member by member
+    try:
+        report = import_items(category_id, file.stream, replace=bool(request.form.get('replace')))
+    except zipfile.BadZipFile:
+        flash('The archive could not be read', 'error')
+        return redirect(url_for('view_category', category_id=category_id))
+    
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(report)
+    
+    imported = sum(1 for row in report if row['status'] in ('added', 'replaced'))
+    failed = sum(1 for row in report if row['status'] == 'failed')
+    flash(f'Imported {imported} items ({failed} failed)', 'error' if failed else 'success')
+    return render_template('admin/import_report.html', category=category, report=report)
+
+@app.route('/admin/category/<category_id>/export')
+@admin_required
+def export_category(category_id):
+    if not is_valid_category(category_id):
+        flash('Invalid category', 'error')
+        return redirect(url_for('admin_dashboard'))
+    
+    return app.response_class(generate_export([category_id]), mimetype='application/zip',
+                              headers={'Content-Disposition': f'attachment; filename={category_id}.zip'})
+
+@app.route('/admin/export')
+@admin_required
+def export_catalog():
+    categories = get_categories()
+    category_ids = get_export_category_ids(categories)
+    filename = f"catalog-{time.strftime('%Y%m%d-%H%M%S')}.zip"
+    return app.response_class(generate_export(category_ids, categories), mimetype='application/zip',
+                              headers={'Content-Disposition': f'attachment; filename={filename}'})
+
 # Media Management
 @app.route('/admin/category/<category_id>/item/<item_id>/upload-image', methods=['POST'])
 @admin_required
@@ -663,8 +4562,14 @@ def upload_image(category_id, item_id):
             base, ext = os.path.splitext(filename)
             filename = f"{base}_{uuid.uuid4().hex[:6]}{ext}"
         
-        # Save file
+        # Save file, sharing it with any identical image already stored
         file.save(os.path.join(images_dir, filename))
+        store_media_file(f"{category_id}/{item_id}/images/{filename}")
+        record_media_change(category_id, [item_id])
+        
+        # Resized variants and the category's atlas are generated in the background
+        submit_image_variants(category_id, item_id, filename)
+        schedule_image_atlas(category_id)
         flash(f'Successfully uploaded image: {filename}', 'success')
     else:
         flash('Invalid file type. Only JPG, PNG, and GIF are allowed', 'error')
@@ -701,8 +4606,16 @@ def upload_audio(category_id, item_id, audio_type):
             base, ext = os.path.splitext(filename)
             filename = f"{base}_{uuid.uuid4().hex[:6]}{ext}"
         
-        # Save file
+        # Save file, sharing it with any identical audio already stored
         file.save(os.path.join(audio_dir, filename))
+        store_media_file(f"{category_id}/{item_id}/{audio_type}/{filename}")
+        record_media_change(category_id, [item_id])
+        
+        # Compact variants and the category's sprite are rebuilt in the background
+        if filename.lower().endswith('.wav'):
+            submit_audio_transcode(category_id, item_id, audio_type, filename)
+        else:
+            schedule_audio_sprite(category_id, audio_type)
         flash(f'Successfully uploaded audio: {filename}', 'success')
     else:
         flash('Invalid file type. Only MP3 and WAV are allowed', 'error')
@@ -721,7 +4634,8 @@ def delete_image(category_id, item_id, image_name):
     
     if os.path.exists(image_path):
         try:
-            os.remove(image_path)
+            delete_media_file(category_id, item_id, 'images', filename)
+            schedule_image_atlas(category_id)
             flash(f'Successfully deleted image: {filename}', 'success')
         except Exception as e:
             flash(f'Error deleting image: {str(e)}', 'error')
@@ -746,7 +4660,8 @@ def delete_audio(category_id, item_id, audio_type, audio_name):
     
     if os.path.exists(audio_path):
         try:
-            os.remove(audio_path)
+            delete_media_file(category_id, item_id, audio_type, filename)
+            schedule_audio_sprite(category_id, audio_type)
             flash(f'Successfully deleted audio: {filename}', 'success')
         except Exception as e:
             flash(f'Error deleting audio: {str(e)}', 'error')
@@ -755,5 +4670,157 @@ def delete_audio(category_id, item_id, audio_type, audio_name):
     
     return redirect(url_for('view_item', category_id=category_id, item_id=item_id))
 
+# Command line tools
+@app.cli.command('transcode-audio')
+@click.option('--force', is_flag=True, help='Regenerate variants that already exist.')
+def transcode_audio_command(force):
+    """Generate compact speech variants for every WAV file in the assets directory."""
+    count = 0
+    for category_id in get_catalog_category_ids():
+        for item_id, entry in get_catalog_category(category_id).items():
+            for audio_type in ('english_audio', 'welsh_audio'):
+                for filename in entry[audio_type]:
+                    if not filename.lower().endswith('.wav'):
+                        continue
+                    if entry['variants'][f"{audio_type}/{filename}"] and not force:
+                        continue
+                    _transcode_item_audio(category_id, item_id, audio_type, filename)
+                    count += 1
+    click.echo(f"Transcoded {count} audio files")
+
+@app.cli.command('generate-image-variants')
+@click.option('--force', is_flag=True, help='Regenerate variants that already exist.')
+def generate_image_variants_command(force):
+    """Generate resized, re-encoded variants of every image in the assets directory."""
+    if not IMAGE_VARIANT_FORMATS:
+        raise click.ClickException("Pillow with WebP or AVIF support is required to generate image variants")
+    
+    futures = []
+    for category_id in get_catalog_category_ids():
+        for item_id, entry in get_catalog_category(category_id).items():
+            for filename in entry['images']:
+                if entry['variants'][f"images/{filename}"] and not force:
+                    continue
+                futures.append(submit_image_variants(category_id, item_id, filename, force))
+    
+    wait(futures)
+    failed = sum(1 for future in futures if future.exception())
+    click.echo(f"Generated variants for {len(futures) - failed} images ({failed} failed)")
+
+@app.cli.command('build-audio-sprites')
+def build_audio_sprites_command():
+    """Build the English and Welsh audio sprites of every category."""
+    for category_id in get_catalog_category_ids():
+        for audio_type in AUDIO_TYPES:
+            manifest = build_audio_sprite(category_id, audio_type)
+            if manifest is None:
+                click.echo(f"{category_id} {audio_type}: skipped (category was deleted)")
+                continue
+            click.echo(f"{category_id} {audio_type}: {len(manifest['clips'])} items, {manifest['duration']}s")
+
+@app.cli.command('build-image-atlases')
+def build_image_atlases_command():
+    """Build the image atlas of every category."""
+    if not IMAGE_VARIANT_FORMATS:
+        raise click.ClickException("Pillow is required to build image atlases")
+    
+    with ThreadPoolExecutor(max_workers=IMAGE_VARIANT_WORKERS) as executor:
+        futures = {category_id: executor.submit(_build_image_atlas_task, category_id)
+                   for category_id in get_catalog_category_ids()}
+    for category_id, future in futures.items():
+        if future.exception():
+            click.echo(f"{category_id}: failed ({str(future.exception())})")
+            continue
+        manifest = future.result()
+        if manifest is None:
+            click.echo(f"{category_id}: skipped (category was deleted)")
+            continue
+        click.echo(f"{category_id}: {sum(len(v) for v in manifest['images'].values())} images, "
+                   f"{manifest['width']}x{manifest['height']}")
+
+@app.cli.command('import-items')
+@click.argument('category_id')
+@click.argument('source', type=click.Path(exists=True))
+@click.option('--name', help='Name of the category, if it has to be created.')
+@click.option('--replace', is_flag=True, help='Replace items that already exist.')
+def import_items_command(category_id, source, name, replace):
+    """Import a zip archive or directory of items into a category, creating it if needed."""
+    if not is_valid_identifier(category_id):
+        raise click.ClickException("Category ID can only contain lowercase letters, numbers, and hyphens")
+    
+    if not is_valid_category(category_id):
+        os.makedirs(os.path.join(ASSETS_DIR, category_id), exist_ok=True)
+    with metadata_lock():
+        categories = get_categories(revalidate=True)
+        if not any(c['id'] == category_id for c in categories):
+            categories.append({'id': category_id, 'name': name or category_id.replace('-', ' ').title()})
+            save_categories(categories)
+    
+    started = time.monotonic()
+    try:
+        report = import_items(category_id, source, replace=replace)
+    except zipfile.BadZipFile as e:
+        raise click.ClickException(f"Could not read {source}: {str(e)}")
+    
+    for row in report:
+        details = f"{row['media']} media files" + (f", {row['ignored']} ignored" if row['ignored'] else '')
+        click.echo(f"{row['id']}: {row['status']}" + (f" ({row['message']})" if row['message'] else f" ({details})"))
+    imported = sum(1 for row in report if row['status'] in ('added', 'replaced'))
+    click.echo(f"Imported {imported} of {len(report)} items in {time.monotonic() - started:.1f}s")
+
+@app.cli.command('export')
+@click.argument('output', type=click.File('wb'))
+@click.option('--category', 'category_ids', multiple=True, help='Only export this category (can be repeated).')
+def export_command(output, category_ids):
+    """Write a zip of the catalog (or of some categories) to OUTPUT, e.g. for a backup."""
+    categories = get_categories()
+    if category_ids:
+        for chunk in generate_export([c for c in category_ids if is_valid_category(c)]):
+            output.write(chunk)
+    else:
+        for chunk in generate_export(get_export_category_ids(categories), categories):
+            output.write(chunk)
+
+@app.cli.command('dedup-media')
+def dedup_media_command():
+    """Link identical media files in the assets directory to one copy in the content store."""
+    linked, freed = 0, 0
+    for category_id in get_catalog_category_ids():
+        for item_id, entry in get_catalog_category(category_id).items():
+            for key in entry['sizes']:
+                saved = store_media_file(f"{category_id}/{item_id}/{key}")
+                linked += 1 if saved else 0
+                freed += saved
+    
+    # Store files left behind by media deleted outside the admin panel
+    store_dir = os.path.join(ASSETS_DIR, MEDIA_STORE_DIR_NAME)
+    orphans = [os.path.join(root, name) for root, dirs, names in os.walk(store_dir) for name in names]
+    freed += release_store_paths(orphans)
+    click.echo(f"Linked {linked} duplicate media files, freeing {freed / 1024 / 1024:.1f} MB")
+
+@app.cli.command('build-manifest')
+def build_manifest_command():
+    """Write the catalog manifest read at startup in place of scanning the assets directory."""
+    if CATALOG_BACKEND != 'files':
+        raise click.ClickException("The manifest is only used with CATALOG_BACKEND=files")
+    counts = write_catalog_manifest()
+    click.echo(f"Wrote {counts['items']} items in {counts['categories']} categories to {CATALOG_MANIFEST_FILE}")
+
+@app.cli.command('catalog-migrate')
+def catalog_migrate_command():
+    """Import categories.json and the item text files into the SQLite catalog, replacing its contents."""
+    counts = migrate_catalog_to_db()
+    click.echo(f"Imported {counts['items']} items in {counts['categories']} categories into {CATALOG_DB_FILE}")
+
+@app.cli.command('catalog-export')
+def catalog_export_command():
+    """Write the SQLite catalog back to categories.json and the item text files."""
+    counts = export_catalog_from_db()
+    click.echo(f"Exported {counts['items']} items in {counts['categories']} categories to {ASSETS_DIR}")
+    if counts['missing_media']:
+        click.echo(f"Warning: {counts['missing_media']} media files recorded in the database are missing on disk")
+
 if __name__ == '__main__':
+    compact_metadata_journal(replay=True)
+    warm_caches()
     app.run(debug=True, host='0.0.0.0', port=5000)
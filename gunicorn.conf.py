@@ -0,0 +1,29 @@
+"""
+Gunicorn settings for the Welsh Learning App: gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import glob
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('THREADS', 4))
+
+# Import wsgi.py (building the catalog and warming its caches) once in the master,
+# before forking the workers
+preload_app = True
+
+# Uploads and imports of large archives can take a while
+timeout = 120
+graceful_timeout = 30
+
+# The workers save their /metrics counters in this folder, so any of them can report the
+# totals. It is set here, before the app is imported, so every worker uses the same one
+# with or without preload_app.
+os.environ.setdefault('METRICS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'metrics'))
+
+def on_starting(server):
+    """Start the counters of a new server from zero."""
+    for path in glob.glob(os.path.join(os.environ['METRICS_DIR'], '*.json')):
+        os.remove(path)
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the Welsh Learning App
+
+This script creates a synthetic assets directory with create_benchmark_data.py (or reuses
+one), loads the app on it in this process, and drives each endpoint in turn with concurrent
+simulated learners, each with their own cookies. For every endpoint it reports p50/p95/p99
+latency, throughput and memory as JSON, so runs can be compared; with --baseline, endpoints
+whose p95 latency got worse than the earlier run allows are listed and the exit status is 1.
+
+    python scrap/benchmark.py --categories 20 --items 200 --learners 16 --output bench.json
+    python scrap/benchmark.py --categories 20 --items 200 --learners 16 --baseline bench.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+from create_benchmark_data import create_benchmark_data
+
+# Configuration
+ROOT_DIR = Path(__file__).resolve().parent.parent
+MODES = ["image-to-welsh", "english-to-welsh", "welsh-to-english", "mixed"]
+
+
+def percentile(sorted_values, fraction):
+    """Get a percentile of sorted values by the nearest-rank method."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def rss_mb():
+    """Get the resident memory of this process in MB (0 where /proc isn't available)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        return 0.0
+
+
+def build_endpoints(app_module, client):
+    """Get the benchmarked endpoints as {name: function(client, rng) returning a response}."""
+    categories = [c["id"] for c in client.get("/api/categories").get_json()]
+    items = {c: client.get(f"/api/category/{c}/items").get_json() for c in categories}
+    media = [url for records in items.values() for record in records
+             for url in record["images"] + record["welshAudio"]]
+    files = [f"{c}/{entry['id']}/images/{name}" for c in categories
+             for entry in app_module.get_catalog_category(c).values() for name in entry["images"]]
+
+    def random_item(rng):
+        category = rng.choice(categories)
+        return category, rng.choice(items[category])
+
+    def check_answer(client, rng):
+        category, record = random_item(rng)
+        answer = rng.choice(record["welshTexts"])
+        if rng.random() < 0.5:
+            answer = answer[:-1]  # A typo, to exercise the fuzzy lookup
+        return client.get("/api/check-answer", query_string={"category": category, "item": record["id"],
+                                                              "answer": answer})
+
+    def post_results(client, rng):
+        category = rng.choice(categories)
+        events = [{"item": rng.choice(items[category])["id"], "mode": rng.choice(MODES),
+                   "correct": rng.random() < 0.7, "latency": rng.randrange(500, 8000)} for _ in range(10)]
+        return client.post("/api/results", json={"category": category, "events": events})
+
+    return {
+        "api_categories": lambda client, rng: client.get("/api/categories"),
+        "api_catalog": lambda client, rng: client.get("/api/catalog?audio=ogg,mp3,wav"),
+        "api_items": lambda client, rng: client.get(f"/api/category/{rng.choice(categories)}/items"),
+        "api_round": lambda client, rng: client.get(
+            f"/api/round?category={rng.choice(categories)}&mode={rng.choice(MODES)}&questions=10&options=4"),
+        "api_round_hard": lambda client, rng: client.get(
+            f"/api/round?category={rng.choice(categories)}&mode=mixed&questions=10&options=4&difficulty=hard"),
+        "api_check_answer": check_answer,
+        "api_results": post_results,
+        "api_stats": lambda client, rng: client.get(f"/api/category/{rng.choice(categories)}/stats"),
+        "media": lambda client, rng: client.get(rng.choice(media)),
+        "serve_asset": lambda client, rng: client.get(f"/assets/{rng.choice(files)}"),
+        "admin_dashboard": lambda client, rng: client.get("/admin"),
+        "admin_category": lambda client, rng: client.get(f"/admin/category/{rng.choice(categories)}"),
+    }
+
+
+def run_phase(app, request, learners, requests, warmup, seed):
+    """Send requests to one endpoint from concurrent learners, returning its measurements."""
+    latencies, errors, sizes, spans = [], [0], [0], []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(learners + 1)
+
+    def learner(number):
+        rng = random.Random(seed * 1000 + number)
+        client = app.test_client()
+        client.set_cookie("site_authenticated", "true")
+        client.set_cookie("admin_authenticated", "true")
+        client.set_cookie("learner_id", f"{rng.getrandbits(128):032x}")
+        for _ in range(warmup):
+            request(client, rng).close()
+
+        start_barrier.wait()
+        own = []
+        first_started = time.perf_counter()
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = request(client, rng)
+            size = len(response.get_data())
+            own.append(time.perf_counter() - started)
+            with lock:
+                sizes[0] += size
+                errors[0] += response.status_code >= 400
+            response.close()
+        last_finished = time.perf_counter()
+        with lock:
+            latencies.extend(own)
+            spans.append((first_started, last_finished))
+
+    threads = [threading.Thread(target=learner, args=(n,)) for n in range(learners)]
+    for thread in threads:
+        thread.start()
+    rss_before = rss_mb()
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+        traced_before = tracemalloc.get_traced_memory()[0]
+    start_barrier.wait()
+    for thread in threads:
+        thread.join()
+    # From the first learner's first request to the last learner's last response
+    elapsed = max(end for _, end in spans) - min(start for start, _ in spans)
+
+    latencies.sort()
+    result = {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "seconds": round(elapsed, 3),
+        "throughput": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+        "mean_bytes": round(sizes[0] / len(latencies)),
+        "rss_mb": round(rss_mb(), 1),
+        "rss_growth_mb": round(rss_mb() - rss_before, 1)
+    }
+    if tracemalloc.is_tracing():
+        result["peak_alloc_mb"] = round((tracemalloc.get_traced_memory()[1] - traced_before) / 1024 / 1024, 2)
+    return result
+
+
+def compare(results, baseline, tolerance, min_ms):
+    """List the endpoints whose p95 latency got worse than the baseline by more than the tolerance."""
+    regressions = []
+    for name, result in results["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if before and result["p95_ms"] > before["p95_ms"] * (1 + tolerance) and \
+                result["p95_ms"] - before["p95_ms"] > min_ms:
+            regressions.append({"endpoint": name, "p95_ms": result["p95_ms"], "baseline_p95_ms": before["p95_ms"]})
+    return regressions
+
+
+def main():
+    """Main function to run the script."""
+    parser = argparse.ArgumentParser(description="Benchmark the Welsh Learning App on synthetic data.")
+    parser.add_argument("--assets", type=Path, help="Existing assets directory (default: generate a temporary one)")
+    parser.add_argument("--categories", type=int, default=10, help="Categories to generate")
+    parser.add_argument("--items", type=int, default=100, help="Items per generated category")
+    parser.add_argument("--learners", type=int, default=8, help="Concurrent simulated learners")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per learner and endpoint")
+    parser.add_argument("--warmup", type=int, default=3, help="Unmeasured requests per learner and endpoint first")
+    parser.add_argument("--endpoints", help="Comma-separated endpoints to run (default: all)")
+    parser.add_argument("--manifest", action="store_true", help="Start from a catalog manifest")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Also report Python allocations per endpoint (slows every request down)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for data and requests")
+    parser.add_argument("--output", type=Path, help="Write the results to this JSON file (default: stdout)")
+    parser.add_argument("--baseline", type=Path, help="Earlier results to compare p95 latencies with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 slowdown against the baseline")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="Ignore p95 slowdowns smaller than this")
+    args = parser.parse_args()
+
+    work_dir = Path(tempfile.mkdtemp(prefix="welsh-bench-"))
+    assets_dir = args.assets
+    if assets_dir is None:
+        assets_dir = work_dir / "assets"
+        print(f"Creating {args.categories} categories of {args.items} items in {assets_dir}...", file=sys.stderr)
+        with contextlib.redirect_stdout(sys.stderr):
+            create_benchmark_data(assets_dir, args.categories, args.items, seed=args.seed)
+
+    # Point every file the app writes at the scratch directory before importing it
+    os.environ["ASSETS_DIR"] = str(assets_dir.resolve())
+    os.environ["PROGRESS_DB_FILE"] = str(work_dir / "progress.db")
+    os.environ["CATALOG_DB_FILE"] = str(work_dir / "catalog.db")
+    os.environ["CATALOG_MANIFEST_FILE"] = str(work_dir / "catalog.manifest")
+    os.environ["METADATA_LOCK_FILE"] = str(work_dir / "metadata.lock")
+    os.environ["METADATA_JOURNAL_FILE"] = str(work_dir / "metadata.journal")
+    os.environ["PROFILES_DIR"] = str(work_dir / "profiles")
+    sys.path.insert(0, str(ROOT_DIR))
+    if args.manifest:
+        import subprocess
+        subprocess.run([sys.executable, "-m", "flask", "--app", "app", "build-manifest"], cwd=ROOT_DIR, check=True,
+                       stdout=subprocess.DEVNULL)
+
+    started = time.perf_counter()
+    import app as app_module
+    startup = time.perf_counter() - started
+    app = app_module.app
+
+    client = app.test_client()
+    client.set_cookie("site_authenticated", "true")
+    endpoints = build_endpoints(app_module, client)
+    if args.endpoints:
+        endpoints = {name: endpoints[name] for name in args.endpoints.split(",")}
+
+    results = {
+        "config": {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+        "catalog": {
+            "categories": len(app_module.get_catalog_category_ids()),
+            "items": sum(len(app_module.get_catalog_category(c)) for c in app_module.get_catalog_category_ids())
+        },
+        "startup_seconds": round(startup, 3),
+        "endpoints": {}
+    }
+    if args.trace_memory:
+        tracemalloc.start()
+
+    print(f"{'endpoint':<18}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}{'rss MB':>9}",
+          file=sys.stderr)
+    for number, (name, request) in enumerate(endpoints.items()):
+        result = run_phase(app, request, args.learners, args.requests, args.warmup, args.seed + number)
+        results["endpoints"][name] = result
+        print(f"{name:<18}{result['throughput']:>9}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+              f"{result['p99_ms']:>10}{result['errors']:>8}{result['rss_mb']:>9}", file=sys.stderr)
+
+    app_module.stop_results_writer()
+    shutil.rmtree(work_dir, ignore_errors=True)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            results["regressions"] = compare(results, json.load(f), args.tolerance, args.min_ms)
+        for regression in results["regressions"]:
+            print(f"Regression: {regression['endpoint']} p95 {regression['p95_ms']} ms "
+                  f"(was {regression['baseline_p95_ms']} ms)", file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+    sys.exit(1 if results.get("regressions") else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Benchmark Data Creator for Welsh Learning App
+
+This script creates an assets directory of any size for benchmarking the Welsh Learning App:
+a number of categories, each with a number of vocabulary items that have Welsh and English
+variations, PNG images and WAV recordings of realistic sizes. Every media file has different
+contents, so none of them are merged as duplicates.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import struct
+import wave
+import zlib
+from pathlib import Path
+
+# Configuration
+DEFAULT_OUTPUT_DIR = Path("bench-assets")
+IMAGE_SIZE = (480, 360)  # Pixels, roughly 150 KB as a PNG
+IMAGE_NOISE_ROWS = 0.25  # Share of image rows filled with noise, which sets how well it compresses
+AUDIO_SAMPLE_RATE = 22050
+AUDIO_SECONDS = (0.8, 2.0)  # Length of a spoken word, 35-90 KB as 16-bit mono WAV
+
+# Syllables the made-up words are built from
+WELSH_SYLLABLES = ["ll", "dd", "wy", "ch", "aw", "yn", "rh", "ff", "ae", "ith", "gw", "cy", "dy", "th", "ew",
+                   "bre", "can", "tal", "mor", "nos", "lyg", "pen", "gar", "fel", "wen"]
+ENGLISH_SYLLABLES = ["ba", "ker", "sto", "ne", "ri", "ver", "ta", "ble", "win", "dow", "gar", "den", "mo", "un",
+                     "tain", "cas", "tle", "pa", "per", "lan", "tern"]
+WELSH_MUTATIONS = {"p": "b", "t": "d", "c": "g", "b": "f", "d": "dd", "m": "f", "g": ""}
+
+
+def make_word(rng, syllables):
+    """Make up a word of two to four syllables."""
+    return "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+
+
+def welsh_variations(word):
+    """Get the variations of a Welsh word, with the soft mutation after 'dy' as in welsh.txt files."""
+    mutated = WELSH_MUTATIONS.get(word[0], word[0]) + word[1:] if word[0] in WELSH_MUTATIONS else word
+    return [word, f"y {word}", f"dy {mutated}", f"eich {word}"]
+
+
+def png_chunk(kind, data):
+    """Encode a PNG chunk."""
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+def create_png(path, width, height, rng):
+    """Write an RGB PNG of a colour gradient with rows of noise."""
+    red, green, blue = rng.randrange(256), rng.randrange(256), rng.randrange(256)
+    gradient = bytes(channel for x in range(width)
+                     for channel in ((red + x) % 256, (green + x // 2) % 256, blue))
+    rows = []
+    for y in range(height):
+        pixels = rng.randbytes(width * 3) if rng.random() < IMAGE_NOISE_ROWS else gradient
+        rows.append(b"\x00" + pixels)
+    
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        f.write(png_chunk(b"IDAT", zlib.compress(b"".join(rows), 6)))
+        f.write(png_chunk(b"IEND", b""))
+
+
+def create_wav(path, seconds, rng):
+    """Write a 16-bit mono WAV of a fading tone with a little noise."""
+    frequency = rng.uniform(100, 300)
+    frames = int(AUDIO_SAMPLE_RATE * seconds)
+    tone = [int(8000 * math.sin(2 * math.pi * frequency * i / AUDIO_SAMPLE_RATE) * (1 - i / frames))
+            for i in range(0, frames, 8)]
+    samples = bytearray(struct.pack(f"<{len(tone)}h", *tone) * 8)[:frames * 2]
+    
+    # Make every file different by overwriting every 64th sample with noise
+    noise = rng.randbytes(frames // 64 * 2)
+    for i in range(frames // 64):
+        samples[i * 128:i * 128 + 2] = noise[i * 2:i * 2 + 2]
+    
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(AUDIO_SAMPLE_RATE)
+        f.writeframes(bytes(samples))
+
+
+def create_item(item_dir, rng, images, recordings):
+    """Create one item with its variations and media files."""
+    welsh = make_word(rng, WELSH_SYLLABLES)
+    english = make_word(rng, ENGLISH_SYLLABLES)
+    
+    for name in ("images", "english_audio", "welsh_audio"):
+        os.makedirs(item_dir / name, exist_ok=True)
+    with open(item_dir / "welsh.txt", "w", encoding="utf-8") as f:
+        f.write("\n".join(welsh_variations(welsh)))
+    with open(item_dir / "english.txt", "w", encoding="utf-8") as f:
+        f.write("\n".join([english, f"the {english}", f"a {english}", f"your {english}"]))
+    
+    for i in range(images):
+        create_png(item_dir / "images" / f"{english}-{i + 1}.png", *IMAGE_SIZE, rng)
+    for i in range(recordings):
+        create_wav(item_dir / "english_audio" / f"{english}-{i + 1}.wav", rng.uniform(*AUDIO_SECONDS), rng)
+        create_wav(item_dir / "welsh_audio" / f"{welsh}-{i + 1}.wav", rng.uniform(*AUDIO_SECONDS), rng)
+
+
+def create_benchmark_data(output_dir, categories, items, images=2, recordings=1, seed=0):
+    """Create the assets directory, returning the total size of its files in bytes."""
+    rng = random.Random(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    
+    category_list = []
+    for c in range(categories):
+        category_id = f"category-{c + 1:03d}"
+        category_list.append({"id": category_id, "name": f"Category {c + 1}"})
+        for i in range(items):
+            create_item(output_dir / category_id / f"item-{i + 1:05d}", rng, images, recordings)
+        print(f"  Created {category_id} with {items} items")
+    
+    with open(output_dir / "categories.json", "w", encoding="utf-8") as f:
+        json.dump({"categories": category_list}, f, indent=2)
+    
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, dirs, names in os.walk(output_dir) for name in names)
+
+
+def main():
+    """Main function to run the script."""
+    parser = argparse.ArgumentParser(description="Create a synthetic assets directory for benchmarks.")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT_DIR, help="Directory to create")
+    parser.add_argument("--categories", type=int, default=10, help="Number of categories")
+    parser.add_argument("--items", type=int, default=100, help="Number of items in each category")
+    parser.add_argument("--images", type=int, default=2, help="Images per item")
+    parser.add_argument("--recordings", type=int, default=1, help="English and Welsh recordings per item")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed, for identical data on every run")
+    args = parser.parse_args()
+    
+    if args.output.exists() and any(args.output.iterdir()):
+        response = input(f"The directory '{args.output}' already exists and is not empty. Proceed anyway? (y/n): ")
+        if response.lower() != 'y':
+            print("Aborted.")
+            return
+    
+    print(f"Creating {args.categories} categories of {args.items} items in {args.output}...")
+    size = create_benchmark_data(args.output, args.categories, args.items, args.images, args.recordings, args.seed)
+    print(f"\nCreated {args.categories * args.items} items, {size / 1024 / 1024:.1f} MB in total.")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,20 +6,32 @@
 let categories = [];
 let currentCategory = '';
 let vocabularyItems = [];
+let catalogItems = {};  // Items already loaded for each category ID
+
+// Audio formats this browser can play, so the API can send the smallest files
+const audioFormats = Object.entries({
+    ogg: 'audio/ogg; codecs=opus',
+    mp3: 'audio/mpeg',
+    wav: 'audio/wav'
+}).filter(([, type]) => new Audio().canPlayType(type)).map(([format]) => format).join(',');
 
 /**
- * Load categories from the API
+ * Load categories and their items from the API in a single request
  */
 async function loadCategories() {
     try {
-        console.log("Fetching categories...");
+        console.log("Fetching catalog...");
         
-        const response = await fetch('/api/categories');
+        const response = await fetch(`/api/catalog?audio=${audioFormats}`);
         if (!response.ok) {
             throw new Error(`API error: ${response.status}`);
         }
         
-        categories = await response.json();
+        const catalog = await response.json();
+        categories = catalog.categories.map(category => ({ id: category.id, name: category.name }));
+        catalog.categories.forEach(category => {
+            catalogItems[category.id] = category.items;
+        });
         console.log(`Loaded ${categories.length} categories`);
         
         // Update category dropdown
@@ -70,15 +82,21 @@ async function loadVocabularyItems(categoryId) {
         console.log(`Loading items for category: ${categoryId}`);
         currentCategory = categoryId;
         
-        // Show loading state
-        enableStartButton(false, "Loading...");
-        
-        const response = await fetch(`/api/category/${categoryId}/items`);
-        if (!response.ok) {
-            throw new Error(`API error: ${response.status}`);
+        // Use the items from the catalog if we already have them
+        if (catalogItems[categoryId]) {
+            vocabularyItems = catalogItems[categoryId];
+        } else {
+            // Show loading state
+            enableStartButton(false, "Loading...");
+            
+            const response = await fetch(`/api/category/${categoryId}/items?audio=${audioFormats}`);
+            if (!response.ok) {
+                throw new Error(`API error: ${response.status}`);
+            }
+            
+            vocabularyItems = await response.json();
+            catalogItems[categoryId] = vocabularyItems;
         }
-        
-        vocabularyItems = await response.json();
         console.log(`Loaded ${vocabularyItems.length} items`);
         
         if (vocabularyItems.length > 0) {
@@ -94,6 +112,27 @@ async function loadVocabularyItems(categoryId) {
     }
 }
 
+/**
+ * Load the IDs of the items due for review in a category, asked first in the next game
+ * @param {string} categoryId - The category ID
+ * @param {number} count - The most items to load
+ * @returns {Array} Item IDs, most overdue first (empty if they can't be loaded)
+ */
+async function loadDueItems(categoryId, count) {
+    try {
+        const response = await fetch(`/api/category/${categoryId}/due?count=${count}&audio=${audioFormats}`);
+        if (!response.ok) {
+            throw new Error(`API error: ${response.status}`);
+        }
+        
+        const due = await response.json();
+        return due.items.map(item => item.id);
+    } catch (error) {
+        console.error(`Error loading due items for category ${categoryId}:`, error);
+        return [];
+    }
+}
+
 /**
  * Enable or disable the start button
  * @param {boolean} enabled - Whether the button should be enabled
@@ -222,9 +261,10 @@ questionsSlider.addEventListener('input', () => {
 // Initialize game UI and event listeners
 function initGameUI() {
     // Start game button
-    startButton.addEventListener('click', () => {
+    startButton.addEventListener('click', async () => {
         if (vocabularyItems.length > 0) {
-            Game.start(vocabularyItems);
+            const dueItemIds = await loadDueItems(currentCategory, questionsSelect.value);
+            Game.start(vocabularyItems, currentCategory, dueItemIds);
         }
     });
     
@@ -233,6 +273,11 @@ function initGameUI() {
         Game.reset();
     });
     
+    // Send any answers not yet sent when the page is closed
+    window.addEventListener('pagehide', () => {
+        Game.sendResults();
+    });
+    
     // Audio button
     questionAudio.addEventListener('click', () => {
         Game.playQuestionAudio();
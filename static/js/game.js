@@ -2,10 +2,19 @@
  * Core game logic for Welsh vocabulary learning game
  */
 
+// Answers are sent to the server in batches of this many, and at the end of each game
+const RESULTS_BATCH_SIZE = 10;
+// Answers kept for sending again while the server is busy
+const RESULTS_MAX_PENDING = 200;
+
 // Game configuration and state
 const Game = {
+    // Answers not yet sent to the server: {category, item, mode, correct, latency}
+    pendingResults: [],
+    
     // Game state
     state: {
+        category: null,
         mode: null,
         difficulty: null,
         questionCount: null,
@@ -21,7 +30,8 @@ const Game = {
         timerInterval: null,
         usePrimaryWords: true,  // Default to true
         usePrimaryMedia: false,  // Default to false
-        isAudioPlaying: false   // Flag to prevent double-playing audio
+        isAudioPlaying: false,  // Flag to prevent double-playing audio
+        questionShownAt: null   // When the current question was shown, for response times
     },
     
     /**
@@ -112,9 +122,12 @@ const Game = {
     /**
      * Start the game
      * @param {Array} vocabularyItems - Array of vocabulary items to use for the game
+     * @param {string} categoryId - ID of the category the items belong to
+     * @param {Array} dueItemIds - IDs of items due for review, asked first
      */
-    start(vocabularyItems) {
+    start(vocabularyItems, categoryId, dueItemIds = []) {
         // Get game settings
+        this.state.category = categoryId;
         this.state.mode = modeSelect.value;
         this.state.difficulty = parseInt(document.getElementById('difficulty').value);
         this.state.questionCount = parseInt(document.getElementById('questions').value);
@@ -131,7 +144,7 @@ const Game = {
         this.state.isAudioPlaying = false;
         
         // Generate questions
-        this.generateQuestions(vocabularyItems);
+        this.generateQuestions(vocabularyItems, dueItemIds);
         
         // Update UI
         UI.showGameScreen();
@@ -155,6 +168,7 @@ const Game = {
         
         // Reset state
         this.state = {
+            category: null,
             mode: null,
             difficulty: null,
             questionCount: null,
@@ -170,7 +184,8 @@ const Game = {
             timerInterval: null,
             usePrimaryWords: document.getElementById('use-primary-words').checked,
             usePrimaryMedia: document.getElementById('use-primary-media').checked,
-            isAudioPlaying: false
+            isAudioPlaying: false,
+            questionShownAt: null
         };
         
         // Update UI
@@ -180,8 +195,9 @@ const Game = {
     /**
  * Generate questions based on game settings
  * @param {Array} vocabularyItems - Array of vocabulary items to use for the game
+ * @param {Array} dueItemIds - IDs of items due for review, asked first
  */
-generateQuestions(vocabularyItems) {
+generateQuestions(vocabularyItems, dueItemIds = []) {
     // Reset questions array
     this.state.questions = [];
     
@@ -207,8 +223,9 @@ generateQuestions(vocabularyItems) {
             }
         }
         
-        // Select a random item
-        const randomIndex = Math.floor(Math.random() * itemPool.length);
+        // Select the next item due for review, otherwise a random item
+        const dueIndex = i < dueItemIds.length ? itemPool.findIndex(item => item.id === dueItemIds[i]) : -1;
+        const randomIndex = dueIndex >= 0 ? dueIndex : Math.floor(Math.random() * itemPool.length);
         const selectedItem = itemPool.splice(randomIndex, 1)[0];
         
         // For mixed mode, generate a random question and answer type for each question
@@ -281,6 +298,7 @@ generateQuestions(vocabularyItems) {
         
         // Generate answer options
         this.generateOptions();
+        this.state.questionShownAt = performance.now();
     },
     
     /**
@@ -431,6 +449,9 @@ generateQuestions(vocabularyItems) {
             answerType
         );
         
+        // Record the answer, which also schedules the item's next review
+        this.recordResult(this.state.correctAnswer.id, this.state.answeredCorrectly);
+        
         // Update score if correct
         if (this.state.answeredCorrectly) {
             this.state.score++;
@@ -443,6 +464,55 @@ generateQuestions(vocabularyItems) {
         }, 700); // 700ms delay to show the answer
     },
     
+    /**
+     * Record an answer, sending the answers so far once a batch is full
+     * @param {string} itemId - ID of the item the question was about
+     * @param {boolean} correct - Whether it was answered correctly
+     */
+    recordResult(itemId, correct) {
+        this.pendingResults.push({
+            category: this.state.category,
+            item: itemId,
+            mode: this.state.mode,
+            correct,
+            latency: Math.round(performance.now() - this.state.questionShownAt)
+        });
+        
+        if (this.pendingResults.length >= RESULTS_BATCH_SIZE) {
+            this.sendResults();
+        }
+    },
+    
+    /**
+     * Send the pending answers to the server, one request per category, keeping them if it is busy
+     */
+    sendResults() {
+        const results = this.pendingResults;
+        this.pendingResults = [];
+        
+        const byCategory = {};
+        results.forEach(({ category, ...event }) => {
+            (byCategory[category] = byCategory[category] || []).push(event);
+        });
+        
+        Object.entries(byCategory).forEach(([category, events]) => {
+            fetch('/api/results', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ category, events }),
+                keepalive: true
+            }).then(response => {
+                if (response.status === 503) {
+                    throw new Error("Server busy");
+                }
+            }).catch(error => {
+                console.error("Error sending results:", error);
+                const retry = events.map(event => ({ category, ...event }));
+                this.pendingResults = retry.concat(this.pendingResults).slice(-RESULTS_MAX_PENDING);
+            });
+        });
+    },
+    
     /**
      * Move to the next question or end the game
      */
@@ -470,6 +540,9 @@ generateQuestions(vocabularyItems) {
         
         // Set game complete
         this.state.gameComplete = true;
+        
+        // Send the answers of the last batch
+        this.sendResults();
     },
     
     /**
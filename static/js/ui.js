@@ -28,6 +28,9 @@ const finalTotalEl = document.getElementById('final-total');
 const finalTimeEl = document.getElementById('final-time');
 const playAgainButton = document.getElementById('play-again-button');
 
+// Width (in pixels) requested for option images, about twice the tile height for high-DPI screens
+const OPTION_IMAGE_WIDTH = 200;
+
 /**
  * UI functions
  */
@@ -178,7 +181,8 @@ const UI = {
             if (answerType === 'image') {
                 // Display image as option
                 const img = document.createElement('img');
-                img.src = getRandomImage(option);
+                const imageSrc = getRandomImage(option);
+                img.src = imageSrc ? `${imageSrc}?w=${OPTION_IMAGE_WIDTH}` : '';
                 img.alt = option.english;
                 img.style.width = '100%';
                 img.style.height = '100px';
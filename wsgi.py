@@ -0,0 +1,24 @@
+"""
+Production entry point for the Welsh Learning App.
+
+Run it with a WSGI server that imports the application before forking its workers,
+for example with the settings in gunicorn.conf.py:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Importing this module replays metadata writes interrupted by a crash, then builds the
+catalog and warms every cache the API serves from, so the work is done once in the
+master process and the workers share it copy-on-write.
+"""
+
+import gc
+
+from app import app, compact_metadata_journal, warm_caches
+
+compact_metadata_journal(replay=True)
+warm_caches()
+
+# Objects built so far live for the whole life of the process; freezing them keeps the
+# workers' garbage collector from writing to (and so copying) the pages they share
+gc.collect()
+gc.freeze()